@@ -0,0 +1,1001 @@
+"""
+离线基准测试
+用录制好的帧目录驱动 GameTranslationController，OCR/翻译/TTS 可以替换为可配置延迟的替身，
+不需要游戏、API密钥和声卡，普通Linux CPU机器即可运行。
+
+用法：
+    python benchmark.py pipeline frames/ --ocr-latency 0.3 --translate-latency 1.5 --tts-latency 0.4
+    python benchmark.py pipeline frames/ --real-ocr
+    python benchmark.py pipeline frames/ --mock-llm --first-token 0.5 --token-interval 0.05
+    python benchmark.py preprocess frames/ --settings legacy adaptive adaptive+gray
+    python benchmark.py ocr-engines frames/ --engines easyocr cpu
+    python benchmark.py checker --lines 2000
+    python benchmark.py translation-memory --lines 100000
+    python benchmark.py provider --requests 200 --slow-fraction 0.04
+    python benchmark.py router --requests 300 --strategy priority
+    python benchmark.py context --lines 60 --context-tokens 300
+
+帧目录中可放一个 labels.json（{"文件名": "该帧上的文本"}），替身OCR按帧内容返回对应文本；
+没有标注的帧按内容哈希生成文本，画面相同则文本相同。
+"""
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import cv2
+import Levenshtein
+import numpy as np
+
+from capture import ReplayCapture
+from controller import GameTranslationController
+from dialogue_context import DialogueContext
+from metrics import LatencyHistogram
+from ocr_engine import OCR_ENGINES
+from translation_cache import TranslationCache
+from mock_llm_server import MockLLMServer
+from translator import ROUTING_STRATEGIES, Deepseek, DictionaryProvider, LocalProvider, Provider, ProviderRouter, Translator
+from utils import CHECKER_MODES, PREFIX, Checker
+
+logger = logging.getLogger(__name__)
+
+
+def frame_key(image: np.ndarray) -> str:
+    return hashlib.blake2b(image.tobytes(), digest_size=8).hexdigest()
+
+
+def load_labels(frames_dir: Path) -> dict[str, str]:
+    """读取 labels.json，返回 {帧内容哈希: 文本}"""
+    path = frames_dir / "labels.json"
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        by_name: dict[str, str] = json.load(f)
+
+    labels = {}
+    for name, text in by_name.items():
+        img = cv2.imread(str(frames_dir / name))
+        if img is None:
+            logger.warning("Labelled frame not found: %s", name)
+            continue
+        labels[frame_key(img)] = text
+    return labels
+
+
+# ---------- stub engines ----------
+
+class StubOCR:
+    """
+    OCR替身：按帧内容返回标注文本
+    耗时 = latency × 实际识别面积占比（给出脏区域时只按脏区域计）
+    """
+
+    def __init__(self, labels: Optional[dict[str, str]] = None, latency: float = 0.3):
+        self.labels = labels or {}
+        self.latency = latency
+        self.calls = 0
+        self.exclude_set: set[str] = set()
+        self.last_ocr_area_ratio = 1.0
+
+    def img_to_text(self, image: np.ndarray, dirty_rects: Optional[list] = None) -> str:
+        h, w = image.shape[:2]
+        if dirty_rects is None:
+            ratio = 1.0
+        else:
+            area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in dirty_rects)
+            ratio = min(1.0, area / float(h * w))
+        self.last_ocr_area_ratio = ratio
+        self.calls += 1
+        time.sleep(self.latency * ratio)
+
+        key = frame_key(image)
+        return self.labels.get(key, f"frame {key[:8]}")
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "last_ocr_area_ratio": self.last_ocr_area_ratio}
+
+    def save_exclude_set(self) -> None:
+        pass
+
+
+class StubProvider(Provider):
+    """翻译替身：固定延迟后返回带标记的原文；流式时首token延迟 first_token 秒，其余字符均匀分布在剩余时间内"""
+
+    name = "stub"
+
+    def __init__(self, latency: float = 1.0, first_token: Optional[float] = None):
+        super().__init__()
+        self.latency = latency
+        self.first_token = latency / 3 if first_token is None else min(first_token, latency)
+        self.calls = 0
+
+    def translate(self, text: str) -> str:
+        self.calls += 1
+        time.sleep(self.latency)
+        return f"[译]{text}"
+
+    def translate_stream(self, text: str):
+        self.calls += 1
+        translated = f"[译]{text}"
+        time.sleep(self.first_token)
+        interval = (self.latency - self.first_token) / max(1, len(translated) - 1)
+        for i, char in enumerate(translated):
+            if i:
+                time.sleep(interval)
+            yield char
+
+
+def stub_audio_entry(cmd_queue, event_queue, latency: float = 0.3):
+    """TTS替身进程：收到speak后等待 latency 秒，回报首个音频块事件（流式翻译的同一句只回报第一段）；drop_before 作废的句子不处理"""
+    event_queue.put({"type": "readiness", "component": "tts", "state": "ready", "error": None})
+    announced = deque(maxlen=16)
+    min_generation = 0
+    while True:
+        cmd = cmd_queue.get()
+        cmd_type = cmd.get("type")
+        if cmd_type == "exit":
+            break
+        if cmd_type == "drop_before":
+            min_generation = max(min_generation, cmd["generation"])
+            continue
+        if cmd_type != "speak":
+            continue
+        generation = cmd.get("generation")
+        if generation is not None and generation < min_generation:
+            continue
+        start = time.monotonic()
+        time.sleep(latency)
+        utterance = cmd.get("utterance")
+        if utterance is not None:
+            if utterance in announced:
+                continue
+            announced.append(utterance)
+        event_queue.put({
+            "type": "first_audio",
+            "synth_seconds": time.monotonic() - start,
+            "origin": cmd.get("origin"),
+            "time": time.time(),
+        })
+
+
+# ---------- pipeline benchmark ----------
+
+def run_pipeline_benchmark(
+    frames_dir: Path,
+    ocr,
+    provider: Provider,
+    tts_latency: float,
+    checker: Optional[Checker] = None,
+    cache: Optional[TranslationCache] = None,
+    capture_interval: float = 0.1,
+    drain_seconds: float = 3.0,
+    **controller_kwargs,
+) -> dict:
+    """回放帧目录一遍，返回吞吐和延迟统计"""
+    controller = GameTranslationController(
+        capture_backend="replay",
+        capture_options={"source": frames_dir, "loop": False},
+        capture_interval=capture_interval,
+        min_capture_interval=capture_interval,
+        max_capture_interval=capture_interval * 4,
+        ocr=ocr,
+        translator=Translator(ai_engine=provider, checker=checker, cache=cache),
+        audio_entry=functools.partial(stub_audio_entry, latency=tts_latency),
+        **controller_kwargs,
+    )
+
+    # 模型加载不计入回放耗时
+    if not controller.wait_ocr_ready():
+        controller.shutdown()
+        raise RuntimeError(f"OCR failed to load: {controller.get_readiness()['ocr']['error']}")
+
+    # 回放后端忽略区域，只需是合法区域
+    thread = threading.Thread(target=controller.start, args=((0, 0, 1, 1),), daemon=True)
+    start = time.perf_counter()
+    thread.start()
+
+    capturer = controller.capturer
+    while not getattr(capturer, "exhausted", True):
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    # 等待流水线中剩余的翻译和TTS完成
+    time.sleep(drain_seconds)
+    controller.stop()
+    thread.join(timeout=10)
+
+    metrics = controller.get_metrics()
+    controller.shutdown()
+
+    latency = metrics["latency"]
+    frames = capturer.frames
+    ocr_calls = latency.get("ocr", {}).get("count", 0)
+    return {
+        "frames": frames,
+        "elapsed_seconds": elapsed,
+        "frames_per_second": frames / elapsed if elapsed > 0 else 0.0,
+        "ocr_calls": ocr_calls,
+        "ocr_calls_avoided": frames - ocr_calls,
+        "translation_calls": latency.get("translate", {}).get("count", 0),
+        "frame_stats": controller.get_frame_stats(),
+        "ocr_stats": controller.get_ocr_stats(),
+        "checker_stats": controller.get_checker_stats(),
+        "translation_stats": controller.get_translation_stats(),
+        "pipeline_stats": controller.get_pipeline_stats(),
+        "latency": latency,
+        "readiness": controller.get_readiness(),
+    }
+
+
+# ---------- OCR benchmarks (preprocess / engines) ----------
+
+# 名称 -> 传给 GameOCR 的预处理参数
+PREPROCESS_SETTINGS: dict[str, dict] = {
+    "legacy": {"target_text_height": 0},
+    "adaptive": {},
+    "adaptive+gray": {"grayscale": True},
+    "adaptive+contrast": {"normalize_contrast": True},
+    "adaptive+crop": {"crop_to_text": True},
+    "all": {"grayscale": True, "normalize_contrast": True, "crop_to_text": True},
+}
+
+
+def character_error_rate(predicted: str, reference: str) -> float:
+    if not reference:
+        return 0.0 if not predicted else 1.0
+    return Levenshtein.distance(predicted, reference) / len(reference)
+
+
+def process_rss_bytes() -> Optional[int]:
+    """当前进程的常驻内存（读 /proc/self/statm）；没有 /proc 的系统返回 None"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def run_ocr_benchmark(
+    frames_dir: Path,
+    settings: dict[str, dict],
+    languages: list[str],
+    **ocr_kwargs,
+) -> dict:
+    """
+    每种设置各用一个新的 GameOCR 按顺序识别帧目录，返回加载耗时、内存、延迟和准确率
+    settings: 名称 -> 传给 GameOCR 的参数（预处理设置、engine 等）
+    """
+    from ocr import GameOCR
+
+    labels = load_labels(frames_dir)
+    reports = {}
+    for name, options in settings.items():
+        rss_before = process_rss_bytes()
+        load_start = time.perf_counter()
+        ocr = GameOCR(languages=languages, gpu=False, exclude_path=None, **{**ocr_kwargs, **options})
+        load_seconds = time.perf_counter() - load_start
+        rss_after = process_rss_bytes()
+        ocr.warm_up()
+
+        capturer = ReplayCapture(frames_dir, loop=False)
+        latency = LatencyHistogram(window=100000)
+        errors: list[float] = []
+        exact = 0
+
+        while True:
+            img = capturer.grab((0, 0, 1, 1))
+            if img is None:
+                break
+            start = time.perf_counter()
+            text = ocr.img_to_text(img)
+            latency.observe(time.perf_counter() - start)
+
+            reference = labels.get(frame_key(img))
+            if reference is not None:
+                errors.append(character_error_rate(text, reference))
+                exact += int(text == reference)
+        capturer.close()
+
+        stats = ocr.stats()
+        reports[name] = {
+            "options": options,
+            "load_seconds": load_seconds,
+            "model_bytes": ocr.engine.memory_bytes(),
+            "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            "frames": capturer.frames,
+            "labelled_frames": len(errors),
+            "cer": sum(errors) / len(errors) if errors else None,
+            "exact_match": exact / len(errors) if errors else None,
+            "latency": latency.summary(),
+            "text_scale": stats["text_scale"],
+            "crop_ratio": stats["crop_ratio"],
+        }
+    return reports
+
+
+def _print_ocr_report(reports: dict) -> None:
+    print(
+        f"{'setting':>18} {'load s':>7} {'model MB':>9} {'RSS+ MB':>8} {'p50 ms':>9} {'p95 ms':>9} "
+        f"{'CER':>7} {'exact':>7} {'scale':>6} {'crop':>6}"
+    )
+    for name, r in reports.items():
+        lat = r["latency"]
+        cer = f"{r['cer']:.3f}" if r["cer"] is not None else "-"
+        exact = f"{r['exact_match']:.2f}" if r["exact_match"] is not None else "-"
+        rss = f"{r['rss_delta_bytes'] / 1024 / 1024:.0f}" if r["rss_delta_bytes"] is not None else "-"
+        print(
+            f"{name:>18} {r['load_seconds']:7.1f} {r['model_bytes'] / 1024 / 1024:9.1f} {rss:>8} "
+            f"{lat.get('p50_ms', 0):9.1f} {lat.get('p95_ms', 0):9.1f} "
+            f"{cer:>7} {exact:>7} {r['text_scale']:6.2f} {r['crop_ratio']:6.2f}"
+        )
+
+
+# ---------- checker benchmark ----------
+
+_DIALOG_WORDS = (
+    "the a you I we they it is was have been will not what where when why how this that there here "
+    "door key cellar night village king sword journey letter brother sister forest river castle "
+    "found lost open closed strange quiet dark before after never always again together alone"
+).split()
+
+
+def synthetic_ocr_texts(lines: int = 500, seed: int = 0) -> list[str]:
+    """
+    模拟逐帧OCR输出：50~200字符的对话行，每行持续2~8帧，
+    约三成的帧带一个字符的识别错误，偶尔夹杂一帧空文本或HUD文字
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(lines):
+        target = rng.randint(50, 200)
+        words: list[str] = []
+        while len(" ".join(words)) < target:
+            words.append(rng.choice(_DIALOG_WORDS))
+        line = " ".join(words)[:target].strip().capitalize() + "."
+        for _ in range(rng.randint(2, 8)):
+            text = line
+            if rng.random() < 0.3:
+                i = rng.randrange(len(text))
+                text = text[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + text[i + 1:]
+            texts.append(text)
+        if rng.random() < 0.1:
+            texts.append(rng.choice(["", "HP 100/100", "Press E to talk"]))
+    return texts
+
+
+class _ReferenceChecker:
+    """优化前的 Checker（stable 模式）：每帧两次完整的 Levenshtein.ratio"""
+
+    def __init__(self, queue_size: int = 3, similarity: float = 0.95) -> None:
+        self.queue = deque([''] * queue_size, maxlen=queue_size)
+        self.similarity = similarity
+        self.lock = threading.Lock()
+
+    def check(self, new_text: str, maxlen: int = 200) -> bool:
+        with self.lock:
+            if len(new_text) > maxlen or new_text == '':
+                return False
+            self.queue.append(new_text)
+            is_stable = Levenshtein.ratio(self.queue[-1], self.queue[-2]) >= self.similarity
+            has_changed = Levenshtein.ratio(self.queue[-1], self.queue[-3]) < self.similarity
+            return is_stable and has_changed
+
+
+def run_checker_benchmark(texts: list[str], similarity: float = 0.95, repeat: int = 5) -> dict:
+    """比较优化前后 stable 模式 Checker 的吞吐，并确认判定结果完全一致"""
+    def run_reference() -> list[bool]:
+        checker = _ReferenceChecker(similarity=similarity)
+        return [checker.check(text) for text in texts]
+
+    def run_checker() -> list[bool]:
+        checker = Checker(similarity=similarity)
+        return [checker.check(text) for text in texts]
+
+    report: dict = {"texts": len(texts), "similarity": similarity}
+    results = {}
+    for name, func in (("reference", run_reference), ("checker", run_checker)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results[name] = func()
+            best = min(best, time.perf_counter() - start)
+        report[name] = {"seconds": best, "checks_per_second": len(texts) / best}
+
+    report["passed"] = sum(results["checker"])
+    report["identical"] = results["checker"] == results["reference"]
+    report["speedup"] = report["reference"]["seconds"] / report["checker"]["seconds"]
+    return report
+
+
+def _print_checker_report(report: dict) -> None:
+    print(f"texts: {report['texts']}  passed: {report['passed']}  identical decisions: {report['identical']}")
+    for name in ("reference", "checker"):
+        r = report[name]
+        print(f"  {name:>9}: {r['checks_per_second']:12.0f} checks/s ({r['seconds'] * 1000:.1f} ms)")
+    print(f"  speedup: {report['speedup']:.2f}x")
+
+
+# ---------- translation memory benchmark ----------
+
+# 大致按英文字母频率生成的假词，gram分布接近真实文本
+_LETTERS = "eeeeeeeeeeeetttttttttaaaaaaaaoooooooiiiiiiinnnnnnnsssssshhhhhhrrrrrrdddddllllcccuuummwwffggyyppbbvk"
+
+
+def synthetic_dialog_lines(lines: int, seed: int = 0, vocabulary: int = 20000) -> list[str]:
+    """30~140字符的合成台词：高频功能词 + 按字母频率生成的词"""
+    rng = random.Random(seed)
+    words = _DIALOG_WORDS * 10 + [
+        "".join(rng.choice(_LETTERS) for _ in range(rng.randint(2, 9))) for _ in range(vocabulary)
+    ]
+    result = []
+    for _ in range(lines):
+        target = rng.randint(30, 140)
+        line: list[str] = []
+        while len(" ".join(line)) < target:
+            line.append(rng.choice(words))
+        result.append(" ".join(line).capitalize() + ".")
+    return result
+
+
+def ocr_noise(text: str, rng: random.Random, errors: int = 2) -> str:
+    """把 1~errors 处换成OCR常见的混淆字符（"e"→"c"、"m"→"rn"），模拟OCR识别错误"""
+    from translation_memory import OCR_CONFUSIONS
+
+    # 数字混淆会改变数字本身，不在这里模拟
+    pairs = [pair for a, b in OCR_CONFUSIONS if not any(c.isdigit() for c in a + b)
+             for pair in ((a, b), (b, a))]
+    for _ in range(rng.randint(1, errors)):
+        options = [(i, wrong, right) for wrong, right in pairs for i in _find_all(text, wrong)]
+        if not options:
+            break
+        i, wrong, right = rng.choice(options)
+        text = text[:i] + right + text[i + len(wrong):]
+    return text
+
+
+def _find_all(text: str, part: str) -> list[int]:
+    return [i for i in range(len(text)) if text.startswith(part, i)]
+
+
+def near_duplicate(text: str, rng: random.Random) -> str:
+    """
+    与原句只差几个字符、意思却不同的句子：加否定词、增删一个词、把一个字母换成不易混淆的字母
+    （"mouse"/"house"），翻译记忆不能复用原句的译文
+    """
+    words = text.split()
+    kind = rng.randrange(4)
+    i = rng.randrange(1, len(words)) if len(words) > 1 else 0
+    if kind == 0:
+        words.insert(i, "not")
+    elif kind == 1 and len(words) > 3:
+        del words[i]
+    elif kind == 2:
+        words.insert(i, rng.choice(["do", "so", "too", "now"]))
+    else:
+        word = max(words, key=len)
+        j = rng.randrange(len(word))
+        letter = rng.choice([c for c in "hmnpkt" if c != word[j].lower()])
+        words[words.index(word)] = word[:j] + letter + word[j + 1:]
+    return " ".join(words)
+
+
+def run_translation_memory_benchmark(lines: int, queries: int = 2000, similarity: float = 0.9, seed: int = 0) -> dict:
+    """
+    用 lines 行合成台词建索引，查询 queries 个带OCR错误的已知台词、queries 个新台词
+    和 queries 个已知台词的近似改写（意思不同），
+    返回建索引耗时、查询延迟、召回率（找回原句的比例）和误命中数
+    """
+    from translation_memory import TranslationMemory, normalize_line
+
+    rng = random.Random(seed + 1)
+    sources = synthetic_dialog_lines(lines, seed=seed)
+    memory = TranslationMemory(similarity=similarity, max_entries=max(lines, 1))
+
+    start = time.perf_counter()
+    for i, source in enumerate(sources):
+        memory.add(source, f"译文{i}")
+    build_seconds = time.perf_counter() - start
+
+    known = [rng.choice(sources) for _ in range(queries)]
+    noisy = [ocr_noise(source, rng) for source in known]
+    unseen = synthetic_dialog_lines(queries, seed=seed + 2)
+    near = [near_duplicate(rng.choice(sources), rng) for _ in range(queries)]
+    known_lines = {normalize_line(source) for source in sources}
+    near = [text for text in near if normalize_line(text) not in known_lines]
+
+    latency = LatencyHistogram(window=len(noisy) + len(unseen) + len(near))
+    recalled = 0
+    false_hits = 0
+    near_hits = 0
+    for i, text in enumerate(noisy + unseen + near):
+        start = time.perf_counter()
+        match = memory.lookup(text)
+        latency.observe(time.perf_counter() - start)
+        if i < len(noisy):
+            recalled += int(match is not None and match[0] == normalize_line(known[i]))
+        elif i < len(noisy) + len(unseen):
+            false_hits += int(match is not None)
+        else:
+            near_hits += int(match is not None)
+
+    return {
+        "lines": len(memory),
+        "similarity": similarity,
+        "build_seconds": build_seconds,
+        "latency": latency.summary(),
+        "recall": recalled / len(noisy) if noisy else None,
+        "false_hits": false_hits,
+        "unseen_queries": len(unseen),
+        "near_duplicate_hits": near_hits,
+        "near_duplicate_queries": len(near),
+    }
+
+
+def _print_translation_memory_report(report: dict) -> None:
+    lat = report["latency"]
+    print(f"lines: {report['lines']}  build: {report['build_seconds']:.1f}s  similarity: {report['similarity']}")
+    print(f"lookup (ms): p50={lat['p50_ms']:.3f} p95={lat['p95_ms']:.3f} p99={lat['p99_ms']:.3f} max={lat['max_ms']:.3f}")
+    print(f"recall on OCR-noise variants: {report['recall']:.3f}")
+    print(f"false hits on unseen lines:   {report['false_hits']} / {report['unseen_queries']}")
+    print(f"false hits on near-duplicates: {report['near_duplicate_hits']} / {report['near_duplicate_queries']}")
+
+
+# ---------- provider benchmark ----------
+
+def run_provider_benchmark(
+    requests: int = 200,
+    stream: bool = False,
+    hedge_modes: tuple[bool, ...] = (False, True),
+    first_token: float = 0.2,
+    token_interval: float = 0.01,
+    slow_fraction: float = 0.04,
+    slow_delay: float = 2.0,
+    timeout: float = 10.0,
+    seed: int = 0,
+) -> dict:
+    """
+    对本地替身服务器连续发送翻译请求，比较不对冲/对冲时调用方看到的延迟分布；
+    同时记录冷启动（未预连接）与预连接后第一个请求的耗时，以及服务端看到的连接数
+    """
+    reports = {}
+    for hedge in hedge_modes:
+        server = MockLLMServer(
+            first_token_latency=first_token, token_interval=token_interval,
+            slow_fraction=slow_fraction, slow_delay=slow_delay, seed=seed,
+        ).start()
+        provider = Deepseek(base_url=server.url, api_key="mock", timeout=timeout, hedge=hedge)
+        try:
+            provider.warm_up()
+            for i in range(requests):
+                text = f"Line {i}: the door is locked, find the key."
+                if stream:
+                    for _ in provider.translate_stream(text):
+                        pass
+                else:
+                    provider.translate(text)
+            stats = provider.stats()
+        finally:
+            provider.close()
+            server.stop()
+        stats["server_requests"] = server.requests
+        stats["server_slow_requests"] = server.slow_requests
+        stats["server_connections"] = server.connections
+        reports["hedged" if hedge else "plain"] = stats
+    return reports
+
+
+def run_router_benchmark(
+    requests: int = 300,
+    strategy: str = "priority",
+    first_token: float = 0.1,
+    local_first_token: float = 0.3,
+    token_interval: float = 0.005,
+    outage_error_fraction: float = 0.5,
+    outage_slow_fraction: float = 0.3,
+    slow_delay: float = 3.0,
+    timeout: float = 2.0,
+    probe_interval: float = 2.0,
+    seed: int = 0,
+) -> dict:
+    """
+    主接口在中间三分之一的请求期间出故障（一部分请求返回503、一部分变慢），比较：
+    - primary: 只用主接口（客户端默认重试一次）
+    - router: 主接口 → 本地模型 → 离线词典，由 ProviderRouter 路由（各接口不重试，由路由器换接口）
+    返回每种配置下调用方看到的延迟分布、失败次数和各接口承担的请求数
+    """
+    texts = [f"Line {i}: the door is locked, find the key." for i in range(requests)]
+    reports = {}
+    for mode in ("primary", "router"):
+        primary_server = MockLLMServer(first_token_latency=first_token, token_interval=token_interval, slow_delay=slow_delay, seed=seed).start()
+        local_server = MockLLMServer(first_token_latency=local_first_token, token_interval=token_interval, seed=seed).start()
+        primary = Deepseek(base_url=primary_server.url, api_key="mock", timeout=timeout, max_retries=1 if mode == "primary" else 0, label="primary")
+        provider: Provider = primary
+        if mode == "router":
+            provider = ProviderRouter(
+                [
+                    primary,
+                    LocalProvider(base_url=local_server.url, timeout=timeout, max_retries=0),
+                    DictionaryProvider(path=None, entries={texts[0]: "门锁着。"}),
+                ],
+                strategy=strategy,
+                latency_budget=timeout / 2,
+                probe_interval=probe_interval,
+            )
+        latency = LatencyHistogram(window=requests)
+        failures = 0
+        try:
+            provider.warm_up()
+            for i, text in enumerate(texts):
+                # 中间三分之一的请求期间主接口出故障
+                outage = requests // 3 <= i < requests * 2 // 3
+                primary_server.error_fraction = outage_error_fraction if outage else 0.0
+                primary_server.slow_fraction = outage_slow_fraction if outage else 0.0
+                start = time.perf_counter()
+                try:
+                    provider.translate(text)
+                except Exception:
+                    failures += 1
+                    continue
+                latency.observe(time.perf_counter() - start)
+            report = {"latency": latency.summary(), "failures": failures, "providers": provider.provider_stats()}
+        finally:
+            provider.close()
+            primary_server.stop()
+            local_server.stop()
+        reports[mode] = report
+    return reports
+
+
+CONTEXT_MODES = ("none", "sliding", "stable")
+
+
+def run_context_benchmark(
+    lines: int = 60,
+    context_tokens: int = 300,
+    first_token: float = 0.05,
+    token_interval: float = 0.001,
+    prefill_per_token: float = 0.0005,
+    seed: int = 0,
+) -> dict:
+    """
+    按顺序流式翻译一段合成台词，比较三种上下文方式下每次请求的 prompt token、缓存命中和首token延迟：
+    - none: 每句单独翻译（系统提示 + 原文）
+    - sliding: 带前文，超出预算时每次只丢弃最早的一条（前缀每次都变）
+    - stable: DialogueContext 默认做法，超出预算时一次丢弃一半，其余时候只追加
+    替身服务器按前缀模拟上下文缓存，未命中的 prompt token 增加首token延迟
+    """
+    texts = synthetic_dialog_lines(lines, seed=seed)
+    reports = {}
+    for mode in CONTEXT_MODES:
+        server = MockLLMServer(
+            first_token_latency=first_token, token_interval=token_interval,
+            prefill_per_token=prefill_per_token, seed=seed,
+        ).start()
+        provider = Deepseek(base_url=server.url, api_key="mock")
+        context = None
+        if mode != "none":
+            context = DialogueContext(context_tokens, keep_fraction=1.0 if mode == "sliding" else 0.5)
+        translator = Translator(ai_engine=provider, context=context)
+        prompt_tokens: list[int] = []
+        try:
+            provider.warm_up()
+            for text in texts:
+                for _ in translator.translate_stream(text):
+                    pass
+                if provider.last_call is not None:
+                    prompt_tokens.append(provider.last_call["prompt_tokens"])
+            stats = provider.stats()
+            report = {
+                "first_token": stats["first_token"],
+                "prompt_tokens": stats["prompt_tokens"],
+                "cache_hit_tokens": stats["cache_hit_tokens"],
+                "prompt_cache_hit_rate": stats["prompt_cache_hit_rate"],
+                "prompt_tokens_p50": statistics.median(prompt_tokens) if prompt_tokens else 0,
+                "uncached_tokens_per_call": (stats["prompt_tokens"] - stats["cache_hit_tokens"]) / lines,
+            }
+            if context is not None:
+                report.update(context.stats())
+        finally:
+            provider.close()
+            server.stop()
+        reports[mode] = report
+    return reports
+
+
+def _print_context_report(reports: dict) -> None:
+    for mode, report in reports.items():
+        lat = report["first_token"]
+        print(
+            f"{mode:>7}: first_token p50={lat['p50_ms']:7.1f} p95={lat['p95_ms']:7.1f} ms  "
+            f"prompt p50={report['prompt_tokens_p50']:6.0f} tokens  "
+            f"cache hit={report['prompt_cache_hit_rate']:5.1%}  "
+            f"uncached/call={report['uncached_tokens_per_call']:6.1f}  "
+            f"trims={report.get('context_trims', 0)}"
+        )
+
+
+def _print_router_report(reports: dict) -> None:
+    for mode, report in reports.items():
+        lat = report["latency"]
+        print(
+            f"{mode:>7}: p50={lat.get('p50_ms', 0.0):7.1f} p95={lat.get('p95_ms', 0.0):7.1f} "
+            f"p99={lat.get('p99_ms', 0.0):7.1f} ms  failures={report['failures']}"
+        )
+        for label, stats in report["providers"].items():
+            routed = stats.get("routed", stats.get("requests", 0))
+            print(
+                f"         {label:>10}: routed={routed} failures={stats.get('failures', stats.get('errors', 0))} "
+                f"fallback={stats.get('served_as_fallback', 0)}"
+            )
+
+
+def _print_provider_report(reports: dict, stream: bool) -> None:
+    key = "first_token" if stream else "latency"
+    for name, stats in reports.items():
+        lat = stats[key]
+        print(
+            f"{name:>7}: {key} p50={lat['p50_ms']:7.1f} p95={lat['p95_ms']:7.1f} p99={lat['p99_ms']:7.1f} "
+            f"max={lat['max_ms']:7.1f} ms"
+        )
+        print(
+            f"         requests={stats['requests']} server_requests={stats['server_requests']} "
+            f"(slow {stats['server_slow_requests']}) hedged={stats['hedged']} hedge_wins={stats['hedge_wins']} "
+            f"timeouts={stats['timeouts']} errors={stats['errors']} connections={stats['server_connections']} "
+            f"warm-up={stats.get('connect_ms', 0.0):.1f}ms"
+        )
+
+
+def _print_report(report: dict) -> None:
+    print(f"frames:              {report['frames']}")
+    print(f"frames/s:            {report['frames_per_second']:.2f}")
+    print(f"OCR calls:           {report['ocr_calls']} (avoided {report['ocr_calls_avoided']})")
+    print(f"translation calls:   {report['translation_calls']}")
+    stats = report["translation_stats"]
+    # 排队时就被更新的文本顶替的，同样省下了一次调用
+    replaced = report["pipeline_stats"].get("translate", {}).get("queue_dropped", 0)
+    print(
+        f"stale translations:  {stats['translation_calls_saved'] + replaced} calls saved "
+        f"({replaced} replaced in queue), "
+        f"{stats['translation_streams_aborted']} streams aborted, {stats['translation_results_discarded']} results discarded"
+    )
+    if "cache_hits" in stats:
+        print(f"translation cache:   {stats['cache_hits']} hits / {stats['cache_misses']} misses ({stats['cache_hit_rate']:.0%})")
+    checker = report["checker_stats"]
+    print(
+        f"checker ({checker['checker_mode']}): {checker['checker_decisions']} decisions, "
+        f"decision latency mean={checker['decision_frames_mean']:.2f} max={checker['decision_frames_max']} frames"
+    )
+    print("latency (ms):")
+    for name, summary in report["latency"].items():
+        if "p50_ms" not in summary:
+            continue
+        print(
+            f"  {name:>23}: n={summary['count']:<5} p50={summary['p50_ms']:8.1f} "
+            f"p95={summary['p95_ms']:8.1f} p99={summary['p99_ms']:8.1f}"
+        )
+
+
+def _cmd_pipeline(args) -> dict:
+    frames_dir = Path(args.frames_dir)
+    if args.real_ocr:
+        from ocr import GameOCR
+        ocr = GameOCR(languages=args.languages, gpu=False, exclude_path=None)
+    else:
+        ocr = StubOCR(load_labels(frames_dir), latency=args.ocr_latency)
+
+    server = None
+    if args.mock_llm:
+        # 经过真实的 OpenAI 客户端和HTTP流式返回
+        first_token = 0.5 if args.first_token is None else args.first_token
+        server = MockLLMServer(first_token_latency=first_token, token_interval=args.token_interval).start()
+        provider: Provider = Deepseek(base_url=server.url, api_key="mock")
+    else:
+        provider = StubProvider(latency=args.translate_latency, first_token=args.first_token)
+
+    try:
+        report = run_pipeline_benchmark(
+            frames_dir,
+            ocr=ocr,
+            provider=provider,
+            checker=Checker(mode=args.checker_mode),
+            cache=TranslationCache(args.translation_cache) if args.translation_cache else None,
+            tts_latency=args.tts_latency,
+            capture_interval=args.capture_interval,
+            drain_seconds=args.drain,
+            stream_translation=not args.no_stream,
+        )
+    finally:
+        if server is not None:
+            server.stop()
+    _print_report(report)
+    return report
+
+
+def _cmd_preprocess(args) -> dict:
+    settings = {}
+    for name in args.settings:
+        settings[name] = dict(PREPROCESS_SETTINGS[name])
+        if args.target_height is not None and settings[name].get("target_text_height", 1) != 0:
+            settings[name]["target_text_height"] = args.target_height
+
+    ocr_kwargs = {}
+    if args.no_cache:
+        # 每帧完整检测+识别，只比较预处理本身的影响
+        ocr_kwargs = {"reuse_boxes": False, "recognition_cache_size": 0}
+
+    reports = run_ocr_benchmark(Path(args.frames_dir), settings, args.languages, **ocr_kwargs)
+    _print_ocr_report(reports)
+    return reports
+
+
+def _cmd_ocr_engines(args) -> dict:
+    # 先加载torch，RSS增量只计模型本身
+    import torch  # noqa: F401
+
+    settings = {}
+    for name in args.engines:
+        options: dict = {"engine": name}
+        if name == "cpu" and args.threads:
+            options["engine_options"] = {"num_threads": args.threads}
+        settings[name] = options
+
+    # 固定图片集：每帧独立完整识别，预处理保持一致，只比较引擎
+    ocr_kwargs = {"reuse_boxes": False, "recognition_cache_size": 0}
+    reports = run_ocr_benchmark(Path(args.frames_dir), settings, args.languages, **ocr_kwargs)
+    _print_ocr_report(reports)
+    return reports
+
+
+def _cmd_checker(args) -> dict:
+    texts = synthetic_ocr_texts(args.lines, seed=args.seed)
+    report = run_checker_benchmark(texts, similarity=args.similarity, repeat=args.repeat)
+    _print_checker_report(report)
+    return report
+
+
+def _cmd_translation_memory(args) -> dict:
+    report = run_translation_memory_benchmark(args.lines, args.queries, similarity=args.similarity, seed=args.seed)
+    _print_translation_memory_report(report)
+    return report
+
+
+def _cmd_provider(args) -> dict:
+    reports = run_provider_benchmark(
+        requests=args.requests,
+        stream=args.stream,
+        first_token=args.first_token,
+        token_interval=args.token_interval,
+        slow_fraction=args.slow_fraction,
+        slow_delay=args.slow_delay,
+        timeout=args.timeout,
+        seed=args.seed,
+    )
+    _print_provider_report(reports, args.stream)
+    return reports
+
+
+def _cmd_router(args) -> dict:
+    reports = run_router_benchmark(
+        requests=args.requests,
+        strategy=args.strategy,
+        outage_error_fraction=args.error_fraction,
+        outage_slow_fraction=args.slow_fraction,
+        timeout=args.timeout,
+        seed=args.seed,
+    )
+    _print_router_report(reports)
+    return reports
+
+
+def _cmd_context(args) -> dict:
+    reports = run_context_benchmark(
+        lines=args.lines,
+        context_tokens=args.context_tokens,
+        first_token=args.first_token,
+        token_interval=args.token_interval,
+        prefill_per_token=args.prefill_per_token,
+        seed=args.seed,
+    )
+    _print_context_report(reports)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument("--json", default=None, help="把结果写入JSON文件")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("pipeline", help="用录制帧驱动完整流水线")
+    p.add_argument("frames_dir")
+    p.add_argument("--real-ocr", action="store_true", help="使用真实的GameOCR（CPU）代替替身")
+    p.add_argument("--languages", nargs="+", default=["en"])
+    p.add_argument("--ocr-latency", type=float, default=0.3)
+    p.add_argument("--translate-latency", type=float, default=1.0)
+    p.add_argument("--tts-latency", type=float, default=0.3)
+    p.add_argument("--capture-interval", type=float, default=0.1)
+    p.add_argument("--drain", type=float, default=3.0, help="回放结束后等待流水线排空的秒数")
+    p.add_argument("--checker-mode", choices=CHECKER_MODES, default=PREFIX)
+    p.add_argument("--translation-cache", default=None, help="翻译缓存文件，重复运行时回放的台词直接命中缓存")
+    p.add_argument("--no-stream", action="store_true", help="关闭流式翻译，整段译完再交给TTS")
+    p.add_argument("--mock-llm", action="store_true", help="通过本地 mock_llm_server 和 OpenAI 客户端翻译（需要openai）")
+    p.add_argument("--first-token", type=float, default=None, help="翻译首token延迟，默认 translate-latency 的1/3（--mock-llm 时默认0.5）")
+    p.add_argument("--token-interval", type=float, default=0.05, help="--mock-llm 的token间隔")
+    p.set_defaults(func=_cmd_pipeline)
+
+    p = sub.add_parser("preprocess", help="比较各OCR预处理设置的延迟和准确率（需要easyocr，按labels.json计算CER）")
+    p.add_argument("frames_dir")
+    p.add_argument("--settings", nargs="+", choices=list(PREPROCESS_SETTINGS), default=list(PREPROCESS_SETTINGS))
+    p.add_argument("--languages", nargs="+", default=["en"])
+    p.add_argument("--target-height", type=int, default=None, help="覆盖 target_text_height")
+    p.add_argument("--no-cache", action="store_true", help="关闭文本框复用和识别缓存")
+    p.set_defaults(func=_cmd_preprocess)
+
+    p = sub.add_parser("ocr-engines", help="并排比较OCR引擎的加载耗时、内存、延迟和准确率（CPU）")
+    p.add_argument("frames_dir")
+    p.add_argument("--engines", nargs="+", choices=list(OCR_ENGINES), default=list(OCR_ENGINES))
+    p.add_argument("--languages", nargs="+", default=["en"])
+    p.add_argument("--threads", type=int, default=None, help="cpu引擎的线程数，默认物理核心数")
+    p.set_defaults(func=_cmd_ocr_engines)
+
+    p = sub.add_parser("checker", help="Checker相似度判断的微基准（合成的50~200字符对话行）")
+    p.add_argument("--lines", type=int, default=2000)
+    p.add_argument("--similarity", type=float, default=0.95)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=_cmd_checker)
+
+    p = sub.add_parser("translation-memory", help="翻译记忆近似查询的规模测试（合成台词 + 模拟OCR错误）")
+    p.add_argument("--lines", type=int, default=100000)
+    p.add_argument("--queries", type=int, default=2000)
+    p.add_argument("--similarity", type=float, default=0.9)
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=_cmd_translation_memory)
+
+    p = sub.add_parser("provider", help="翻译接口的连接复用、截止时间和对冲请求（本地替身服务器注入长尾延迟，需要openai）")
+    p.add_argument("--requests", type=int, default=200)
+    p.add_argument("--stream", action="store_true", help="流式请求，比较首token延迟")
+    p.add_argument("--first-token", type=float, default=0.2)
+    p.add_argument("--token-interval", type=float, default=0.01)
+    p.add_argument("--slow-fraction", type=float, default=0.04, help="额外变慢的请求比例")
+    p.add_argument("--slow-delay", type=float, default=2.0, help="变慢的请求额外等待的秒数")
+    p.add_argument("--timeout", type=float, default=10.0, help="单次请求的截止时间")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=_cmd_provider)
+
+    p = sub.add_parser("router", help="主接口故障期间，路由到本地模型/离线词典前后的延迟和失败次数（需要openai）")
+    p.add_argument("--requests", type=int, default=300)
+    p.add_argument("--strategy", choices=ROUTING_STRATEGIES, default="priority")
+    p.add_argument("--error-fraction", type=float, default=0.5, help="故障期间主接口返回503的比例")
+    p.add_argument("--slow-fraction", type=float, default=0.3, help="故障期间主接口变慢的比例")
+    p.add_argument("--timeout", type=float, default=2.0, help="单次请求的截止时间")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=_cmd_router)
+
+    p = sub.add_parser("context", help="对话上下文的 prompt 缓存命中和首token延迟：不带前文/滑动窗口/前缀稳定（需要openai）")
+    p.add_argument("--lines", type=int, default=60)
+    p.add_argument("--context-tokens", type=int, default=300, help="前文的token预算（较小的预算让几十行台词就能触发裁剪）")
+    p.add_argument("--first-token", type=float, default=0.05)
+    p.add_argument("--token-interval", type=float, default=0.001)
+    p.add_argument("--prefill-per-token", type=float, default=0.0005, help="每个未命中缓存的prompt token增加的首token延迟（秒）")
+    p.add_argument("--seed", type=int, default=0)
+    p.set_defaults(func=_cmd_context)
+
+    args = parser.parse_args()
+    report = args.func(args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    main()
@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (x, y, width, height)
+Region = Tuple[int, int, int, int]
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".bmp"}
+
+
+class CaptureBackend(ABC):
+    """
+    截图后端接口
+    grab() 返回 BGR 格式的 numpy 数组（OpenCV格式），失败返回 None。
+    bytes_copied 统计截图过程中整帧拷贝的字节数，用于对比各后端开销。
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes_copied = 0
+
+    @abstractmethod
+    def grab(self, region: Region) -> Optional[np.ndarray]:
+        pass
+
+    def release(self) -> None:
+        """释放调用线程持有的资源，截图线程退出前调用；默认什么都不做"""
+
+    def close(self) -> None:
+        pass
+
+
+class PyAutoGUICapture(CaptureBackend):
+    """
+    原有方案：pyautogui截图 → PIL → numpy → RGB转BGR
+    每帧有三次整帧拷贝
+    """
+
+    name = "pyautogui"
+
+    def __init__(self):
+        super().__init__()
+        import pyautogui
+        self._pyautogui = pyautogui
+
+    def grab(self, region: Region) -> Optional[np.ndarray]:
+        screenshot = self._pyautogui.screenshot(region=region)
+        img_array = np.array(screenshot)
+        img_array = img_array[:, :, ::-1].copy()
+
+        self.frames += 1
+        # PIL图像 + np.array + 颜色通道翻转
+        self.bytes_copied += img_array.nbytes * 3
+        return img_array
+
+
+class MSSCapture(CaptureBackend):
+    """
+    基于mss的截图（Windows下为BitBlt到DIB，Linux下为XShm）
+    在mss的原始BGRA数据上建立numpy视图，只做一次BGRA→BGR转换。
+
+    mss 10 把设备上下文/显示连接保存在创建它的线程中，其他线程调用 grab 会失败，
+    所以每个调用 grab 的线程各自延迟创建mss实例，并由该线程在退出前 release()。
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        super().__init__()
+        import mss
+        self._mss = mss
+        self._local = threading.local()
+
+    def grab(self, region: Region) -> Optional[np.ndarray]:
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        x, y, width, height = region
+        shot = sct.grab({"left": x, "top": y, "width": width, "height": height})
+
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        img = cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)
+
+        self.frames += 1
+        # mss 把截图数据拷贝成 bytearray + 颜色转换
+        self.bytes_copied += bgra.nbytes + img.nbytes
+        return img
+
+    def release(self) -> None:
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+    def close(self) -> None:
+        self.release()
+
+
+class ReplayCapture(CaptureBackend):
+    """
+    回放后端：从图片目录或视频文件中按顺序读取帧，用于无屏幕环境下运行整个流程
+    region 参数被忽略（录制的帧本身就是截图区域）
+    """
+
+    name = "replay"
+
+    def __init__(self, source: Union[str, Path], loop: bool = True):
+        super().__init__()
+        self.source = Path(source)
+        self.loop = loop
+        self._files: list[Path] = []
+        self._index = 0
+        self._video: Optional[cv2.VideoCapture] = None
+        # loop=False 时读完所有帧后置为 True
+        self.exhausted = False
+
+        if self.source.is_dir():
+            self._files = sorted(p for p in self.source.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+            if not self._files:
+                raise ValueError(f"No image frames found in {self.source}")
+        else:
+            self._video = cv2.VideoCapture(str(self.source))
+            if not self._video.isOpened():
+                raise ValueError(f"Failed to open video: {self.source}")
+
+    def grab(self, region: Region) -> Optional[np.ndarray]:
+        img = self._read_video() if self._video is not None else self._read_file()
+        if img is None:
+            if not self.loop:
+                self.exhausted = True
+            return None
+
+        self.frames += 1
+        self.bytes_copied += img.nbytes
+        return img
+
+    def close(self) -> None:
+        if self._video is not None:
+            self._video.release()
+
+    def _read_file(self) -> Optional[np.ndarray]:
+        if self._index >= len(self._files):
+            if not self.loop:
+                return None
+            self._index = 0
+        path = self._files[self._index]
+        self._index += 1
+        img = cv2.imread(str(path))
+        if img is None:
+            logger.warning("Failed to load frame: %s", path)
+        return img
+
+    def _read_video(self) -> Optional[np.ndarray]:
+        assert self._video is not None
+        ok, img = self._video.read()
+        if not ok and self.loop:
+            self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, img = self._video.read()
+        return img if ok else None
+
+
+CAPTURE_BACKENDS: dict[str, type[CaptureBackend]] = {
+    PyAutoGUICapture.name: PyAutoGUICapture,
+    MSSCapture.name: MSSCapture,
+    ReplayCapture.name: ReplayCapture,
+}
+
+
+def create_capture_backend(name: str, **kwargs) -> CaptureBackend:
+    """按名称创建截图后端，kwargs 透传给后端构造函数"""
+    try:
+        backend_cls = CAPTURE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported capture backend: {name}") from None
+    return backend_cls(**kwargs)
+
+
+def benchmark_backend(backend: CaptureBackend, region: Region, frames: int = 100) -> dict:
+    """对单个后端连续截图，返回每帧耗时与拷贝字节数"""
+    backend.grab(region)  # 预热
+    backend.frames = 0
+    backend.bytes_copied = 0
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        backend.grab(region)
+    elapsed = time.perf_counter() - start
+
+    n = max(backend.frames, 1)
+    return {
+        "backend": backend.name,
+        "frames": backend.frames,
+        "ms_per_frame": elapsed * 1000 / n,
+        "bytes_copied_per_frame": backend.bytes_copied / n,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="截图后端微基准")
+    parser.add_argument("--backends", nargs="+", default=["pyautogui", "mss"])
+    parser.add_argument("--region", nargs=4, type=int, default=[0, 0, 1280, 720], metavar=("X", "Y", "W", "H"))
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--replay-source", default=None, help="replay后端使用的图片目录或视频文件")
+    args = parser.parse_args()
+
+    for name in args.backends:
+        kwargs = {"source": args.replay_source} if name == "replay" else {}
+        backend = create_capture_backend(name, **kwargs)
+        try:
+            result = benchmark_backend(backend, tuple(args.region), args.frames)
+        finally:
+            backend.close()
+        print(
+            f"{result['backend']:>10}: {result['ms_per_frame']:7.2f} ms/frame, "
+            f"{result['bytes_copied_per_frame'] / 1024 / 1024:6.2f} MiB copied/frame"
+        )
@@ -1,22 +1,43 @@
 # controller.py
-import pyautogui
+import functools
+import itertools
 import logging
+import threading
 import time
 import multiprocessing as mp
-from typing import Tuple, Optional, List
+from typing import Callable, Tuple, Optional, List, Union
 import numpy as np
 
+from capture import CaptureBackend, create_capture_backend
+from dialogue_context import DialogueContext
+from metrics import MetricsRegistry
 from ocr import GameOCR
+from ocr_engine import CPUEasyOCREngine, default_num_threads
+from ocr_worker import OCRWorkerPool
+from pipeline import Pipeline
+from translation_cache import TranslationCache
+from translation_memory import TranslationMemory
 from translator import Translator
-from voxcpm_tts.tts.audio_process import audio_process_entry
+from scheduler import AdaptiveScheduler
+from utils import PREFIX, Checker, FrameChangeDetector, TileChangeTracker, is_similar, merge_segments
 
 logger = logging.getLogger(__name__)
 
+# 模型就绪状态
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
 
 class GameTranslationController:
     """
     游戏实时翻译控制器
     负责协调截图、OCR、翻译、TTS播放的整体流程
+    
+    流水线结构：截图（主循环线程）→ OCR/Checker → 翻译 → TTS，
+    每个阶段一个线程，阶段之间用容量有限、只保留最新数据的队列连接，
+    慢阶段（如LLM请求）不会阻塞截图和OCR。
     """
     
     def __init__(
@@ -26,7 +47,33 @@ class GameTranslationController:
         ocr_exclude_set: Optional[set] = None,
         capture_interval: float = 0.8,
         max_text_length: int = 200,
-        similarity_threshold: float = 0.8
+        similarity_threshold: float = 0.8,
+        skip_static_frames: bool = True,
+        frame_change_threshold: float = 0.002,
+        capture_backend: str = "mss",
+        capture_options: Optional[dict] = None,
+        ocr_dirty_tiles: bool = True,
+        ocr_reuse_boxes: bool = True,
+        ocr_min_confidence: float = 0.3,
+        ocr_processes: int = 0,
+        ocr_options: Optional[dict] = None,
+        ocr_engine: str = "easyocr",
+        checker_mode: str = PREFIX,
+        translation_cache_path: Optional[str] = "translation_cache.sqlite3",
+        translation_memory_similarity: Optional[float] = 0.9,
+        stream_translation: bool = True,
+        translation_providers: Union[str, dict, list] = "deepseek",
+        dialogue_context_tokens: int = 1500,
+        adaptive_capture: bool = True,
+        min_capture_interval: float = 0.3,
+        max_capture_interval: float = 2.0,
+        queue_size: int = 1,
+        metrics_dump_path: Optional[str] = None,
+        metrics_dump_interval: float = 10.0,
+        warm_up: bool = True,
+        ocr: Optional[GameOCR] = None,
+        translator: Optional[Translator] = None,
+        audio_entry: Optional[Callable] = None
     ):
         """
         初始化控制器
@@ -34,35 +81,142 @@ class GameTranslationController:
         Args:
             ocr_languages: OCR支持的语言列表，默认['en']
             ocr_use_gpu: 是否使用GPU加速OCR
-            ocr_exclude_set: OCR排除的字符串集合
-            capture_interval: 截图间隔（秒）
+            ocr_exclude_set: 额外的OCR排除字符串，会写入排除集日志（用于迁移旧配置中的集合）
+            capture_interval: 目标截图周期（秒），处理耗时会从等待时间中扣除
             max_text_length: 最大文本长度限制
             similarity_threshold: 文本相似度阈值
+            skip_static_frames: 画面没有变化时是否跳过OCR
+            frame_change_threshold: 画面变化阈值（变化像素占比），超过才执行OCR
+            capture_backend: 截图后端名称：'mss'（默认）、'pyautogui'、'replay'（回放图片目录/视频）
+            capture_options: 传给截图后端的额外参数，例如replay的 {'source': 'frames/'}
+            ocr_dirty_tiles: 是否按瓦片跟踪变化，只重新识别变化区域内的文本
+            ocr_reuse_boxes: 版面稳定时复用文本检测框，只运行文字识别
+            ocr_min_confidence: OCR置信度阈值，低于该值的文本不会送去检查和翻译
+            ocr_processes: OCR工作进程数，0表示在本进程内运行OCR；
+                大于1时多帧并行识别，瓦片级变化跟踪随之关闭
+            ocr_options: 传给 GameOCR 的额外参数，例如预处理设置
+                {'target_text_height': 64, 'grayscale': True, 'crop_to_text': True}
+            ocr_engine: OCR引擎：'easyocr'（默认）、'cpu'（调优torch线程数并限制检测画布尺寸，适合没有GPU的机器）
+            checker_mode: Checker判定模式：'prefix'（默认，逐字显示的文本停止变长或出现完整句子即翻译）、'stable'（等文本连续两帧相同）
+            translation_cache_path: 翻译缓存（SQLite）文件，重复的台词直接使用缓存的译文；None表示不缓存
+            translation_memory_similarity: 翻译记忆的相似度阈值，与翻译过的原文足够相似（OCR识别错几个字符）时复用译文；None表示关闭
+            stream_translation: 流式翻译，译文每完成一句/一个分句就交给TTS，不等整段译完
+            translation_providers: 翻译接口配置（见 translator.create_provider），列表表示按延迟和错误率路由、失败时依次换下一个，
+                例如 ["deepseek", "local", {"provider": "dictionary", "partial": True}]
+            dialogue_context_tokens: 请求中带上的前文（最近的原文和译文）的token预算，人名和语气前后一致，但每次请求的prompt更长、计费更高；前缀保持稳定以命中接口的上下文缓存，减少这部分开销；0表示每句单独翻译
+            adaptive_capture: 是否根据画面变化自适应调整截图周期
+            min_capture_interval: 画面刚变化时的最短截图周期
+            max_capture_interval: 画面长时间静止时的最长截图周期
+            queue_size: 流水线各阶段之间队列的容量，满了丢弃最旧的数据
+            metrics_dump_path: 延迟统计定期输出的JSON文件路径，None表示不输出
+            metrics_dump_interval: 延迟统计输出间隔（秒）
+            warm_up: 模型加载后先用假数据推理一次，避免第一句文本承担CUDA/cuDNN初始化开销
+            ocr: 已创建的OCR对象，None时按 ocr_languages/ocr_use_gpu 创建 GameOCR
+            translator: 已创建的翻译对象，None时创建默认 Translator
+            audio_entry: 音频进程入口函数 (cmd_queue, event_queue)，None时使用VoxCPM音频进程
         """
         # 默认参数
         if ocr_languages is None:
             ocr_languages = ['en']
     
         self.capture_interval = capture_interval
+        if adaptive_capture:
+            self.scheduler = AdaptiveScheduler(
+                target_interval=capture_interval,
+                min_interval=min_capture_interval,
+                max_interval=max_capture_interval
+            )
+        else:
+            # 固定周期：最短/最长周期都等于目标周期
+            self.scheduler = AdaptiveScheduler(
+                target_interval=capture_interval,
+                min_interval=capture_interval,
+                max_interval=capture_interval
+            )
         self.max_text_length = max_text_length
         self.running = False
         self.initialized = False  # 新增：初始化状态标志
         
-        # 初始化OCR模块
-        self.ocr = GameOCR(
+        # 各阶段延迟统计
+        self.metrics = MetricsRegistry()
+        if metrics_dump_path:
+            self.metrics.start_periodic_dump(metrics_dump_path, metrics_dump_interval)
+        
+        # 模型就绪状态：OCR和TTS模型在后台并行加载，GUI可轮询 get_readiness()
+        self.warm_up = warm_up
+        self._created_at = time.perf_counter()
+        self._readiness_lock = threading.Lock()
+        self._readiness = {
+            "ocr": {"state": LOADING, "seconds": 0.0, "error": None},
+            "tts": {"state": LOADING, "seconds": 0.0, "error": None},
+        }
+        self._ocr_loaded = threading.Event()
+        # 主循环（包括退出时停止流水线、保存排除集）已结束；shutdown() 等它结束后才释放资源
+        self._main_loop_done = threading.Event()
+        self._main_loop_done.set()
+        # shutdown() 之后后台加载完成的OCR进程池由加载线程自行关闭
+        self._shutdown = False
+        
+        # OCR模块（可放到独立进程中，帧经共享内存传递），加载完成前为 None
+        self.ocr_workers = max(1, ocr_processes)
+        self.ocr = ocr
+        self._ocr_processes = ocr_processes
+        self._ocr_exclude_set = set(ocr_exclude_set or ())
+        self._ocr_kwargs = dict(
             languages=ocr_languages,
             gpu=ocr_use_gpu,
-            exclude_set=ocr_exclude_set
+            exclude_set=ocr_exclude_set,
+            reuse_boxes=ocr_reuse_boxes,
+            min_confidence=ocr_min_confidence,
+            engine=ocr_engine,
+            **(ocr_options or {})
         )
+        if ocr_engine == CPUEasyOCREngine.name and ocr_processes > 1:
+            # 多个OCR进程平分CPU核心，避免线程数超过核心数
+            engine_options = dict(self._ocr_kwargs.get("engine_options") or {})
+            engine_options.setdefault("num_threads", max(1, default_num_threads() // ocr_processes))
+            self._ocr_kwargs["engine_options"] = engine_options
+        
+        # 截图后端
+        capture_options = dict(capture_options or {})
+        self.capturer: CaptureBackend = create_capture_backend(capture_backend, **capture_options)
+        
+        # 画面变化检测（静止画面跳过OCR）
+        self.skip_static_frames = skip_static_frames
+        self.frame_detector = FrameChangeDetector(threshold=frame_change_threshold)
+        
+        # 瓦片级变化跟踪（只OCR变化的区域）
+        # 多个OCR线程并行时相邻帧不再按顺序识别，脏区域无意义
+        self.ocr_dirty_tiles = ocr_dirty_tiles and self.ocr_workers == 1
+        self.tile_tracker = TileChangeTracker()
         
         # 初始化翻译模块（内部已集成Checker）
-        self.translator = Translator()
+        if translator is None:
+            cache = TranslationCache(translation_cache_path) if translation_cache_path else None
+            memory = (
+                TranslationMemory(similarity=translation_memory_similarity)
+                if translation_memory_similarity is not None else None
+            )
+            context = DialogueContext(dialogue_context_tokens) if dialogue_context_tokens > 0 else None
+            translator = Translator(
+                ai_engine=translation_providers, checker=Checker(mode=checker_mode), cache=cache, memory=memory,
+                context=context,
+            )
+        self.translator = translator
+        if warm_up:
+            # 预先连接翻译接口（DNS、TLS握手），不阻塞启动，失败也不影响后续翻译
+            threading.Thread(target=self._warm_up_translator, name="translator-warm-up", daemon=True).start()
         
-        # 初始化音频进程
+        # 初始化音频进程（event_queue 回报首个音频块时间）
+        if audio_entry is None:
+            # 按需导入，避免无声卡环境（如基准测试）加载TTS依赖
+            from voxcpm_tts.tts.audio_process import audio_process_entry
+            audio_entry = functools.partial(audio_process_entry, warm_up=warm_up)
         self.audio_cmd_queue = mp.Queue()
+        self.audio_event_queue = mp.Queue()
         self.audio_process = mp.Process(
-            target=audio_process_entry,
-            args=(self.audio_cmd_queue,),
+            target=audio_entry,
+            args=(self.audio_cmd_queue, self.audio_event_queue),
             daemon=True
         )
         
@@ -70,11 +224,35 @@ class GameTranslationController:
         self.audio_process.start()
         logger.info("音频进程已启动（预加载TTS模型）")
         
+        # 接收音频进程事件的线程
+        self._audio_event_thread = threading.Thread(target=self._audio_event_loop, daemon=True)
+        self._audio_event_thread.start()
+        
         # 截图区域
         self.capture_region: Optional[Tuple[int, int, int, int]] = None
         
+        # 流水线（每次start时重新创建）
+        self.queue_size = queue_size
+        self.stream_translation = stream_translation
+        # 每句译文的编号，流式翻译的各个分段带同一个编号，音频进程据此续接播放
+        self._utterance_ids = itertools.count(1)
+        self.pipeline: Optional[Pipeline] = None
+        
+        # 当前文本首次出现在屏幕上的时间，用于统计"文本出现→首个音频"的端到端延迟
+        self._last_ocr_text = ""
+        self._text_origin = 0.0
+        # 多个OCR线程时结果可能乱序到达，只接受比上一个结果更新的帧
+        self._ocr_result_lock = threading.Lock()
+        self._last_ocr_captured_at = 0.0
+        # 已通知音频进程的最新原文编号，更旧的句子不再播放
+        self._audio_generation = 0
+        
+        # 后台加载OCR模型，与音频进程中的TTS模型加载并行
+        self._ocr_loader = threading.Thread(target=self._load_ocr, name="ocr-loader", daemon=True)
+        self._ocr_loader.start()
+        
         self.initialized = True  # 标记为已初始化
-        logger.info("游戏翻译控制器初始化完成（音频进程已启动）")
+        logger.info("游戏翻译控制器初始化完成（OCR与TTS模型后台加载中）")
     
     def set_capture_region(self, region: Tuple[int, int, int, int]):
         """
@@ -106,11 +284,27 @@ class GameTranslationController:
             logger.error("控制器未正确初始化")
             return
         
+        # 等待OCR模型加载完成（TTS未就绪时，speak命令会在音频进程中排队）
+        if not self._ocr_loaded.is_set():
+            logger.info("等待OCR模型加载完成...")
+            self._ocr_loaded.wait()
+        if self.ocr is None:
+            logger.error("OCR模型加载失败，无法开始翻译")
+            return
+        
         # 设置截图区域
         self.set_capture_region(region)
+        self.frame_detector.reset()
+        self.tile_tracker.reset()
+        self._last_ocr_captured_at = 0.0
         
         # 不再需要启动音频进程，因为已经在__init__中启动了
+        # 启动 OCR/Checker → 翻译 → TTS 各阶段线程
+        self.pipeline = self._build_pipeline()
+        self.pipeline.start()
+        
         # 设置运行标志
+        self._main_loop_done.clear()
         self.running = True
         
         # 在主线程中运行主循环（避免阻塞GUI）
@@ -124,36 +318,116 @@ class GameTranslationController:
             return
         
         self.running = False
+        self.scheduler.wake()
         logger.info("正在停止翻译流程...")
         
         # 不再停止音频进程，只停止主循环
-        # 保存OCR排除集
-        self._save_ocr_exclude_set()
-        
+        # 流水线在主循环退出时停止，随后保存OCR排除集
         logger.info("翻译流程已停止（音频进程保持运行）")
 
-    def shutdown(self):
-        """完全关闭控制器，包括音频进程"""
-        # 先停止主循环
+    def shutdown(self, timeout: float = 10.0):
+        """
+        完全关闭控制器，包括音频进程
+        timeout: 等待主循环退出（流水线停止、排除集保存完毕）的最长秒数
+        """
+        # 先停止主循环，等它收尾后再释放各阶段还在使用的资源
         if self.running:
             self.stop()
+        if not self._main_loop_done.wait(timeout):
+            logger.warning(f"主循环未在{timeout:.0f}秒内退出，继续关闭")
         
         # 停止音频进程
         self._stop_audio_process()
+        self.metrics.stop_periodic_dump()
+        
+        # 释放截图后端
+        self.capturer.close()
+        
+        # 结束OCR工作进程并释放共享内存；仍在后台加载时由加载线程在完成后关闭
+        with self._readiness_lock:
+            self._shutdown = True
+            ocr = self.ocr if self._ocr_loaded.is_set() else None
+        if isinstance(ocr, OCRWorkerPool):
+            ocr.close()
+        
+        # 关闭翻译接口的连接池
+        self.translator.ai_engine.close()
         
         logger.info("控制器已完全关闭")
     
+    def _load_ocr(self):
+        """后台加载并预热OCR模型"""
+        try:
+            ocr = self.ocr
+            if ocr is None:
+                if self._ocr_processes > 0:
+                    ocr = OCRWorkerPool(
+                        num_workers=self._ocr_processes,
+                        slots=self.queue_size + self._ocr_processes + 1,
+                        warm_up=self.warm_up,
+                        **self._ocr_kwargs
+                    )
+                    # 各工作进程自行加载并预热，全部完成后才就绪
+                    ocr.wait_ready()
+                    if ocr.error is not None:
+                        ocr.close()
+                        raise RuntimeError(ocr.error)
+                    logger.info(f"OCR工作进程已就绪: {self._ocr_processes}个")
+                else:
+                    ocr = GameOCR(**self._ocr_kwargs)
+                    if self.warm_up:
+                        self._set_readiness("ocr", WARMING)
+                        ocr.warm_up()
+            elif self.warm_up and hasattr(ocr, "warm_up"):
+                self._set_readiness("ocr", WARMING)
+                ocr.warm_up()
+            
+            with self._readiness_lock:
+                shutdown = self._shutdown
+                if not shutdown:
+                    self.ocr = ocr
+            if shutdown:
+                if isinstance(ocr, OCRWorkerPool):
+                    ocr.close()
+                logger.info("控制器已关闭，丢弃后台加载的OCR模型")
+                return
+            self._set_readiness("ocr", READY)
+        except Exception as e:
+            logger.error(f"OCR模型加载失败: {e}", exc_info=True)
+            self._set_readiness("ocr", FAILED, repr(e))
+        finally:
+            self._ocr_loaded.set()
+    
+    def _warm_up_translator(self):
+        """后台预连接翻译接口"""
+        with self.metrics.timer("translator_warm_up"):
+            self.translator.warm_up()
+    
+    def _set_readiness(self, component: str, state: str, error: Optional[str] = None):
+        """更新模型就绪状态；就绪或失败时记录从创建控制器起的耗时"""
+        seconds = time.perf_counter() - self._created_at
+        with self._readiness_lock:
+            entry = self._readiness[component]
+            entry["state"] = state
+            entry["seconds"] = seconds
+            entry["error"] = error
+        if state in (READY, FAILED):
+            self.metrics.observe(f"{component}_startup", seconds)
+        logger.info(f"{component}模型状态: {state}（{seconds:.1f}s）")
+    
     def _run_main_loop(self):
         """运行主循环"""
         logger.info("开始翻译主循环")
         
+        self.scheduler.start()
         try:
             while self.running:
                 # 执行一个处理周期
                 self._process_cycle()
                 
-                # 等待下一个周期
-                time.sleep(self.capture_interval)
+                # 等待到下一个截止时间（已扣除本周期的处理耗时）
+                self.scheduler.frame_done(changed=self.frame_detector.last_changed)
+                self.scheduler.wait()
                 
         except KeyboardInterrupt:
             logger.info("收到中断信号")
@@ -161,31 +435,131 @@ class GameTranslationController:
         except Exception as e:
             logger.error(f"主循环发生错误: {e}", exc_info=True)
             self.stop()
+        finally:
+            try:
+                # 等待各阶段处理完手头的数据后退出，再保存OCR排除集
+                if self.pipeline is not None:
+                    self.pipeline.stop()
+                self._save_ocr_exclude_set()
+                # mss 的句柄属于截图线程，在这里释放
+                self.capturer.release()
+            finally:
+                self._main_loop_done.set()
+    
+    def _build_pipeline(self) -> Pipeline:
+        """创建 OCR/Checker → 翻译 → TTS 流水线（流式翻译时翻译阶段直接把分段发给音频进程）"""
+        pipeline = (
+            Pipeline(queue_size=self.queue_size)
+            .add_stage("ocr", self._ocr_stage, workers=self.ocr_workers)
+        )
+        # prefix 模式下同一段文本会逐句放行，翻译忙时合并成一段，不能按 latest-wins 丢弃
+        if self.stream_translation:
+            return pipeline.add_stage("translate", self._translate_stream_stage, merge=merge_segments)
+        return (
+            pipeline
+            .add_stage("translate", self._translate_stage, merge=merge_segments)
+            .add_stage("speak", self._speak_stage)
+        )
     
     def _process_cycle(self):
-        """单个处理周期：截图→OCR→翻译→TTS"""
+        """单个截图周期：截图→变化检测→送入流水线"""
         try:
             # 1. 截图
-            screenshot = self._capture_screen()
+            with self.metrics.timer("capture"):
+                screenshot = self._capture_screen()
             if screenshot is None:
                 return
+            captured_at = time.time()
             
-            # 2. OCR识别
-            ocr_text = self._perform_ocr(screenshot)
-            if not ocr_text:
-                return
-            
-            # 3. 翻译（内部已包含Checker检查）
-            translated_text = self._perform_translation(ocr_text)
-            if not translated_text:
+            # 2. 画面没有变化则跳过OCR
+            with self.metrics.timer("frame_check"):
+                if self.skip_static_frames:
+                    process = self.frame_detector.should_process(screenshot)
+                else:
+                    self.frame_detector.detect(screenshot)
+                    process = True
+            if not process:
                 return
             
-            # 4. TTS播放
-            self._speak_text(translated_text)
+            # 3. 交给OCR阶段（队列满时丢弃旧帧）
+            if self.pipeline is not None:
+                self.pipeline.put((screenshot, captured_at))
             
         except Exception as e:
             logger.error(f"处理周期发生错误: {e}", exc_info=True)
     
+    def _ocr_stage(self, item: Tuple[np.ndarray, float]) -> Optional[Tuple[str, float, int]]:
+        """OCR阶段：识别文本并经Checker检查，只把需要翻译的文本传给下游"""
+        image, captured_at = item
+        with self.metrics.timer("ocr"):
+            ocr_text = self._perform_ocr(image)
+        if not ocr_text:
+            return None
+        
+        with self._ocr_result_lock:
+            if captured_at < self._last_ocr_captured_at:
+                self.metrics.incr("ocr_stale_dropped")
+                return None
+            self._last_ocr_captured_at = captured_at
+            
+            self._track_text_origin(ocr_text, captured_at)
+            with self.metrics.timer("checker"):
+                segment = self.translator.check_segment(ocr_text)
+            origin = self._text_origin
+            generation = self.translator.checker.generation
+        if segment is None:
+            return None
+        # 换成了新的一段文本：还在排队或翻译中的旧文本作废，不再调用接口、不再播放
+        self.translator.cancel_before(generation)
+        with self._ocr_result_lock:
+            newer = generation > self._audio_generation
+            if newer:
+                self._audio_generation = generation
+        if newer:
+            # 音频进程中已排队的旧句子分段（流式翻译已发出的）也一并丢弃
+            self.audio_cmd_queue.put({"type": "drop_before", "generation": generation})
+        return segment, origin, generation
+    
+    def _translate_stage(self, item: Tuple[str, float, int]) -> Optional[Tuple[str, float, int]]:
+        """翻译阶段"""
+        text, origin, generation = item
+        with self.metrics.timer("translate"):
+            translated_text = self._perform_translation(text, generation)
+        if not translated_text:
+            return None
+        return translated_text, origin, generation
+    
+    def _translate_stream_stage(self, item: Tuple[str, float, int]) -> None:
+        """流式翻译阶段：每切出一段译文就发给音频进程，同一句的分段带相同的 utterance"""
+        text, origin, generation = item
+        utterance = next(self._utterance_ids)
+        start = time.perf_counter()
+        try:
+            for i, segment in enumerate(self.translator.translate_stream(text, generation)):
+                if i == 0:
+                    self.metrics.observe("translate_first_segment", time.perf_counter() - start)
+                logger.debug(f"译文分段: {segment[:50]}")
+                with self.metrics.timer("speak_dispatch"):
+                    self._speak_text(segment, origin, utterance, generation)
+        except Exception as e:
+            logger.error(f"翻译失败: {e}")
+        self.metrics.observe("translate", time.perf_counter() - start)
+    
+    def _speak_stage(self, item: Tuple[str, float, int]) -> None:
+        """TTS阶段：把译文发送给音频进程，等待期间已被新文本取代的译文不再播放"""
+        text, origin, generation = item
+        if self.translator.is_stale(generation):
+            self.metrics.incr("tts_stale_dropped")
+            return
+        with self.metrics.timer("speak_dispatch"):
+            self._speak_text(text, origin, generation=generation)
+    
+    def _track_text_origin(self, text: str, captured_at: float):
+        """文本与上一帧明显不同时，记为新文本首次出现的时间"""
+        if not is_similar(text, self._last_ocr_text, self.translator.checker.similarity):
+            self._text_origin = captured_at
+        self._last_ocr_text = text
+    
     def _capture_screen(self) -> Optional[np.ndarray]:
         """截图并返回numpy数组"""
         try:
@@ -205,13 +579,10 @@ class GameTranslationController:
                 logger.error(f"无效的截图区域: {self.capture_region}")
                 return None
             
-            # 使用pyautogui截图（需要width, height格式）
-            screenshot = pyautogui.screenshot(region=(x, y, width, height))
-            
-            # 转换为numpy数组（OpenCV格式）
-            img_array = np.array(screenshot)
-            # 转换颜色空间 BGR -> RGB
-            img_array = img_array[:, :, ::-1].copy()
+            # 截图后端直接返回BGR格式（OpenCV格式）的numpy数组
+            img_array = self.capturer.grab((x, y, width, height))
+            if img_array is None:
+                return None
             
             logger.debug(f"截图成功: 区域({x1}, {y1}, {x2}, {y2}) -> ({x}, {y}, {width}, {height})")
             return img_array
@@ -231,7 +602,9 @@ class GameTranslationController:
         #     logger.error(f"OCR识别失败: {e}")
         #     return ""
         try:
-            text = self.ocr.img_to_text(image)
+            # 与上一次OCR的帧比较，只重新识别变化的区域
+            dirty_rects = self.tile_tracker.update(image) if self.ocr_dirty_tiles else None
+            text = self.ocr.img_to_text(image, dirty_rects=dirty_rects)
             if text:
                 logger.debug(f"OCR识别结果: {text[:50]}...")  # 只显示前50个字符
             return text
@@ -239,11 +612,10 @@ class GameTranslationController:
             logger.error(f"OCR识别失败: {e}")
             return ""
     
-    def _perform_translation(self, text: str) -> str:
-        """执行翻译"""
+    def _perform_translation(self, text: str, generation: Optional[int] = None) -> str:
+        """执行翻译（文本已在OCR阶段通过Checker检查）"""
         try:
-            # Translator内部已经集成了Checker
-            translated_text = self.translator.translate(text)
+            translated_text = self.translator.translate_stable(text, generation)
             if translated_text:
                 logger.debug(f"翻译结果: {translated_text[:50]}...")  # 只显示前50个字符
             return translated_text
@@ -251,8 +623,22 @@ class GameTranslationController:
             logger.error(f"翻译失败: {e}")
             return ""
     
-    def _speak_text(self, text: str):
-        """通过TTS播放文本"""
+    def _speak_text(
+        self,
+        text: str,
+        origin: Optional[float] = None,
+        utterance: Optional[int] = None,
+        generation: Optional[int] = None,
+    ):
+        """
+        通过TTS播放文本
+        
+        Args:
+            text: 要播放的文本
+            origin: 原文出现在屏幕上的时间（time.time()），用于端到端延迟统计
+            utterance: 译文编号，同一句的多个分段接着播放；None表示独立的一句
+            generation: 原文编号（Checker.generation），被更新的文本取代后音频进程不再播放
+        """
         try:
             # 限制文本长度
             if len(text) > self.max_text_length:
@@ -261,7 +647,10 @@ class GameTranslationController:
             # 发送语音命令
             self.audio_cmd_queue.put({
                 "type": "speak",
-                "text": text
+                "text": text,
+                "origin": origin,
+                "utterance": utterance,
+                "generation": generation,
             })
             logger.debug(f"发送TTS命令: {text[:30]}...")
             
@@ -279,9 +668,32 @@ class GameTranslationController:
                 logger.info("音频进程已停止")
         except Exception as e:
             logger.error(f"停止音频进程失败: {e}")
+        finally:
+            # 结束事件接收线程
+            self.audio_event_queue.put(None)
+            self._audio_event_thread.join(timeout=1)
+    
+    def _audio_event_loop(self):
+        """接收音频进程回报的事件并记录延迟"""
+        while True:
+            try:
+                event = self.audio_event_queue.get()
+            except (EOFError, OSError):
+                break
+            if event is None:
+                break
+            
+            if event.get("type") == "readiness":
+                self._set_readiness(event["component"], event["state"], event.get("error"))
+            elif event.get("type") == "first_audio":
+                self.metrics.observe("tts_first_chunk", event["synth_seconds"])
+                if event.get("origin"):
+                    self.metrics.observe("glass_to_ear", event["time"] - event["origin"])
     
     def _save_ocr_exclude_set(self):
         """保存OCR排除集"""
+        if self.ocr is None:
+            return
         try:
             self.ocr.save_exclude_set()
             logger.info("OCR排除集已保存")
@@ -290,8 +702,64 @@ class GameTranslationController:
     
     def get_ocr_exclude_set(self) -> set:
         """获取OCR排除集"""
+        if self.ocr is None:
+            return self._ocr_exclude_set
         return self.ocr.exclude_set
     
+    def get_frame_stats(self) -> dict:
+        """获取跳帧统计：已处理帧数、跳过帧数、跳过比例"""
+        return self.frame_detector.stats()
+    
+    def get_ocr_stats(self) -> dict:
+        """获取OCR统计：检测次数、识别/复用的文本行数、识别缓存命中率"""
+        if self.ocr is None:
+            return {}
+        return self.ocr.stats()
+    
+    def get_checker_stats(self) -> dict:
+        """获取Checker统计：放行次数、判定延迟（文本完整出现到放行经过的帧数）"""
+        return self.translator.checker.stats()
+    
+    def get_translation_stats(self) -> dict:
+        """获取翻译统计：作废请求省下的调用、中途停止的流式翻译、丢弃的译文，各翻译接口的请求数、超时、对冲与延迟分布，翻译缓存和翻译记忆的条目数、命中/未命中次数、命中率、近似命中数、查询耗时"""
+        return self.translator.stats()
+    
+    def get_scheduler_stats(self) -> dict:
+        """获取调度统计：实际FPS、当前周期、迟到帧数与迟到时长"""
+        return self.scheduler.stats()
+    
+    def get_pipeline_stats(self) -> dict:
+        """获取流水线各阶段统计：队列深度、丢弃数、处理数、忙碌时间"""
+        if self.pipeline is None:
+            return {}
+        return self.pipeline.stats()
+    
+    def get_metrics(self) -> dict:
+        """
+        获取延迟统计快照
+        latency 中包含各阶段（capture、frame_check、ocr、checker、translate、translate_first_segment（流式翻译首段）、speak_dispatch）、
+        tts_first_chunk（TTS首个音频块耗时）和 glass_to_ear（文本出现→首个音频）的 p50/p95/p99
+        """
+        return self.metrics.snapshot()
+    
+    def get_readiness(self) -> dict:
+        """
+        获取模型就绪状态，例如
+        {'ocr': {'state': 'ready', 'seconds': 4.2, 'error': None}, 'tts': {'state': 'warming', ...}}
+        state 为 loading / warming / ready / failed，seconds 为创建控制器到进入该状态的耗时
+        """
+        with self._readiness_lock:
+            return {name: dict(entry) for name, entry in self._readiness.items()}
+    
+    def is_ready(self) -> bool:
+        """OCR和TTS模型是否都已就绪"""
+        return all(entry["state"] == READY for entry in self.get_readiness().values())
+    
+    def wait_ocr_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待OCR模型加载结束（成功或失败），返回是否加载成功"""
+        self._ocr_loaded.wait(timeout)
+        return self.ocr is not None and self._ocr_loaded.is_set()
+    
     def is_running(self) -> bool:
         """检查是否正在运行"""
         return self.running
@@ -0,0 +1,131 @@
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# 告诉模型前面的对话只是上下文
+CONTEXT_HINT = "之前的对话是同一个游戏中的前文及其译文，供保持人名、语气和术语一致，只翻译最后一条。"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略的token数：英文约每3~4个字符一个token，中日韩文字约每个字0.6个token"""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return int(ascii_chars * 0.3 + (len(text) - ascii_chars) * 0.6) + 1
+
+
+class DialogueContext:
+    """
+    滚动的对话上下文：请求 = 固定的系统提示 + 只追加的历史（最近的 原文/译文 对）+ 当前原文。
+    历史让模型看到前文，人名和语气前后一致，代价是每次请求的prompt更长（比每句单独翻译更贵、首token更慢）；
+    前缀保持不变，服务端的上下文缓存（Deepseek、OpenAI 按前缀命中）就能复用之前算过的部分，把这部分代价压低。
+
+    超出 max_tokens 时一次丢弃最早的一大段（保留到 keep_fraction），而不是每次只丢最早的一条：
+    逐条丢弃时每次请求的开头都变了，缓存永远命中不了。
+    """
+
+    def __init__(self, max_tokens: int = 1500, keep_fraction: float = 0.5, max_turn_chars: int = 400):
+        """
+        max_tokens: 历史部分的token预算（估算值）
+        keep_fraction: 超出预算时保留的比例；1.0 表示每次只丢弃刚好够的条数（滑动窗口，前缀不稳定）
+        max_turn_chars: 单条原文/译文的最大长度，过长的不计入历史
+        """
+        self.max_tokens = max_tokens
+        self.keep_fraction = keep_fraction
+        self.max_turn_chars = max_turn_chars
+
+        self._lock = threading.Lock()
+        # (原文, 译文, 估算token数)
+        self._turns: list[tuple[str, str, int]] = []
+        self._tokens = 0
+        self.trims = 0
+
+    def messages(self, system_prompt: str, text: str) -> list[dict]:
+        """构造请求消息：系统提示 + 历史 + 当前原文"""
+        with self._lock:
+            turns = list(self._turns)
+        messages = [{"role": "system", "content": f"{system_prompt}\n{CONTEXT_HINT}"}]
+        for source, translation, _ in turns:
+            messages.append({"role": "user", "content": source})
+            messages.append({"role": "assistant", "content": translation})
+        messages.append({"role": "user", "content": text})
+        return messages
+
+    def append(self, source: str, translation: str) -> None:
+        """记录一条已完成的翻译"""
+        if not source or not translation:
+            return
+        if len(source) > self.max_turn_chars or len(translation) > self.max_turn_chars:
+            return
+        tokens = estimate_tokens(source) + estimate_tokens(translation)
+        with self._lock:
+            if self._turns and self._turns[-1][0] == source:
+                # 同一句重复出现（重读、读档）不重复记录
+                return
+            self._turns.append((source, translation, tokens))
+            self._tokens += tokens
+            if self._tokens > self.max_tokens:
+                self._trim()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._turns.clear()
+            self._tokens = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "context_turns": len(self._turns),
+                "context_tokens": self._tokens,
+                "context_trims": self.trims,
+            }
+
+    def __len__(self) -> int:
+        return len(self._turns)
+
+    def _trim(self) -> None:
+        """丢弃最早的若干条，直到不超过 max_tokens * keep_fraction"""
+        target = self.max_tokens * self.keep_fraction
+        drop = 0
+        tokens = self._tokens
+        while drop < len(self._turns) and tokens > target:
+            tokens -= self._turns[drop][2]
+            drop += 1
+        del self._turns[:drop]
+        self._tokens = tokens
+        self.trims += 1
+        logger.debug("Dialogue context trimmed %d turns, %d tokens left", drop, tokens)
+
+
+def usage_tokens(usage) -> Optional[dict]:
+    """
+    从接口返回的 usage 中取出 prompt/缓存命中/生成的token数，兼容两种字段：
+    Deepseek 的 prompt_cache_hit_tokens，OpenAI 的 prompt_tokens_details.cached_tokens
+    usage 可以是 openai 的对象或解析出来的字典；没有 usage 时返回 None
+    """
+    if usage is None:
+        return None
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    cached = usage.get("prompt_cache_hit_tokens")
+    if cached is None:
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or 0,
+        "cache_hit_tokens": cached,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+    }
+
+
+if __name__ == "__main__":
+    context = DialogueContext(max_tokens=60)
+    lines = [
+        ("Where have you been all this time?", "你这段时间去哪儿了？"),
+        ("I found a strange key in the cellar.", "我在地窖里找到了一把奇怪的钥匙。"),
+        ("We should leave before nightfall.", "我们应该在天黑前离开。"),
+        ("Nobody has lived here for years.", "这里已经很多年没人住了。"),
+    ]
+    for source, translation in lines:
+        print(len(context.messages("翻译成中文", source)), context.stats())
+        context.append(source, translation)
+    print(usage_tokens({"prompt_tokens": 120, "prompt_cache_hit_tokens": 64, "completion_tokens": 12}))
@@ -0,0 +1,364 @@
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional, TextIO, Union
+
+import Levenshtein
+
+logger = logging.getLogger(__name__)
+
+# OCR把数字认成字母的常见混淆（小写后），只在含数字的词中替换
+_CONFUSABLES = str.maketrans({
+    "o": "0",
+    "l": "1", "i": "1", "|": "1", "!": "1",
+    "s": "5",
+    "b": "8",
+    "z": "2",
+})
+# 近似匹配只对这个长度范围内的归一化文本建索引：太短容易误伤，太长索引太大
+MIN_FUZZY_LENGTH = 4
+MAX_FUZZY_LENGTH = 48
+
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    小写并去掉空白；含数字的词先把易混淆字母换成数字，再把每串数字统一成一个 '#'
+    "HP 100"、"HP 1O0"、"HP 95" 归一化后相同，HUD上跳动的数字不再算作新文本
+    """
+    tokens = []
+    for token in text.lower().split():
+        if any(c.isdigit() for c in token):
+            token = _DIGITS.sub("#", token.translate(_CONFUSABLES))
+        tokens.append(token)
+    return "".join(tokens)
+
+
+def _deletes(text: str) -> set[str]:
+    """删除一个字符得到的所有变体（symmetric delete）"""
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+class ExcludeLearner:
+    """
+    从非对话框文本中学习需要屏蔽的HUD/UI文本
+
+    - 候选计数：同一归一化文本出现 threshold 次即加入屏蔽集；
+      每 decay_interval 次观察所有计数乘以 decay 并丢弃接近0的，
+      超过 max_candidates 时一次淘汰计数最小的一批，内存有界
+    - 屏蔽集：按最近命中排序，超过 max_excluded 时淘汰最久未命中的
+    - 查询：归一化后精确匹配 O(1)；未命中时用删除一个字符的变体索引查近似文本，
+      再用编辑距离确认（编辑距离 ≤ 1），每行 O(文本长度) 次字典查询
+    - 线程安全：OCR线程学习/查询，GUI或保存线程读取快照，都经过 lock；
+      on_change 在持有 lock 时调用，持久化时可在同一个锁下压缩日志
+    """
+
+    def __init__(
+        self,
+        threshold: int = 3,
+        max_candidates: int = 1000,
+        decay: float = 0.5,
+        decay_interval: int = 500,
+        max_excluded: int = 5000,
+        fuzzy: bool = True,
+        initial: Optional[Iterable[str]] = None,
+        on_change: Optional[Callable[[str, str], None]] = None,
+    ):
+        """
+        initial: 初始屏蔽文本（例如从日志加载的），不触发 on_change
+        on_change: 屏蔽集变化时的回调 (op, text)，op 为 'add' 或 'remove'，用于持久化
+        """
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.decay = decay
+        self.decay_interval = decay_interval
+        self.max_excluded = max_excluded
+        self.fuzzy = fuzzy
+        # 可重入：on_change 回调中压缩日志时会再次遍历屏蔽集
+        self.lock = threading.RLock()
+
+        # 归一化文本 -> 计数
+        self._counts: dict[str, float] = {}
+        self._observations = 0
+        # 归一化文本 -> 原文（代表），按最近命中排序
+        self._excluded: OrderedDict[str, str] = OrderedDict()
+        # 删除变体 -> 归一化文本集合
+        self._variants: dict[str, set[str]] = {}
+
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+
+        self.on_change: Optional[Callable[[str, str], None]] = None
+        for text in initial or ():
+            self.add(text)
+        self.on_change = on_change
+
+    # ---------- query ----------
+
+    def __contains__(self, text: str) -> bool:
+        return self.match(text) is not None
+
+    def match(self, text: str) -> Optional[str]:
+        """返回匹配到的屏蔽文本（原文），没有匹配返回 None"""
+        norm = normalize_text(text)
+        if not norm:
+            return None
+        with self.lock:
+            if norm in self._excluded:
+                self._excluded.move_to_end(norm)
+                self.exact_hits += 1
+                return self._excluded[norm]
+
+            key = self._fuzzy_lookup(norm)
+            if key is None:
+                return None
+            self._excluded.move_to_end(key)
+            self.fuzzy_hits += 1
+            return self._excluded[key]
+
+    def __len__(self) -> int:
+        return len(self._excluded)
+
+    def __iter__(self) -> Iterator[str]:
+        """遍历当前屏蔽集的快照"""
+        with self.lock:
+            return iter(list(self._excluded.values()))
+
+    @property
+    def excluded(self) -> set[str]:
+        with self.lock:
+            return set(self._excluded.values())
+
+    # ---------- learning ----------
+
+    def observe(self, text: str) -> bool:
+        """记录一次非对话框文本；达到阈值加入屏蔽集时返回 True"""
+        norm = normalize_text(text)
+        if not norm:
+            return False
+        with self.lock:
+            if norm in self._excluded:
+                return False
+
+            count = self._counts.get(norm, 0.0) + 1
+            self._observations += 1
+            if count >= self.threshold:
+                self._counts.pop(norm, None)
+                self.add(text)
+                return True
+
+            self._counts[norm] = count
+            if len(self._counts) > self.max_candidates:
+                self._evict_candidates()
+            if self._observations % self.decay_interval == 0:
+                self._decay_candidates()
+            return False
+
+    def add(self, text: str) -> None:
+        norm = normalize_text(text)
+        if not norm:
+            return
+        with self.lock:
+            if norm in self._excluded:
+                self._excluded.move_to_end(norm)
+                return
+            self._excluded[norm] = text
+            if self._indexable(norm):
+                for variant in _deletes(norm) | {norm}:
+                    self._variants.setdefault(variant, set()).add(norm)
+            if self.on_change is not None:
+                self.on_change("add", text)
+            while len(self._excluded) > self.max_excluded:
+                self._remove(next(iter(self._excluded)))
+
+    def discard(self, text: str) -> None:
+        norm = normalize_text(text)
+        with self.lock:
+            if norm in self._excluded:
+                self._remove(norm)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "exclude_size": len(self._excluded),
+                "exclude_candidates": len(self._counts),
+                "exclude_index_size": len(self._variants),
+                "exclude_exact_hits": self.exact_hits,
+                "exclude_fuzzy_hits": self.fuzzy_hits,
+            }
+
+    # ---------- internal ----------
+
+    def _indexable(self, norm: str) -> bool:
+        return self.fuzzy and MIN_FUZZY_LENGTH <= len(norm) <= MAX_FUZZY_LENGTH
+
+    def _fuzzy_lookup(self, norm: str) -> Optional[str]:
+        if not self._indexable(norm):
+            return None
+        for variant in _deletes(norm) | {norm}:
+            for key in self._variants.get(variant, ()):
+                if Levenshtein.distance(norm, key, score_cutoff=1) <= 1:
+                    return key
+        return None
+
+    def _remove(self, norm: str) -> None:
+        text = self._excluded.pop(norm)
+        if self.on_change is not None:
+            self.on_change("remove", text)
+        if not self._indexable(norm):
+            return
+        for variant in _deletes(norm) | {norm}:
+            keys = self._variants.get(variant)
+            if keys is None:
+                continue
+            keys.discard(norm)
+            if not keys:
+                del self._variants[variant]
+
+    def _decay_candidates(self) -> None:
+        """老化：计数整体衰减，长期不再出现的候选被丢弃"""
+        self._counts = {
+            norm: count * self.decay
+            for norm, count in self._counts.items()
+            if count * self.decay >= 0.5
+        }
+
+    def _evict_candidates(self) -> None:
+        """超出容量时一次淘汰计数最小的10%，均摊下来每次观察 O(log n)"""
+        n = max(1, len(self._counts) // 10)
+        for norm in sorted(self._counts, key=self._counts.__getitem__)[:n]:
+            del self._counts[norm]
+
+
+class ExcludeJournal:
+    """
+    排除集的追加式日志（JSON Lines）
+    每行 {"op": "add" | "remove", "text": ...}，学到新文本时立即追加并flush，进程崩溃也不会丢失；
+    日志中的失效行（被删除、重复）过多时压缩成当前集合的快照（写临时文件后原子替换）。
+    首次使用时自动迁移旧版的 JSON 数组文件（exclude_set.json）。
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = "exclude_set.jsonl",
+        legacy_path: Union[str, Path, None] = "exclude_set.json",
+        compact_min_lines: int = 200,
+        compact_ratio: float = 2.0,
+    ):
+        """
+        compact_min_lines / compact_ratio: 日志行数超过 compact_min_lines 且超过当前条目数的 compact_ratio 倍时压缩
+        """
+        self.path = Path(path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.compact_min_lines = compact_min_lines
+        self.compact_ratio = compact_ratio
+        self.lines = 0
+        self._file: Optional[TextIO] = None
+
+    def load(self) -> list[str]:
+        """重放日志，返回当前集合（按写入顺序）；日志不存在时尝试迁移旧文件"""
+        if not self.path.exists():
+            legacy = self._load_legacy()
+            if legacy:
+                self.compact(legacy)
+                logger.info("Migrated %d exclude entries from %s", len(legacy), self.legacy_path)
+            return legacy
+
+        entries: dict[str, None] = {}
+        self.lines = 0
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                self.lines += 1
+                try:
+                    record = json.loads(line)
+                    op, text = record["op"], record["text"]
+                except (ValueError, KeyError, TypeError):
+                    # 崩溃时写了一半的最后一行
+                    logger.warning("Skipping malformed exclude journal line: %r", line[:80])
+                    continue
+                if op == "add":
+                    entries.pop(text, None)
+                    entries[text] = None
+                elif op == "remove":
+                    entries.pop(text, None)
+        return list(entries)
+
+    def append(self, op: str, text: str) -> None:
+        try:
+            if self._file is None:
+                self._file = self.path.open("a", encoding="utf-8")
+                if self._ends_with_partial_line():
+                    self._file.write("\n")
+            self._file.write(json.dumps({"op": op, "text": text}, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.lines += 1
+        except OSError:
+            logger.exception("Failed to append to exclude journal")
+
+    def merge(self, texts: Iterable[str]) -> int:
+        """
+        把一组文本并入日志（例如旧版配置文件中的排除集），返回新增的条数。
+        写入失败时抛出 OSError 而不是只记日志：调用方确认写入后才能删除原来的数据
+        """
+        existing = set(self.load())
+        new = [text for text in dict.fromkeys(texts) if text not in existing]
+        if not new:
+            return 0
+        self.close()
+        with self.path.open("a", encoding="utf-8") as f:
+            if self._ends_with_partial_line():
+                f.write("\n")
+            for text in new:
+                f.write(json.dumps({"op": "add", "text": text}, ensure_ascii=False) + "\n")
+        self.lines += len(new)
+        return len(new)
+
+    def should_compact(self, live_entries: int) -> bool:
+        return self.lines > self.compact_min_lines and self.lines > self.compact_ratio * live_entries
+
+    def compact(self, texts: Iterable[str]) -> None:
+        """用当前集合的快照替换日志"""
+        self.close()
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            count = 0
+            with tmp.open("w", encoding="utf-8") as f:
+                for text in texts:
+                    f.write(json.dumps({"op": "add", "text": text}, ensure_ascii=False) + "\n")
+                    count += 1
+            tmp.replace(self.path)
+            self.lines = count
+        except OSError:
+            logger.exception("Failed to compact exclude journal")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _ends_with_partial_line(self) -> bool:
+        """上次崩溃时最后一行没写完的话，新记录要另起一行"""
+        with self.path.open("rb") as f:
+            if f.seek(0, 2) == 0:
+                return False
+            f.seek(-1, 2)
+            return f.read(1) != b"\n"
+
+    def _load_legacy(self) -> list[str]:
+        if self.legacy_path is None or not self.legacy_path.exists():
+            return []
+        try:
+            with self.legacy_path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                return [str(text) for text in data]
+        except Exception:
+            logger.exception("Failed to load legacy exclude_set")
+        return []
@@ -4,6 +4,8 @@ import pickle
 import threading
 import logging
 
+from exclude import ExcludeJournal
+
 # 导入新的controller模块
 try:
     from controller import GameTranslationController
@@ -23,6 +25,12 @@ except ImportError:
     #         return set()
 
 
+# 模型就绪状态轮询间隔（毫秒）与显示文字
+READINESS_POLL_MS = 300
+READINESS_NAMES = {"ocr": "OCR模型", "tts": "TTS模型"}
+READINESS_TEXT = {"loading": "加载中...", "warming": "预热中...", "ready": "已就绪", "failed": "加载失败"}
+
+
 class GameEyesApp:
     def __init__(self, root: tk.Tk):
         # 配置日志
@@ -36,8 +44,19 @@ class GameEyesApp:
         
         
         
-        # translator的初始化参数，除外字符串集
-        self.exclude_set: set = self.config['exclude_set']
+        # 旧版本把OCR排除集存在配置文件里：启动时立即并入排除集日志，写入成功后才从配置中删除，
+        # 不依赖OCR模型加载完成（加载期间关闭窗口或加载失败时集合也不会丢失）
+        self.legacy_exclude_set: set = set()
+        legacy_exclude_set = self.config.get('exclude_set')
+        if legacy_exclude_set:
+            try:
+                added = ExcludeJournal().merge(legacy_exclude_set)
+                logging.info(f"已把配置中的 {added} 条OCR排除文本迁移到排除集日志")
+                self.config.pop('exclude_set')
+            except OSError as e:
+                # 写入失败时保留在配置中，交给controller重试
+                logging.error(f"迁移OCR排除集失败: {e}")
+                self.legacy_exclude_set = set(legacy_exclude_set)
 
         self.root = root
         self.root.title("游戏实时翻译器")
@@ -323,11 +342,6 @@ class GameEyesApp:
         self.stop_button.config(state=tk.DISABLED)
         
         self.update_status("翻译已停止（TTS模型保持加载状态）")
-        
-        # 保存OCR排除集
-        if self.controller is not None:
-            self.exclude_set = self.controller.get_ocr_exclude_set()
-            self.save_config()
     
     def _reset_buttons(self):
         """重置按钮状态"""
@@ -341,14 +355,7 @@ class GameEyesApp:
         self.status_text.see(tk.END)
     
     def save_config(self):
-        """保存配置"""
-        # 获取OCR排除集
-        exclude_set = set()
-        if self.controller is not None:
-            exclude_set = self.controller.get_ocr_exclude_set()
-        elif hasattr(self, 'exclude_set'):
-            exclude_set = self.exclude_set
-        
+        """保存配置（OCR排除集由controller写入排除集日志，不在这里保存）"""
         config = {
             "start_x": self.start_x,
             "start_y": self.start_y,
@@ -356,7 +363,6 @@ class GameEyesApp:
             "end_y": self.end_y,
             "source_lang_var": self.source_lang_var.get(),
             "use_gpu_ocr": self.use_gpu_ocr.get(),
-            "exclude_set": exclude_set
         }
         self.config.update(config)
         try:
@@ -372,13 +378,11 @@ class GameEyesApp:
                 config: dict = pickle.load(f)
                 config.setdefault("source_lang_var", "英语")
                 config.setdefault("use_gpu_ocr", True)
-                config.setdefault("exclude_set", set())
         except Exception as e:
             self.update_status(f"加载配置失败，使用默认配置: {e}")
             config = {
                 "source_lang_var": "英语",
                 "use_gpu_ocr": True,
-                "exclude_set": set()
             }
         return config
     
@@ -409,17 +413,51 @@ class GameEyesApp:
             self.controller = GameTranslationController(
                 ocr_languages=ocr_languages,
                 ocr_use_gpu=self.config.get('use_gpu_ocr', True),
-                ocr_exclude_set=self.exclude_set,
+                ocr_exclude_set=self.legacy_exclude_set,
                 capture_interval=self.interval,
-                max_text_length=200
+                max_text_length=200,
+                ocr_processes=self.config.get('ocr_processes', 1),
+                translation_providers=self.config.get('translation_providers', 'deepseek'),
+                dialogue_context_tokens=self.config.get('dialogue_context_tokens', 1500),
+                # 没有GPU时默认使用CPU优化的OCR引擎
+                ocr_engine=self.config.get('ocr_engine', 'easyocr' if self.config.get('use_gpu_ocr', True) else 'cpu')
             )
             
-            self.update_status("控制器已初始化（TTS模型预加载中...）")
+            self.update_status("控制器已初始化（OCR与TTS模型后台加载中...）")
+            
+            # OCR模型就绪前不能开始翻译
+            self.start_button.config(state=tk.DISABLED)
+            self._readiness_states = {}
+            self.root.after(READINESS_POLL_MS, self._poll_readiness)
             
         except Exception as e:
             self.update_status(f"初始化控制器失败: {e}")
             self.controller = None
 
+    def _poll_readiness(self):
+        """定时查询模型就绪状态并显示变化，不阻塞Tk主线程"""
+        if self.controller is None:
+            return
+        readiness = self.controller.get_readiness()
+        for name, entry in readiness.items():
+            state = entry["state"]
+            if self._readiness_states.get(name) == state:
+                continue
+            self._readiness_states[name] = state
+            message = f"{READINESS_NAMES.get(name, name)}{READINESS_TEXT.get(state, state)}"
+            if state in ("ready", "failed"):
+                message += f"（{entry['seconds']:.1f}秒）"
+            if entry.get("error"):
+                message += f": {entry['error']}"
+            self.update_status(message)
+        
+        if readiness["ocr"]["state"] == "ready" and not self.is_capturing:
+            self.start_button.config(state=tk.NORMAL)
+        
+        # 全部结束（就绪或失败）后停止轮询
+        if any(entry["state"] not in ("ready", "failed") for entry in readiness.values()):
+            self.root.after(READINESS_POLL_MS, self._poll_readiness)
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = GameEyesApp(root)
@@ -0,0 +1,137 @@
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyHistogram:
+    """
+    滚动窗口延迟统计（线程安全）
+    只保留最近 window 个样本，按需计算 p50/p95/p99。
+    """
+
+    def __init__(self, window: int = 500):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def percentile(self, p: float) -> float:
+        """返回第 p 百分位（0~100），单位秒；没有样本时返回 0"""
+        with self._lock:
+            samples = sorted(self._samples)
+        return _percentile(samples, p)
+
+    def summary(self) -> dict:
+        """统计摘要，单位毫秒"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count}
+        return {
+            "count": self.count,
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": _percentile(samples, 50) * 1000,
+            "p95_ms": _percentile(samples, 95) * 1000,
+            "p99_ms": _percentile(samples, 99) * 1000,
+            "max_ms": samples[-1] * 1000,
+        }
+
+
+class MetricsRegistry:
+    """
+    按名称管理延迟直方图和计数器
+    - observe()/timer() 记录耗时
+    - incr() 累加计数
+    - snapshot() 查询，dump_json() 或 start_periodic_dump() 输出到JSON文件
+    """
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._dump_stop = threading.Event()
+        self._dump_thread: Optional[threading.Thread] = None
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = LatencyHistogram(self.window)
+            return hist
+
+    def observe(self, name: str, seconds: float) -> None:
+        self.histogram(name).observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+        return {
+            "timestamp": time.time(),
+            "latency": {name: hist.summary() for name, hist in histograms.items()},
+            "counters": counters,
+        }
+
+    def dump_json(self, path: Union[str, Path]) -> None:
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        try:
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            tmp.replace(path)
+        except Exception:
+            logger.exception("Failed to dump metrics")
+
+    def start_periodic_dump(self, path: Union[str, Path], interval: float = 10.0) -> None:
+        """后台线程每隔 interval 秒把快照写入 path"""
+        if self._dump_thread is not None:
+            return
+        self._dump_stop.clear()
+
+        def run():
+            while not self._dump_stop.wait(interval):
+                self.dump_json(path)
+            self.dump_json(path)
+
+        self._dump_thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_periodic_dump(self) -> None:
+        if self._dump_thread is None:
+            return
+        self._dump_stop.set()
+        self._dump_thread.join(timeout=2)
+        self._dump_thread = None
+
+
+def _percentile(sorted_samples: list[float], p: float) -> float:
+    if not sorted_samples:
+        return 0.0
+    # 最近秩法
+    k = max(0, min(len(sorted_samples) - 1, math.ceil(p / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[k]
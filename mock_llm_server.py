@@ -0,0 +1,311 @@
+"""
+本地的 OpenAI 兼容替身服务器
+只实现 POST /chat/completions 和 GET /models（以及 /v1 前缀的版本），按可配置的首token延迟和token间隔
+返回"译文"（原文加上前缀），支持 stream=true 的SSE流式返回；可以让一部分请求额外变慢或直接返回503，模拟长尾延迟和接口故障。
+按 Deepseek 的方式模拟上下文缓存：与之前请求相同的消息前缀按64 token为单位计为缓存命中，
+未命中的 prompt token 按 prefill_per_token 增加首token延迟，usage 中返回命中的token数。
+用于在没有API密钥和网络的情况下测试流式翻译、切句、连接复用、对冲请求、上下文缓存和首段音频延迟：
+
+    python mock_llm_server.py --port 8765 --first-token 0.5 --token-interval 0.05 --slow-fraction 0.1 --slow-delay 3
+
+然后用 Deepseek(base_url="http://127.0.0.1:8765", api_key="mock") 连接。
+"""
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+
+from dialogue_context import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def mock_reply(text: str) -> str:
+    """替身"译文"：带标记的原文"""
+    return f"【译】{text}"
+
+
+def tokenize(text: str, token_chars: int = 2) -> Iterator[str]:
+    """按固定字符数切成"token"，近似中文模型每个token一两个字"""
+    for i in range(0, len(text), token_chars):
+        yield text[i:i + token_chars]
+
+
+class MockLLMServer:
+    """在后台线程中运行的替身服务器，start() 后通过 url 访问"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        first_token_latency: float = 0.5,
+        token_interval: float = 0.05,
+        token_chars: int = 2,
+        slow_fraction: float = 0.0,
+        slow_delay: float = 2.0,
+        error_fraction: float = 0.0,
+        prefill_per_token: float = 0.0,
+        cache_block: int = 64,
+        seed: Optional[int] = None,
+    ):
+        """
+        port: 0 表示自动选择空闲端口
+        first_token_latency: 收到请求到第一个token的延迟（秒）
+        token_interval: 之后每个token的间隔（秒）
+        token_chars: 每个token的字符数
+        slow_fraction: 额外变慢的请求比例（长尾）
+        slow_delay: 变慢的请求首token前额外等待的秒数
+        error_fraction: 直接返回 503 的请求比例（模拟接口故障）
+        prefill_per_token: 每个未命中缓存的 prompt token 增加的首token延迟（秒）
+        cache_block: 上下文缓存的单位（token），命中的前缀向下取整到它的整数倍
+        seed: 决定哪些请求变慢、出错的随机种子
+        """
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.token_chars = token_chars
+        self.slow_fraction = slow_fraction
+        self.slow_delay = slow_delay
+        self.error_fraction = error_fraction
+        self.prefill_per_token = prefill_per_token
+        self.cache_block = cache_block
+        self.requests = 0
+        self.slow_requests = 0
+        self.failed_requests = 0
+        # 建立过的TCP连接数，客户端复用连接时远小于请求数
+        self.connections = 0
+        self.prompt_tokens = 0
+        self.cache_hit_tokens = 0
+        # 见过的消息前缀（按消息边界）的摘要
+        self._prefixes: set[str] = set()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("Mock LLM server listening on %s", self.url)
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            if self.error_fraction <= 0 or self._random.random() >= self.error_fraction:
+                return False
+            self.requests += 1
+            self.failed_requests += 1
+            return True
+
+    def _first_token_delay(self) -> float:
+        with self._lock:
+            self.requests += 1
+            if self.slow_fraction <= 0 or self._random.random() >= self.slow_fraction:
+                return self.first_token_latency
+            self.slow_requests += 1
+        return self.first_token_latency + self.slow_delay
+
+    def _prompt_usage(self, messages: list[dict]) -> tuple[int, int]:
+        """返回 (prompt token数, 命中缓存的token数)，并记住本次请求的所有前缀"""
+        digest = hashlib.sha1()
+        tokens = hit = 0
+        matching = True
+        with self._lock:
+            for message in messages:
+                digest.update(json.dumps(message, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+                # 每条消息另有几个token的角色和分隔符
+                tokens += estimate_tokens(str(message.get("content", ""))) + 4
+                key = digest.hexdigest()
+                matching = matching and key in self._prefixes
+                if matching:
+                    hit = tokens
+                self._prefixes.add(key)
+            hit = hit // self.cache_block * self.cache_block
+            self.prompt_tokens += tokens
+            self.cache_hit_tokens += hit
+        return tokens, hit
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客户端提前关闭流（翻译作废、对冲请求落败）是正常情况
+                    logger.debug("Client disconnected: %s", self.address_string())
+
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("/models", "/v1/models"):
+                    self.send_error(404)
+                    return
+                self._send_json({"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "mock"}]})
+
+            def do_POST(self):
+                if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self.send_error(400, "invalid JSON")
+                    return
+
+                if server._should_fail():
+                    self._send_json({"error": {"message": "mock overloaded", "type": "server_error"}}, status=503)
+                    return
+                messages = request.get("messages") or [{"content": ""}]
+                prompt_tokens, hit_tokens = server._prompt_usage(messages)
+                first_token = server._first_token_delay() + (prompt_tokens - hit_tokens) * server.prefill_per_token
+                reply = mock_reply(messages[-1].get("content", ""))
+                model = request.get("model", "mock")
+                if request.get("stream"):
+                    include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+                    self._stream(reply, model, first_token, (prompt_tokens, hit_tokens) if include_usage else None)
+                else:
+                    self._complete(reply, model, first_token, (prompt_tokens, hit_tokens))
+
+            def _usage(self, prompt: tuple[int, int], completion_tokens: int) -> dict:
+                """同时给出 Deepseek 和 OpenAI 两种缓存命中字段"""
+                prompt_tokens, hit_tokens = prompt
+                return {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                    "prompt_cache_hit_tokens": hit_tokens,
+                    "prompt_cache_miss_tokens": prompt_tokens - hit_tokens,
+                    "prompt_tokens_details": {"cached_tokens": hit_tokens},
+                }
+
+            def _complete(self, reply: str, model: str, first_token: float, prompt: tuple[int, int]):
+                tokens = list(tokenize(reply, server.token_chars))
+                time.sleep(first_token + server.token_interval * max(0, len(tokens) - 1))
+                self._send_json({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": self._usage(prompt, len(tokens)),
+                })
+
+            def _send_json(self, payload: dict, status: int = 200):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, reply: str, model: str, first_token: float, prompt: Optional[tuple[int, int]]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                created = int(time.time())
+
+                def chunk(delta: dict, finish_reason: Optional[str] = None) -> dict:
+                    return {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+
+                time.sleep(first_token)
+                self._send_event(chunk({"role": "assistant", "content": ""}))
+                tokens = list(tokenize(reply, server.token_chars))
+                for i, token in enumerate(tokens):
+                    if i:
+                        time.sleep(server.token_interval)
+                    self._send_event(chunk({"content": token}))
+                self._send_event(chunk({}, "stop"))
+                if prompt is not None:
+                    # stream_options.include_usage：最后一个 chunk 的 choices 为空，只带 usage
+                    usage = chunk({})
+                    usage["choices"] = []
+                    usage["usage"] = self._usage(prompt, len(tokens))
+                    self._send_event(usage)
+                self._send_data("[DONE]")
+                # chunked 编码的结束块
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def _send_event(self, payload: dict):
+                self._send_data(json.dumps(payload, ensure_ascii=False))
+
+            def _send_data(self, data: str):
+                event = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(event):X}\r\n".encode("ascii") + event + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                logger.debug("%s - %s", self.address_string(), format % args)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地的 OpenAI 兼容替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token", type=float, default=0.5, help="首token延迟（秒）")
+    parser.add_argument("--token-interval", type=float, default=0.05, help="token间隔（秒）")
+    parser.add_argument("--token-chars", type=int, default=2, help="每个token的字符数")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="额外变慢的请求比例")
+    parser.add_argument("--slow-delay", type=float, default=2.0, help="变慢的请求额外等待的秒数")
+    parser.add_argument("--error-fraction", type=float, default=0.0, help="返回503的请求比例")
+    parser.add_argument("--prefill-per-token", type=float, default=0.0, help="每个未命中缓存的prompt token增加的首token延迟（秒）")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host, args.port, args.first_token, args.token_interval, args.token_chars,
+        slow_fraction=args.slow_fraction, slow_delay=args.slow_delay, error_fraction=args.error_fraction,
+        prefill_per_token=args.prefill_per_token,
+    ).start()
+    print(f"Mock LLM server: {server.url}  (Ctrl+C 退出)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    main()
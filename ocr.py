@@ -1,15 +1,78 @@
-import easyocr
-import json
+import hashlib
 import logging
+from collections import OrderedDict
+from dataclasses import dataclass
 import cv2
 import numpy as np
-from typing import Union
+from typing import Callable, Optional, Union
 from pathlib import Path
 
+from exclude import ExcludeJournal, ExcludeLearner
+from ocr_engine import OCREngine, Rect, create_ocr_engine
+
 logger = logging.getLogger(__name__)
 
 ImageInput = Union[str, Path, bytes, np.ndarray]
 RESIZE_THRESHOLD = 1920 * 1080 * 1.5 
+# 脏区域向外扩展的像素，避免把文字切断
+DIRTY_MARGIN = 8
+# 版面变化检测：缩小倍数与像素灰度差阈值
+LAYOUT_SCALE = 4
+LAYOUT_PIXEL_DELTA = 16
+# 文本检测框高度约为字形（大写字母）高度的倍数，用于从连通域高度估计行高
+LINE_HEIGHT_PER_GLYPH = 1.5
+# 估计的缩放比例与当前比例相差超过该比例才切换，避免每帧抖动导致缓存失效
+TEXT_SCALE_HYSTERESIS = 0.25
+
+
+@dataclass
+class OCRResult:
+    """一段识别结果：文本、原图坐标下的外框 (x1, y1, x2, y2)、置信度（按字符数加权的平均值）"""
+    text: str
+    box: Rect
+    confidence: float
+
+
+@dataclass(frozen=True)
+class _Transform:
+    """原图 → 预处理后图像的坐标变换：先裁剪（偏移 ox, oy），再缩放 scale"""
+    scale: float = 1.0
+    ox: int = 0
+    oy: int = 0
+
+    def to_processed(self, rect: Rect, width: int, height: int) -> Rect:
+        x1, y1, x2, y2 = rect
+        return _scale_rect((x1 - self.ox, y1 - self.oy, x2 - self.ox, y2 - self.oy), self.scale, width, height)
+
+    def unscale(self, rect: Rect, width: int, height: int) -> Rect:
+        """只撤销缩放（仍在裁剪后的坐标系中），向外取整，不超出 width × height"""
+        x1, y1, x2, y2 = rect
+        return (
+            max(0, int(x1 / self.scale)),
+            max(0, int(y1 / self.scale)),
+            min(width, int(np.ceil(x2 / self.scale))),
+            min(height, int(np.ceil(y2 / self.scale))),
+        )
+
+    def to_original(self, rect: Rect) -> Rect:
+        x1, y1, x2, y2 = rect
+        return (
+            int(x1 / self.scale) + self.ox,
+            int(y1 / self.scale) + self.oy,
+            int(x2 / self.scale) + self.ox,
+            int(y2 / self.scale) + self.oy,
+        )
+
+
+class _Line:
+    """一行文本：rect为预处理后图像坐标 (x1, y1, x2, y2)"""
+    __slots__ = ("rect", "text", "confidence")
+
+    def __init__(self, rect: Rect, text: str = "", confidence: float = 0.0):
+        self.rect = rect
+        self.text = text
+        self.confidence = confidence
+
 
 class GameOCR:
     def __init__(
@@ -18,60 +81,354 @@ class GameOCR:
         gpu=True,
         exclude_amount: int = 3,
         exclude_set: Union[set, None] = None,
-        exclude_path: Union[str, Path, None] = "exclude_set.json",
+        exclude_path: Union[str, Path, None] = "exclude_set.jsonl",
+        reuse_boxes: bool = True,
+        detect_interval: int = 20,
+        layout_change_threshold: float = 0.0002,
+        recognition_cache_size: int = 512,
+        min_confidence: float = 0.3,
+        target_text_height: int = 64,
+        min_text_scale: float = 0.25,
+        max_text_scale: float = 1.0,
+        grayscale: bool = False,
+        normalize_contrast: bool = False,
+        crop_to_text: bool = False,
+        engine: Union[str, OCREngine] = "easyocr",
+        engine_options: Optional[dict] = None,
+        fuzzy_exclude: bool = True,
     ):
+        """
+        exclude_amount: 非对话框文本出现多少次后加入排除集
+        exclude_set: 额外的初始排除文本，会写入排除集日志
+        exclude_path: 排除集日志文件（JSON Lines，学到即写入），None表示不持久化
+        fuzzy_exclude: 排除集是否近似匹配（OCR抖动、跳动的数字视为同一条HUD文本）
+        engine: OCR引擎名称（'easyocr'、'cpu'，见 ocr_engine.OCR_ENGINES）或已创建的引擎对象
+        engine_options: 创建引擎时的额外参数，例如cpu引擎的 {'num_threads': 4}
+        reuse_boxes: 版面稳定时复用上一次检测到的文本框，只运行识别（跳过CRAFT检测）
+        detect_interval: 复用文本框时，每隔多少帧强制整帧重新检测一次
+        layout_change_threshold: 文本框以外区域变化像素占比超过该值，视为版面变化并在变化处重新检测
+        recognition_cache_size: 识别结果LRU缓存容量（按文本行截图哈希），0表示不缓存
+        min_confidence: 低于该置信度的段落视为乱码丢弃，不会传给Checker和翻译
+
+        预处理：
+        target_text_height: 把文本行缩放到该高度（像素）再检测，0表示不按文字大小缩放；
+            默认与easyocr识别模型的输入高度（64）一致，只有更大的文字才缩小
+        min_text_scale / max_text_scale: 按文字大小缩放的比例范围，默认只缩小不放大
+            缩小只用于检测，识别仍在原分辨率的文本行截图上进行
+        grayscale: 转为灰度图后再检测
+        normalize_contrast: 用CLAHE做局部对比度归一化（深色半透明对话框、低对比度字幕）
+        crop_to_text: 只处理上一次整帧检测到的文本区域，每 detect_interval 帧整帧检测一次重新确定区域
+        """
         self.languages = languages
-        self.reader = easyocr.Reader(languages, gpu=gpu)
+        if isinstance(engine, OCREngine):
+            self.engine = engine
+        else:
+            self.engine = create_ocr_engine(engine, languages=languages, gpu=gpu, **(engine_options or {}))
 
-        self.exclude_dict: dict[str, int] = {}
-        self.exclude_amount = exclude_amount
+        self.min_confidence = min_confidence
+        # 上一次选中的对话框位置，对话框通常固定在同一位置
+        self._dialog_box: Optional[Rect] = None
 
+        # 排除集：有界、会老化的计数 + 近似匹配索引，变化实时追加到日志
         self.exclude_path = Path(exclude_path) if exclude_path else None
-        self.exclude_set: set[str] = set()
-
-        if exclude_set:
-            self.exclude_set.update(exclude_set)
-
-        if self.exclude_path:
-            self._load_exclude_set()
+        self.exclude_journal = ExcludeJournal(self.exclude_path) if self.exclude_path else None
+        self.excluder = ExcludeLearner(
+            threshold=exclude_amount,
+            fuzzy=fuzzy_exclude,
+            initial=self.exclude_journal.load() if self.exclude_journal else None,
+            on_change=self._on_exclude_change if self.exclude_journal else None,
+        )
+        for text in exclude_set or ():
+            self.excluder.add(text)
+
+        self.reuse_boxes = reuse_boxes
+        self.detect_interval = detect_interval
+        self.layout_change_threshold = layout_change_threshold
+
+        # 上一帧的文本行（检测框 + 识别结果），供增量识别复用
+        self._lines: list[_Line] = []
+        self._last_shape: Optional[tuple] = None
+        # 上一次检测时的缩略灰度图，用于判断版面是否变化
+        self._layout_ref: Optional[np.ndarray] = None
+        self._frames_since_detect = 0
+
+        # 最近一次送入检测的面积占整帧的比例
+        self.last_ocr_area_ratio = 0.0
+        self.detect_calls = 0
+        self.lines_recognized = 0
+        self.lines_reused = 0
+
+        # 文本行截图哈希 -> (text, confidence)，打字机效果下大部分行与上一帧像素完全相同
+        self.recognition_cache_size = recognition_cache_size
+        self._recognition_cache: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # 预处理设置与状态（缩放比例和裁剪区域跨帧保持，才能复用文本框和识别缓存）
+        self.target_text_height = target_text_height
+        self.min_text_scale = min_text_scale
+        self.max_text_scale = max_text_scale
+        self.grayscale = grayscale
+        self.normalize_contrast = normalize_contrast
+        self.crop_to_text = crop_to_text
+        self._clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        self._frame_shape: Optional[tuple] = None
+        self._text_scale: Optional[float] = None
+        # 原图坐标下的文本区域
+        self._text_area: Optional[Rect] = None
+        self.last_crop_ratio = 1.0
 
     # ---------- public ----------
 
-    def img_to_text(self, image: ImageInput) -> str:
-        texts = self._img_to_list(image)
-        if not texts:
+    def img_to_text(self, image: ImageInput, dirty_rects: Optional[list[Rect]] = None) -> str:
+        """
+        dirty_rects: 与上一帧相比发生变化的区域（原图坐标）。
+            None 表示不知道哪里变了，所有文本行都重新识别；
+            给出时只重新识别与脏区域重叠的文本行，其余复用上一次结果。
+        """
+        results = self.img_to_results(image, dirty_rects)
+        results = [r for r in results if r.confidence >= self.min_confidence]
+        if not results:
             return ""
-        return self._clear_list_to_text(texts)
+        return self._clear_list_to_text(results)
+
+    def img_to_results(self, image: ImageInput, dirty_rects: Optional[list[Rect]] = None) -> list[OCRResult]:
+        """返回按阅读顺序排列的段落（文本、外框、置信度），不做过滤"""
+        return self._img_to_list(image, dirty_rects)
+
+    def stats(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "detect_calls": self.detect_calls,
+            "lines_recognized": self.lines_recognized,
+            "lines_reused": self.lines_reused,
+            "last_ocr_area_ratio": self.last_ocr_area_ratio,
+            "cache_size": len(self._recognition_cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+            "text_scale": self._text_scale or 1.0,
+            "crop_ratio": self.last_crop_ratio,
+            **self.excluder.stats(),
+        }
+
+    @property
+    def exclude_set(self) -> set[str]:
+        return self.excluder.excluded
 
     def save_exclude_set(self) -> None:
-        if not self.exclude_path:
+        """新条目已实时写入日志，这里把日志压缩成当前集合的快照"""
+        if self.exclude_journal is None:
             return
-        try:
-            with self.exclude_path.open("w", encoding="utf-8") as f:
-                json.dump(sorted(self.exclude_set), f, ensure_ascii=False, indent=2)
-        except Exception:
-            logger.exception("Failed to save exclude_set")
+        # OCR线程可能同时在学习新条目并追加日志
+        with self.excluder.lock:
+            self.exclude_journal.compact(self.excluder)
+
+    def warm_up(self) -> None:
+        """
+        用一张画有文字的假图跑一遍检测和识别，
+        让CUDA/cuDNN初始化、算法选择和显存分配在加载阶段完成，而不是落在第一句真实文本上。
+        直接调用引擎，不影响文本框、缓存和统计。
+        """
+        img = np.full((96, 640, 3), 32, dtype=np.uint8)
+        cv2.putText(img, "Warm up the OCR engine", (16, 60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        boxes = [tuple(int(v) for v in box) for box in self.engine.detect(img)]
+        self.engine.recognize(img, boxes or [(0, 0, img.shape[1], img.shape[0])])
 
     # ---------- internal ----------
 
-    def _img_to_list(self, image: ImageInput) -> list[str]:
+    def _img_to_list(self, image: ImageInput, dirty_rects: Optional[list[Rect]] = None) -> list[OCRResult]:
         try:
-            img = self._load_image(image)
-            img = self._preprocess_image(img)
-
-            result: list = self.reader.readtext(
-                img,
-                x_ths=0.5,
-                y_ths=0.3,
-                paragraph=True,
-            )
-            return [detection[1] for detection in result]
+            img = self.load_image(image)
+            self._check_frame_shape(img)
+            if self._text_area is not None and self._frames_since_detect >= self.detect_interval:
+                # 定期整帧检测，发现文本区域以外新出现的文字
+                self._text_area = None
+                self._reset_layout()
+            img, transform, unscaled = self._preprocess_image(img)
+            h, w = img.shape[:2]
+            if dirty_rects is not None:
+                dirty_rects = [transform.to_processed(r, w, h) for r in dirty_rects]
+                dirty_rects = [r for r in dirty_rects if r[2] > r[0] and r[3] > r[1]]
+
+            # 1. 检测：只在版面变化的区域（或整帧）运行
+            kept, new_lines = self._lines, []
+            regions = self._regions_to_detect(img, dirty_rects)
+            if regions:
+                kept, new_lines = self._detect(img, regions)
+            self._frames_since_detect += 1
+
+            # 2. 识别：新文本框 + 与脏区域重叠的旧文本框
+            to_recognize = new_lines + [
+                line for line in kept
+                if dirty_rects is None or any(_rects_overlap(line.rect, r) for r in dirty_rects)
+            ]
+            if to_recognize:
+                if transform.scale == 1.0:
+                    self._recognize(img, to_recognize)
+                else:
+                    # 缩小的图只用于检测，识别用原分辨率的截图，避免文字先缩小再被识别模型放大
+                    recognition_img = self._enhance(unscaled)
+                    uh, uw = recognition_img.shape[:2]
+                    self._recognize(recognition_img, to_recognize, lambda rect: transform.unscale(rect, uw, uh))
+
+            lines = sorted(kept + new_lines, key=lambda line: (line.rect[1], line.rect[0]))
+            self.lines_recognized += len(to_recognize)
+            self.lines_reused += len(lines) - len(to_recognize)
+            self._lines = lines
+            self._last_shape = (h, w)
+
+            # 3. 合并成段落，外框换算回原图坐标
+            results = [
+                OCRResult(text, transform.to_original(rect), confidence)
+                for text, rect, confidence in _merge_paragraphs(lines, x_ths=0.5, y_ths=0.3)
+            ]
+
+            # 4. 根据本帧文本行调整下一帧的缩放比例和裁剪区域
+            self._update_preprocess(lines, transform, w, h)
+            return results
 
         except Exception:
             logger.exception("OCR failed")
+            self._reset_layout()
+            return []
+
+    def _reset_layout(self) -> None:
+        """丢弃上一帧的文本行和版面参考图，下一帧整帧检测"""
+        self._lines = []
+        self._layout_ref = None
+
+    def _regions_to_detect(self, img: np.ndarray, dirty_rects: Optional[list[Rect]]) -> list[Rect]:
+        h, w = img.shape[:2]
+        full = [(0, 0, w, h)]
+
+        if self._layout_ref is None or self._last_shape != (h, w):
+            return full
+        if not self.reuse_boxes:
+            # 不复用文本框：所有变化区域都重新检测
+            return full if dirty_rects is None else dirty_rects
+        if self._frames_since_detect >= self.detect_interval:
+            return full
+        return self._layout_changes(img)
+
+    def _layout_changes(self, img: np.ndarray) -> list[Rect]:
+        """与上一次检测时相比，文本框以外发生变化的区域"""
+        assert self._layout_ref is not None
+        small = _layout_thumbnail(img)
+        changed = cv2.absdiff(small, self._layout_ref) > LAYOUT_PIXEL_DELTA
+
+        # 文本框内部的变化（文字内容变化）不算版面变化
+        for x1, y1, x2, y2 in (line.rect for line in self._lines):
+            changed[
+                max(0, y1 // LAYOUT_SCALE - 1): y2 // LAYOUT_SCALE + 2,
+                max(0, x1 // LAYOUT_SCALE - 1): x2 // LAYOUT_SCALE + 2,
+            ] = False
+
+        if np.count_nonzero(changed) <= self.layout_change_threshold * changed.size:
             return []
 
-    def _load_image(self, image: ImageInput) -> np.ndarray:
+        changed = cv2.dilate(changed.astype(np.uint8), np.ones((5, 5), np.uint8))
+        n, _, stats, _ = cv2.connectedComponentsWithStats(changed, connectivity=8)
+        h, w = img.shape[:2]
+        regions = []
+        for i in range(1, n):
+            x, y, cw, ch = stats[i][:4]
+            regions.append((
+                int(x * LAYOUT_SCALE),
+                int(y * LAYOUT_SCALE),
+                int(min((x + cw) * LAYOUT_SCALE, w)),
+                int(min((y + ch) * LAYOUT_SCALE, h)),
+            ))
+        return regions
+
+    def _detect(self, img: np.ndarray, regions: list[Rect]) -> tuple[list[_Line], list[_Line]]:
+        """在各区域内运行文本检测，返回 (保留的旧文本行, 新检测到的文本行)"""
+        h, w = img.shape[:2]
+        regions = [_expand_rect(r, DIRTY_MARGIN, w, h) for r in regions]
+
+        # 区域吸收与之重叠的旧文本框，直到不再增长，保证整行重新检测
+        changed = True
+        while changed:
+            changed = False
+            for line in self._lines:
+                for i, region in enumerate(regions):
+                    if _rects_overlap(line.rect, region) and _union_rect(line.rect, region) != region:
+                        regions[i] = _union_rect(line.rect, region)
+                        changed = True
+            regions = _merge_overlapping(regions)
+
+        kept = [
+            line for line in self._lines
+            if not any(_rects_overlap(line.rect, region) for region in regions)
+        ]
+
+        new_lines = []
+        for x1, y1, x2, y2 in regions:
+            crop = img[y1:y2, x1:x2]
+            if crop.size == 0:
+                continue
+            for bx1, by1, bx2, by2 in self.engine.detect(crop):
+                rect = (
+                    int(max(0, x1 + bx1)),
+                    int(max(0, y1 + by1)),
+                    int(min(w, x1 + bx2)),
+                    int(min(h, y1 + by2)),
+                )
+                if rect[2] > rect[0] and rect[3] > rect[1]:
+                    new_lines.append(_Line(rect))
+
+        area = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions)
+        self.last_ocr_area_ratio = area / float(h * w)
+        self.detect_calls += 1
+        if regions == [(0, 0, w, h)]:
+            self._frames_since_detect = 0
+        self._layout_ref = _layout_thumbnail(img)
+        return kept, new_lines
+
+    def _recognize(
+        self, img: np.ndarray, lines: list[_Line], to_image: Optional[Callable[[Rect], Rect]] = None
+    ) -> None:
+        """
+        只对给定文本框运行识别，结果写回各行；截图与缓存中相同的行直接复用
+        to_image: 把文本行坐标换算到 img 上的坐标，None 表示 img 就是检测用的图
+        """
+        by_rect: dict[Rect, list[_Line]] = {}
+        keys: dict[Rect, bytes] = {}
+        for line in lines:
+            rect = to_image(line.rect) if to_image is not None else line.rect
+            if rect[2] <= rect[0] or rect[3] <= rect[1]:
+                continue
+            if self.recognition_cache_size > 0:
+                key = _crop_hash(img, rect)
+                cached = self._recognition_cache.get(key)
+                if cached is not None:
+                    self._recognition_cache.move_to_end(key)
+                    line.text, line.confidence = cached
+                    self.cache_hits += 1
+                    continue
+                self.cache_misses += 1
+                keys[rect] = key
+            by_rect.setdefault(rect, []).append(line)
+
+        if not by_rect:
+            return
+
+        rects = list(by_rect)
+        for rect, (text, confidence) in zip(rects, self.engine.recognize(img, rects)):
+            for line in by_rect[rect]:
+                line.text = text
+                line.confidence = confidence
+            if rect in keys and text:
+                self._cache_recognition(keys[rect], text, confidence)
+
+    def _cache_recognition(self, key: bytes, text: str, confidence: float) -> None:
+        self._recognition_cache[key] = (text, confidence)
+        self._recognition_cache.move_to_end(key)
+        while len(self._recognition_cache) > self.recognition_cache_size:
+            self._recognition_cache.popitem(last=False)
+
+    @staticmethod
+    def load_image(image: ImageInput) -> np.ndarray:
         if isinstance(image, np.ndarray):
             return image
 
@@ -90,66 +447,322 @@ class GameOCR:
 
         raise TypeError(f"Unsupported image type: {type(image)}")
 
-    def _preprocess_image(self, img: np.ndarray) -> np.ndarray:
+    def _preprocess_image(self, img: np.ndarray) -> tuple[np.ndarray, _Transform, np.ndarray]:
         """
-        游戏 OCR 专用预处理策略：
-        - 默认不缩放
-        - 只在极端大图时才 resize
+        游戏 OCR 专用预处理流水线：
+        1. 裁剪到文本区域（crop_to_text）
+        2. 按估计的文字高度缩放到 target_text_height；极端大图仍按 RESIZE_THRESHOLD 缩小
+        3. 灰度化 / 对比度归一化
+        返回处理后的图像、坐标变换（用于把文本框坐标换算回原图）和裁剪后未缩放的原图（用于识别）
         """
-        h, w = img.shape[:2]
-        pixel_count = h * w
-
-        # 3M 像素以下：完全不动
-        if pixel_count <= RESIZE_THRESHOLD:
-            return img
-
-        # 极端大图才缩
-        scale = (RESIZE_THRESHOLD / pixel_count) ** 0.5
-        new_w = int(w * scale)
-        new_h = int(h * scale)
-
-        logger.debug(
-            "Resizing image from %dx%d to %dx%d for OCR",
-            w, h, new_w, new_h
-        )
-
-        return cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-
-    def _clear_list_to_text(self, texts: list[str]) -> str:
-        texts = [x.strip() for x in texts if isinstance(x, str)]
+        ox = oy = 0
+        if self._text_area is not None:
+            ox, oy, x2, y2 = self._text_area
+            img = img[oy:y2, ox:x2]
+            self.last_crop_ratio = img.shape[0] * img.shape[1] / float(self._frame_shape[0] * self._frame_shape[1])
+        else:
+            self.last_crop_ratio = 1.0
 
-        if len(texts) >= 3:
-            texts = [x for x in texts if x not in self.exclude_set]
-            if not texts:
+        h, w = img.shape[:2]
+        if self._text_scale is None:
+            self._text_scale = self._initial_text_scale(img)
+        scale = self._text_scale
+
+        # 极端大图才额外缩小
+        pixel_count = h * w * scale * scale
+        if pixel_count > RESIZE_THRESHOLD:
+            scale *= (RESIZE_THRESHOLD / pixel_count) ** 0.5
+
+        unscaled = img
+        if scale != 1.0:
+            new_w = max(1, int(w * scale))
+            new_h = max(1, int(h * scale))
+            logger.debug("Resizing image from %dx%d to %dx%d for OCR", w, h, new_w, new_h)
+            interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+            img = cv2.resize(img, (new_w, new_h), interpolation=interpolation)
+
+        return self._enhance(img), _Transform(scale, ox, oy), unscaled
+
+    def _enhance(self, img: np.ndarray) -> np.ndarray:
+        """灰度化 / 对比度归一化"""
+        if self.grayscale:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if self.normalize_contrast:
+                img = self._clahe.apply(img)
+        elif self.normalize_contrast:
+            # 只在亮度通道上做，保留颜色供检测模型使用
+            lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+            lab[:, :, 0] = self._clahe.apply(lab[:, :, 0])
+            img = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        return img
+
+    def _check_frame_shape(self, img: np.ndarray) -> None:
+        """截图区域大小变化时，重新估计文字大小和文本区域"""
+        shape = img.shape[:2]
+        if shape != self._frame_shape:
+            self._frame_shape = shape
+            self._text_scale = None
+            self._text_area = None
+            self._reset_layout()
+
+    def _initial_text_scale(self, img: np.ndarray) -> float:
+        """还没有检测框时，用连通域粗略估计行高"""
+        if self.target_text_height <= 0:
+            return 1.0
+        line_height = estimate_text_height(img)
+        if line_height is None:
+            return 1.0
+        return self._clamp_text_scale(self.target_text_height / line_height)
+
+    def _clamp_text_scale(self, scale: float) -> float:
+        return min(self.max_text_scale, max(self.min_text_scale, scale))
+
+    def _update_preprocess(self, lines: list[_Line], transform: _Transform, width: int, height: int) -> None:
+        """用检测到的文本行修正缩放比例和裁剪区域；发生变化时丢弃旧文本框，下一帧重新检测"""
+        if not lines:
+            return
+        changed = False
+        # 原图坐标下的行高中位数
+        line_height = float(np.median([line.rect[3] - line.rect[1] for line in lines])) / transform.scale
+
+        if self.target_text_height > 0 and line_height > 0:
+            scale = self._clamp_text_scale(self.target_text_height / line_height)
+            assert self._text_scale is not None
+            if abs(scale / self._text_scale - 1) > TEXT_SCALE_HYSTERESIS:
+                logger.debug("Text scale %.2f -> %.2f (line height %.1f px)", self._text_scale, scale, line_height)
+                self._text_scale = scale
+                changed = True
+
+        if self.crop_to_text:
+            if self._text_area is None:
+                # 整帧检测后确定文本区域，向外留出两行高度的余量
+                area = transform.to_original(lines[0].rect)
+                for line in lines[1:]:
+                    area = _union_rect(area, transform.to_original(line.rect))
+                frame_h, frame_w = self._frame_shape
+                area = _expand_rect(area, int(line_height * 2), frame_w, frame_h)
+                if area != (0, 0, frame_w, frame_h):
+                    self._text_area = area
+                    changed = True
+            elif _touches_crop_border(lines, self._text_area, self._frame_shape, width, height):
+                # 文字超出了裁剪区域，下一帧整帧检测
+                self._text_area = None
+                changed = True
+
+        if changed:
+            self._reset_layout()
+
+    def _clear_list_to_text(self, results: list[OCRResult]) -> str:
+        for r in results:
+            r.text = r.text.strip()
+        results = [r for r in results if r.text]
+
+        if len(results) >= 3:
+            results = [r for r in results if r.text not in self.excluder]
+            if not results:
                 return ""
 
-            longest_text = max(texts, key=len)
-            texts.remove(longest_text)
+            dialog = max(results, key=self._dialog_score)
+            self._dialog_box = dialog.box
 
-            for item in texts:
-                self.exclude_dict[item] = self.exclude_dict.get(item, 0) + 1
-                if self.exclude_dict[item] >= self.exclude_amount:
-                    self.exclude_set.add(item)
+            for r in results:
+                if r is dialog:
+                    continue
+                self.excluder.observe(r.text)
 
-            return longest_text
+            return dialog.text
         else:
-            return "\n".join(texts)
+            return "\n".join(r.text for r in results)
 
-    # ---------- persistence ----------
+    def _dialog_score(self, result: OCRResult) -> float:
+        """
+        按位置挑选对话框：面积越大、置信度越高越像对话框；
+        与上一次选中的对话框位置重叠的段落优先（对话框位置通常固定）
+        """
+        x1, y1, x2, y2 = result.box
+        score = (x2 - x1) * (y2 - y1) * result.confidence
+        if self._dialog_box is not None and _iou(result.box, self._dialog_box) > 0.3:
+            score *= 2
+        return score
 
-    def _load_exclude_set(self):
-        if not self.exclude_path:  # 检查是否为None
-            return
-        if not self.exclude_path.exists():
-            return
-        try:
-            with self.exclude_path.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    self.exclude_set.update(data)
-        except Exception:
-            logger.exception("Failed to load exclude_set")
+    # ---------- persistence ----------
 
+    def _on_exclude_change(self, op: str, text: str) -> None:
+        assert self.exclude_journal is not None
+        self.exclude_journal.append(op, text)
+        if self.exclude_journal.should_compact(len(self.excluder)):
+            self.exclude_journal.compact(self.excluder)
+
+
+# ---------- preprocess ----------
+
+def estimate_text_height(img: np.ndarray) -> Optional[float]:
+    """
+    用连通域粗略估计文本行高（像素）：Otsu二值化后取字形大小的连通域，
+    按其高度的75分位估计字形高度；字形太少时返回 None
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # 文字与背景的明暗未知，取像素较少的一类作为前景
+    if np.count_nonzero(binary) > binary.size // 2:
+        binary = cv2.bitwise_not(binary)
+
+    n, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if n <= 1:
+        return None
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    # 去掉噪点、横线和大块背景
+    glyphs = (heights >= 4) & (heights <= gray.shape[0] / 4) & (widths <= heights * 3) & (areas >= 8)
+    if np.count_nonzero(glyphs) < 10:
+        return None
+    return float(np.percentile(heights[glyphs], 75)) * LINE_HEIGHT_PER_GLYPH
+
+
+def _touches_crop_border(lines: list[_Line], area: Rect, frame_shape: tuple, width: int, height: int) -> bool:
+    """文本行是否贴着裁剪区域的边（裁剪区域本身贴着画面边缘的那一侧不算）"""
+    frame_h, frame_w = frame_shape
+    ax1, ay1, ax2, ay2 = area
+    for x1, y1, x2, y2 in (line.rect for line in lines):
+        if (ax1 > 0 and x1 <= 1) or (ay1 > 0 and y1 <= 1):
+            return True
+        if (ax2 < frame_w and x2 >= width - 1) or (ay2 < frame_h and y2 >= height - 1):
+            return True
+    return False
+
+
+# ---------- paragraph ----------
+
+def _merge_paragraphs(lines: list[_Line], x_ths: float, y_ths: float) -> list[tuple[str, Rect, float]]:
+    """
+    把文本行合并成段落，算法与 easyocr.utils.get_paragraph（ltr）一致，
+    额外保留段落置信度（按字符数加权的平均值）
+    返回 [(text, rect, confidence)]
+    """
+    lines = [line for line in lines if line.text]
+    groups = [0] * len(lines)
+    heights = [line.rect[3] - line.rect[1] for line in lines]
+
+    # 聚类：每次向当前段落加入一个相邻的行，加不进去就开始新段落
+    current = 1
+    while 0 in groups:
+        members = [i for i, g in enumerate(groups) if g == current]
+        if not members:
+            groups[groups.index(0)] = current
+            continue
+
+        mean_height = sum(heights[i] for i in members) / len(members)
+        min_gx = min(lines[i].rect[0] for i in members) - x_ths * mean_height
+        max_gx = max(lines[i].rect[2] for i in members) + x_ths * mean_height
+        min_gy = min(lines[i].rect[1] for i in members) - y_ths * mean_height
+        max_gy = max(lines[i].rect[3] for i in members) + y_ths * mean_height
+
+        added = False
+        for i, g in enumerate(groups):
+            if g != 0:
+                continue
+            x1, y1, x2, y2 = lines[i].rect
+            same_horizontal = min_gx <= x1 <= max_gx or min_gx <= x2 <= max_gx
+            same_vertical = min_gy <= y1 <= max_gy or min_gy <= y2 <= max_gy
+            if same_horizontal and same_vertical:
+                groups[i] = current
+                added = True
+                break
+        if not added:
+            current += 1
+
+    # 段落内按从上到下、从左到右排列
+    paragraphs = []
+    for group in sorted(set(groups)):
+        members = [lines[i] for i, g in enumerate(groups) if g == group]
+        mean_height = sum(m.rect[3] - m.rect[1] for m in members) / len(members)
+        rect = (
+            min(m.rect[0] for m in members),
+            min(m.rect[1] for m in members),
+            max(m.rect[2] for m in members),
+            max(m.rect[3] for m in members),
+        )
+        ordered = []
+        remaining = list(members)
+        while remaining:
+            highest = min((m.rect[1] + m.rect[3]) / 2 for m in remaining)
+            candidates = [m for m in remaining if (m.rect[1] + m.rect[3]) / 2 < highest + 0.4 * mean_height]
+            best = min(candidates, key=lambda m: m.rect[0])
+            ordered.append(best)
+            remaining.remove(best)
+
+        chars = sum(len(m.text) for m in ordered)
+        confidence = sum(m.confidence * len(m.text) for m in ordered) / chars
+        paragraphs.append((" ".join(m.text for m in ordered), rect, confidence))
+    return paragraphs
+
+
+# ---------- rect helpers ----------
+
+def _scale_rect(rect: Rect, scale: float, width: int, height: int) -> Rect:
+    x1, y1, x2, y2 = rect
+    return (
+        max(0, int(x1 * scale)),
+        max(0, int(y1 * scale)),
+        min(width, int(x2 * scale) + 1),
+        min(height, int(y2 * scale) + 1),
+    )
+
+
+def _crop_hash(img: np.ndarray, rect: Rect) -> bytes:
+    x1, y1, x2, y2 = rect
+    crop = np.ascontiguousarray(img[y1:y2, x1:x2])
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.array(crop.shape, dtype=np.int32).tobytes())
+    h.update(crop.data)
+    return h.digest()
+
+
+def _layout_thumbnail(img: np.ndarray) -> np.ndarray:
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    h, w = img.shape[:2]
+    return cv2.resize(
+        img,
+        (max(1, w // LAYOUT_SCALE), max(1, h // LAYOUT_SCALE)),
+        interpolation=cv2.INTER_AREA,
+    )
+
+
+def _rects_overlap(a: Rect, b: Rect) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _iou(a: Rect, b: Rect) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _union_rect(a: Rect, b: Rect) -> Rect:
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def _expand_rect(rect: Rect, margin: int, width: int, height: int) -> Rect:
+    x1, y1, x2, y2 = rect
+    return (max(0, x1 - margin), max(0, y1 - margin), min(width, x2 + margin), min(height, y2 + margin))
+
+
+def _merge_overlapping(rects: list[Rect]) -> list[Rect]:
+    merged: list[Rect] = []
+    for rect in rects:
+        i = 0
+        while i < len(merged):
+            if _rects_overlap(rect, merged[i]):
+                rect = _union_rect(rect, merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
 
 
 if __name__ == "__main__":
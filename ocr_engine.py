@@ -0,0 +1,142 @@
+import io
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (x1, y1, x2, y2)
+Rect = tuple[int, int, int, int]
+
+
+class OCREngine(ABC):
+    """
+    OCR引擎接口：GameOCR 只通过它做文本检测和文字识别，
+    预处理、文本框复用、识别缓存、段落合并都在 GameOCR 中完成，与引擎无关。
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def detect(self, img: np.ndarray) -> list[Rect]:
+        """检测文本行，返回图像坐标下的外框 (x1, y1, x2, y2)"""
+
+    @abstractmethod
+    def recognize(self, img: np.ndarray, rects: list[Rect]) -> list[tuple[str, float]]:
+        """识别给定文本框中的文字，返回与 rects 一一对应的 (text, confidence)"""
+
+    def memory_bytes(self) -> int:
+        """模型权重占用的字节数，未知时返回 0"""
+        return 0
+
+
+class EasyOCREngine(OCREngine):
+    """easyocr（CRAFT检测 + CRNN识别），GPU/CPU通用"""
+
+    name = "easyocr"
+
+    def __init__(self, languages: list[str], gpu: bool = True):
+        import easyocr
+        self.reader = easyocr.Reader(languages, gpu=gpu)
+        # 传给 reader.detect 的额外参数
+        self.detect_options: dict = {}
+
+    def detect(self, img: np.ndarray) -> list[Rect]:
+        horizontal_list, free_list = self.reader.detect(img, **self.detect_options)
+        boxes = [
+            (x_min, y_min, x_max, y_max)
+            for x_min, x_max, y_min, y_max in horizontal_list[0]
+        ]
+        # 倾斜文本框按外接矩形处理
+        for points in free_list[0]:
+            boxes.append(points_to_rect(points))
+        return boxes
+
+    def recognize(self, img: np.ndarray, rects: list[Rect]) -> list[tuple[str, float]]:
+        if not rects:
+            return []
+        unique = list(dict.fromkeys(rects))
+        result: list = self.reader.recognize(
+            img,
+            horizontal_list=[[x1, x2, y1, y2] for x1, y1, x2, y2 in unique],
+            free_list=[],
+            detail=1,
+            paragraph=False,
+        )
+        # recognize 会按纵坐标重新排序，按坐标对回文本框
+        by_rect: dict[Rect, tuple[str, float]] = {}
+        for points, text, confidence in result:
+            by_rect[points_to_rect(points)] = (text, float(confidence))
+        return [by_rect.get(rect, ("", 0.0)) for rect in rects]
+
+    def memory_bytes(self) -> int:
+        return _module_bytes(self.reader.detector) + _module_bytes(self.reader.recognizer)
+
+
+class CPUEasyOCREngine(EasyOCREngine):
+    """
+    无GPU机器上的easyocr（Reader(gpu=False) 已自带识别模型的动态量化，这里不再重复）：
+    - 按物理核心数设置torch线程数（进程全局），避免超线程和多个OCR进程互相抢核
+    - 限制检测画布尺寸，配合按文字高度缩放的预处理，CRAFT不再按整张大图运行
+    """
+
+    name = "cpu"
+
+    def __init__(
+        self,
+        languages: list[str],
+        gpu: bool = False,
+        num_threads: Optional[int] = None,
+        canvas_size: int = 1280,
+    ):
+        """
+        gpu: 忽略，始终在CPU上运行
+        num_threads: torch计算线程数，None表示使用物理核心数；作用于整个进程
+        canvas_size: 检测时图像长边的上限（easyocr默认2560）
+        """
+        import torch
+
+        self.num_threads = num_threads or default_num_threads()
+        torch.set_num_threads(self.num_threads)
+        super().__init__(languages, gpu=False)
+
+        self.detect_options = {"canvas_size": canvas_size}
+        logger.info("CPU OCR engine: %d threads, canvas_size=%d", self.num_threads, canvas_size)
+
+
+OCR_ENGINES: dict[str, type[OCREngine]] = {
+    EasyOCREngine.name: EasyOCREngine,
+    CPUEasyOCREngine.name: CPUEasyOCREngine,
+}
+
+
+def create_ocr_engine(name: str, **kwargs) -> OCREngine:
+    """按名称创建OCR引擎，kwargs 透传给引擎构造函数"""
+    try:
+        engine_cls = OCR_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unsupported OCR engine: {name}") from None
+    return engine_cls(**kwargs)
+
+
+def default_num_threads() -> int:
+    """物理核心数的估计值（逻辑核心数的一半，至少为1）"""
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+def points_to_rect(points) -> Rect:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return (int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys)))
+
+
+def _module_bytes(module) -> int:
+    """序列化后的state_dict大小，量化模块的打包权重也能计入"""
+    import torch
+
+    buf = io.BytesIO()
+    torch.save(module.state_dict(), buf)
+    return buf.tell()
@@ -0,0 +1,491 @@
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+
+from exclude import ExcludeJournal
+from ocr import GameOCR, ImageInput, OCRResult, Rect
+
+logger = logging.getLogger(__name__)
+
+
+def _inherited_resource_tracker() -> bool:
+    """fork 时主进程的 resource_tracker 已经在运行，子进程沿用它"""
+    from multiprocessing import resource_tracker
+    return getattr(resource_tracker._resource_tracker, "_fd", None) is not None  # type: ignore[attr-defined]
+
+
+def _attach(
+    name: str, cache: dict[str, shared_memory.SharedMemory], unregister: bool = True
+) -> shared_memory.SharedMemory:
+    shm = cache.get(name)
+    if shm is None:
+        shm = cache[name] = shared_memory.SharedMemory(name=name)
+        if unregister and os.name == "posix":
+            # 共享内存由主进程负责释放，避免子进程退出时被resource_tracker提前回收
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    return shm
+
+
+def ocr_worker_entry(
+    worker: int, task_queue: mp.Queue, result_queue: mp.Queue, ocr_kwargs: dict, warm_up: bool = True
+):
+    """
+    OCR工作进程入口
+    task: ("ocr", task_id, shm_name, offset, shape, dirty_rects, want_results)
+          ("call", task_id, method_name)
+          ("exclude", None, exclude_changes)：其他工作进程学到的排除集变化，只应用不回报
+          None 表示退出
+    result: (task_id, ok, payload, exclude_changes)，模型加载（和预热）完成后先发送 ("ready", ok, (worker, error), [])
+        exclude_changes 为处理该任务时排除集的变化 [(op, text), ...]，由主进程写入日志并转发给其他工作进程
+    """
+    # 重启的工作进程在主进程启动 resource_tracker 之后才 fork，与主进程共用同一个，
+    # 这时不能注销共享内存，否则主进程的登记也被删掉
+    own_tracker = os.name == "posix" and not _inherited_resource_tracker()
+    try:
+        ocr = GameOCR(**ocr_kwargs)
+        if warm_up:
+            ocr.warm_up()
+    except Exception as e:
+        logger.exception("OCR worker failed to load")
+        result_queue.put(("ready", False, (worker, repr(e)), []))
+        return
+    result_queue.put(("ready", True, (worker, None), []))
+
+    exclude_changes: list[tuple[str, str]] = []
+    ocr.excluder.on_change = lambda op, text: exclude_changes.append((op, text))
+
+    attached: dict[str, shared_memory.SharedMemory] = {}
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        kind, task_id = task[0], task[1]
+        if kind == "exclude":
+            on_change = ocr.excluder.on_change
+            ocr.excluder.on_change = None
+            for op, text in task[2]:
+                if op == "add":
+                    ocr.excluder.add(text)
+                else:
+                    ocr.excluder.discard(text)
+            ocr.excluder.on_change = on_change
+            continue
+        try:
+            if kind == "ocr":
+                _, _, shm_name, offset, shape, dirty_rects, want_results = task
+                shm = _attach(shm_name, attached, unregister=own_tracker)
+                # 直接在共享内存上建立视图，不拷贝
+                image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                if want_results:
+                    payload = ocr.img_to_results(image, dirty_rects)
+                else:
+                    payload = ocr.img_to_text(image, dirty_rects)
+                del image
+            else:
+                payload = getattr(ocr, task[2])()
+            result_queue.put((task_id, True, payload, list(exclude_changes)))
+        except Exception as e:
+            logger.exception("OCR worker task failed")
+            result_queue.put((task_id, False, repr(e), list(exclude_changes)))
+        exclude_changes.clear()
+
+    for shm in attached.values():
+        shm.close()
+
+
+class OCRWorkerPool:
+    """
+    在独立进程中运行 GameOCR，避免OCR与GUI、翻译请求争抢GIL
+    帧通过共享内存环形缓冲区传给工作进程，不经过pickle；
+    对外保持 GameOCR 的 img_to_text / img_to_results 接口。
+
+    多个工作进程时，各进程看到的帧不连续，脏区域（dirty_rects）不再转发，
+    每帧重新识别全部文本行（检测框复用和截图哈希缓存仍在进程内生效）。
+    某个进程学到的排除集变化由主进程转发给其他进程，各进程的排除集保持一致。
+
+    工作进程崩溃或卡住（任务超过 task_timeout 未完成）时，其未完成的任务以异常结束，
+    进程被终止并重新启动，最多 max_restarts 次；所有进程都不可用时 error 不为 None，之后的请求直接失败。
+    """
+
+    def __init__(
+        self,
+        num_workers: int = 1,
+        slots: int = 4,
+        exclude_path: Union[str, Path, None] = "exclude_set.jsonl",
+        warm_up: bool = True,
+        task_timeout: float = 30.0,
+        max_restarts: int = 3,
+        **ocr_kwargs,
+    ):
+        """
+        Args:
+            num_workers: 工作进程数
+            slots: 共享内存环形缓冲区的帧槽数量，即同时在处理中的最大帧数
+            exclude_path: OCR排除集日志文件，只由主进程写入（工作进程把学到的条目随结果发回）
+            warm_up: 工作进程加载模型后先用假图预热一次，再报告就绪
+            task_timeout: 单个任务（从提交算起）的最长等待时间，超过视为工作进程卡住
+            max_restarts: 每个工作进程崩溃或卡住后最多重启的次数
+            ocr_kwargs: 传给 GameOCR 的其他参数
+        """
+        self.num_workers = max(1, num_workers)
+        self.slots = max(self.num_workers, slots)
+
+        # 排除集由主进程持久化，工作进程只在内存中学习
+        self.exclude_path = Path(exclude_path) if exclude_path else None
+        self.exclude_journal = ExcludeJournal(self.exclude_path) if self.exclude_path else None
+        self._exclude_set: dict[str, None] = dict.fromkeys(
+            self.exclude_journal.load() if self.exclude_journal else ()
+        )
+        for text in ocr_kwargs.pop("exclude_set", None) or ():
+            self._apply_exclude_change("add", text)
+        ocr_kwargs["exclude_path"] = None
+        self._ocr_kwargs = ocr_kwargs
+        self._warm_up = warm_up
+        self.task_timeout = task_timeout
+        self.max_restarts = max_restarts
+
+        self._lock = threading.Lock()
+        self._futures: dict[int, Future] = {}
+        self._task_worker: dict[int, int] = {}
+        self._task_slot: dict[int, int] = {}
+        self._task_deadline: dict[int, float] = {}
+        self._inflight = [0] * self.num_workers
+        self._restarts = [0] * self.num_workers
+        # 重启次数用完后不再使用的工作进程
+        self._dead: set[int] = set()
+        self._closed = False
+        self._next_id = 0
+        self._ready = 0
+        self._ready_event = threading.Event()
+        # 工作进程加载失败、或所有工作进程都不可用时的错误信息
+        self.error: Optional[str] = None
+
+        self._result_queue: mp.Queue = mp.Queue()
+        self._task_queues: list[mp.Queue] = [mp.Queue() for _ in range(self.num_workers)]
+        self._processes: list[mp.Process] = [self._spawn(i) for i in range(self.num_workers)]
+
+        # 共享内存环：slots 个等大的帧槽，首帧时按帧大小分配
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._slot_bytes = 0
+        self._free_slots: list[int] = []
+        self._slot_cond = threading.Condition(self._lock)
+
+        self._result_thread = threading.Thread(target=self._result_loop, daemon=True)
+        self._result_thread.start()
+
+    # ---------- GameOCR 接口 ----------
+
+    def img_to_text(self, image: ImageInput, dirty_rects: Optional[list[Rect]] = None) -> str:
+        return self.submit(image, dirty_rects).result(timeout=self.task_timeout)
+
+    def img_to_results(self, image: ImageInput, dirty_rects: Optional[list[Rect]] = None) -> list[OCRResult]:
+        return self.submit(image, dirty_rects, want_results=True).result(timeout=self.task_timeout)
+
+    @property
+    def exclude_set(self) -> set[str]:
+        """所有工作进程学到的排除集的并集"""
+        with self._lock:
+            return set(self._exclude_set)
+
+    def save_exclude_set(self) -> None:
+        """新条目已实时写入日志，这里把日志压缩成当前集合的快照"""
+        if self.exclude_journal is None:
+            return
+        with self._lock:
+            self.exclude_journal.compact(list(self._exclude_set))
+
+    def stats(self) -> dict:
+        """各工作进程统计的累加（比例类指标取平均）"""
+        merged: dict[str, float] = {}
+        results = self._broadcast("stats")
+        for result in results:
+            for key, value in result.items():
+                merged[key] = merged.get(key, 0) + value
+        for key in ("last_ocr_area_ratio", "cache_hit_rate", "text_scale", "crop_ratio"):
+            if key in merged and results:
+                merged[key] /= len(results)
+        merged["workers"] = self.num_workers
+        with self._lock:
+            merged["worker_restarts"] = sum(self._restarts)
+            merged["workers_dead"] = len(self._dead)
+        return merged
+
+    # ---------- pool ----------
+
+    def submit(
+        self,
+        image: ImageInput,
+        dirty_rects: Optional[list[Rect]] = None,
+        want_results: bool = False,
+    ) -> Future:
+        """把帧拷入共享内存并交给最空闲的工作进程，返回 Future"""
+        self._check_usable()
+        image = np.ascontiguousarray(GameOCR.load_image(image), dtype=np.uint8)
+        if self.num_workers > 1:
+            dirty_rects = None
+
+        slot = self._acquire_slot(image.nbytes)
+        assert self._shm is not None
+        offset = slot * self._slot_bytes
+        view = np.ndarray(image.shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset)
+        view[...] = image
+        del view
+
+        future: Future = Future()
+        with self._lock:
+            live = [i for i in range(self.num_workers) if i not in self._dead]
+            if not live:
+                self._free_slots.append(slot)
+                self._slot_cond.notify_all()
+                raise RuntimeError(f"OCR workers unavailable: {self.error}")
+            worker = min(live, key=lambda i: self._inflight[i])
+            task_id = self._register(future, worker)
+            self._task_slot[task_id] = slot
+            self._task_queues[worker].put(
+                ("ocr", task_id, self._shm.name, offset, image.shape, dirty_rects, want_results)
+            )
+        return future
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待所有工作进程加载完模型；有工作进程加载失败时也会返回，此时 error 不为 None"""
+        return self._ready_event.wait(timeout)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for task_id in list(self._futures):
+                self._fail_task(task_id, RuntimeError("OCR worker pool closed"))
+        for q in self._task_queues:
+            q.put(None)
+        for p in self._processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self._result_queue.put(None)
+        self._result_thread.join(timeout=2)
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if self.exclude_journal is not None:
+            self.exclude_journal.close()
+
+    def __len__(self) -> int:
+        return self.num_workers
+
+    # ---------- internal ----------
+
+    def _spawn(self, worker: int) -> mp.Process:
+        """启动工作进程，初始排除集取主进程当前的（重启时包含其他进程学到的）"""
+        ocr_kwargs = dict(self._ocr_kwargs, exclude_set=list(self._exclude_set))
+        process = mp.Process(
+            target=ocr_worker_entry,
+            args=(worker, self._task_queues[worker], self._result_queue, ocr_kwargs, self._warm_up),
+            name=f"ocr-worker-{worker}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    def _check_usable(self) -> None:
+        if self._closed:
+            raise RuntimeError("OCR worker pool closed")
+        if len(self._dead) >= self.num_workers:
+            raise RuntimeError(f"OCR workers unavailable: {self.error}")
+
+    def _register(self, future: Future, worker: int) -> int:
+        """登记一个发给 worker 的任务（需持有锁），返回任务编号"""
+        task_id = self._next_id
+        self._next_id += 1
+        self._futures[task_id] = future
+        self._task_worker[task_id] = worker
+        self._task_deadline[task_id] = time.monotonic() + self.task_timeout
+        self._inflight[worker] += 1
+        return task_id
+
+    def _broadcast(self, method: str) -> list[Any]:
+        """在每个可用的工作进程上调用 method；关闭后或没有可用进程时返回空列表"""
+        futures = []
+        with self._lock:
+            if self._closed:
+                return []
+            for worker, q in enumerate(self._task_queues):
+                if worker in self._dead:
+                    continue
+                future: Future = Future()
+                q.put(("call", self._register(future, worker), method))
+                futures.append(future)
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=self.task_timeout))
+            except Exception as e:
+                logger.warning("OCR worker call %s failed: %s", method, e)
+        return results
+
+    def _apply_exclude_change(self, op: str, text: str) -> bool:
+        """合并工作进程的排除集变化并写入日志（多个进程学到同一条时只写一次），返回是否有变化"""
+        if op == "add":
+            if text in self._exclude_set:
+                return False
+            self._exclude_set[text] = None
+        elif op == "remove":
+            if text not in self._exclude_set:
+                return False
+            del self._exclude_set[text]
+        if self.exclude_journal is None:
+            return True
+        self.exclude_journal.append(op, text)
+        if self.exclude_journal.should_compact(len(self._exclude_set)):
+            self.exclude_journal.compact(list(self._exclude_set))
+        return True
+
+    def _sync_exclude_changes(self, source: Optional[int], changes: list[tuple[str, str]]) -> None:
+        """把 source 进程学到的变化写入日志并转发给其他工作进程（需持有锁）"""
+        changes = [(op, text) for op, text in changes if self._apply_exclude_change(op, text)]
+        if not changes or self._closed:
+            return
+        for worker, q in enumerate(self._task_queues):
+            if worker != source and worker not in self._dead:
+                q.put(("exclude", None, changes))
+
+    def _fail_task(self, task_id: int, error: BaseException) -> None:
+        """以异常结束任务并释放其帧槽（需持有锁）"""
+        future = self._futures.pop(task_id, None)
+        worker = self._task_worker.pop(task_id, None)
+        self._task_deadline.pop(task_id, None)
+        if worker is not None:
+            self._inflight[worker] -= 1
+        slot = self._task_slot.pop(task_id, None)
+        if slot is not None:
+            self._free_slots.append(slot)
+            self._slot_cond.notify_all()
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def _check_workers(self) -> None:
+        """找出崩溃或卡住的工作进程，结束其任务并重启"""
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                return
+            for worker, process in enumerate(self._processes):
+                if worker in self._dead:
+                    continue
+                hung = any(
+                    self._task_deadline.get(task_id, now) < now
+                    for task_id, w in self._task_worker.items() if w == worker
+                )
+                if process.is_alive() and not hung:
+                    continue
+                reason = "hung" if process.is_alive() else f"exited with code {process.exitcode}"
+                self._restart_worker(worker, reason)
+
+    def _restart_worker(self, worker: int, reason: str) -> None:
+        """终止工作进程、以异常结束其任务，重启次数未用完时重新启动（需持有锁）"""
+        process = self._processes[worker]
+        if process.is_alive():
+            # 卡住的进程可能收不到 SIGTERM，直接杀掉并回收
+            process.kill()
+            process.join(timeout=1)
+        error = RuntimeError(f"OCR worker {worker} {reason}")
+        for task_id in [t for t, w in self._task_worker.items() if w == worker]:
+            self._fail_task(task_id, error)
+        self._inflight[worker] = 0
+        if self._restarts[worker] >= self.max_restarts:
+            logger.error("OCR worker %d %s, giving up after %d restarts", worker, reason, self._restarts[worker])
+            self._dead.add(worker)
+            if len(self._dead) >= self.num_workers:
+                self.error = self.error or str(error)
+                self._ready_event.set()
+            return
+        self._restarts[worker] += 1
+        logger.warning("OCR worker %d %s, restarting (%d/%d)", worker, reason, self._restarts[worker], self.max_restarts)
+        # 旧队列中可能还有发给卡住的进程的任务，换一个新队列
+        self._task_queues[worker] = mp.Queue()
+        self._processes[worker] = self._spawn(worker)
+
+    def _acquire_slot(self, nbytes: int) -> int:
+        with self._slot_cond:
+            if self._shm is None or nbytes > self._slot_bytes:
+                # 首帧或帧变大：等所有帧处理完后重新分配
+                if not self._slot_cond.wait_for(
+                    lambda: len(self._free_slots) == self.slots or self._shm is None, timeout=self.task_timeout
+                ):
+                    raise TimeoutError("OCR worker pool: frames still in flight")
+                if self._shm is not None:
+                    self._shm.close()
+                    self._shm.unlink()
+                self._slot_bytes = nbytes
+                self._shm = shared_memory.SharedMemory(create=True, size=nbytes * self.slots)
+                self._free_slots = list(range(self.slots))
+            if not self._slot_cond.wait_for(lambda: bool(self._free_slots), timeout=self.task_timeout):
+                raise TimeoutError("OCR worker pool: no free frame slot")
+            return self._free_slots.pop()
+
+    def _result_loop(self) -> None:
+        # 定期检查工作进程是否崩溃或卡住
+        check_interval = min(1.0, self.task_timeout / 2)
+        last_check = time.monotonic()
+        while True:
+            if time.monotonic() - last_check >= check_interval:
+                self._check_workers()
+                last_check = time.monotonic()
+            try:
+                message = self._result_queue.get(timeout=check_interval)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if message is None:
+                break
+
+            task_id, ok, payload, exclude_changes = message
+            if task_id == "ready":
+                worker, error = payload
+                with self._lock:
+                    if not ok:
+                        if self._ready < self.num_workers:
+                            # 启动时加载失败：报告给 wait_ready 的调用方
+                            self.error = error
+                            self._ready_event.set()
+                        else:
+                            self._restart_worker(worker, f"failed to load: {error}")
+                        continue
+                    self._ready += 1
+                    if self._ready >= self.num_workers:
+                        self._ready_event.set()
+                continue
+
+            with self._slot_cond:
+                future = self._futures.pop(task_id, None)
+                worker = self._task_worker.pop(task_id, None)
+                self._task_deadline.pop(task_id, None)
+                if worker is not None:
+                    self._inflight[worker] -= 1
+                slot = self._task_slot.pop(task_id, None)
+                if slot is not None:
+                    self._free_slots.append(slot)
+                    self._slot_cond.notify_all()
+                if exclude_changes:
+                    self._sync_exclude_changes(worker, exclude_changes)
+
+            if future is None or future.done():
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(f"OCR worker failed: {payload}"))
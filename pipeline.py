@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatestQueue:
+    """
+    线程安全的有界队列，满了以后丢弃最旧的元素（latest-wins）
+    用于流水线各阶段之间传递数据：下游处理不过来时只保留最新的数据。
+    merge(最后一个元素, 新元素) 返回合并后的元素时，满了以后把新元素并入最后一个元素而不丢弃；
+    返回 None 时照常丢弃最旧的。
+    """
+
+    def __init__(self, maxsize: int = 1, merge: Optional[Callable[[Any, Any], Any]] = None):
+        self.maxsize = max(1, maxsize)
+        self.merge = merge
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.put_count = 0
+        self.dropped = 0
+        self.merged = 0
+
+    def put(self, item: Any) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._items) >= self.maxsize:
+                merged = self.merge(self._items[-1], item) if self.merge is not None else None
+                if merged is not None:
+                    self._items[-1] = merged
+                    self.merged += 1
+                    self.put_count += 1
+                    self._cond.notify()
+                    return
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """取出最旧的元素；队列关闭或超时返回 None"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def clear(self) -> int:
+        """清空队列，返回被丢弃的数量"""
+        with self._cond:
+            n = len(self._items)
+            self._items.clear()
+            self.dropped += n
+            return n
+
+    def close(self) -> None:
+        """关闭队列并唤醒所有等待者"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+
+class Stage:
+    """
+    流水线中的一个阶段：独立线程从输入队列取数据，处理后放入输出队列
+    func 返回 None 表示该数据到此为止，不再向下游传递。
+    workers > 1 时由多个线程同时处理（func 需线程安全，输出顺序不保证）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        in_queue: LatestQueue,
+        out_queue: Optional[LatestQueue] = None,
+        workers: int = 1,
+    ):
+        self.name = name
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.workers = max(1, workers)
+
+        self.processed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._stats_lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        self._threads = [
+            threading.Thread(target=self._run, name=f"stage-{self.name}-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self.in_queue.closed:
+            item = self.in_queue.get()
+            if item is None:
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception:
+                with self._stats_lock:
+                    self.errors += 1
+                logger.exception("Stage %s failed", self.name)
+                continue
+            finally:
+                with self._stats_lock:
+                    self.busy_seconds += time.perf_counter() - start
+                    self.processed += 1
+
+            if result is not None and self.out_queue is not None:
+                self.out_queue.put(result)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.in_queue.depth(),
+            "queue_dropped": self.in_queue.dropped,
+            "queue_merged": self.in_queue.merged,
+            "processed": self.processed,
+            "errors": self.errors,
+            "busy_seconds": self.busy_seconds,
+        }
+
+
+class Pipeline:
+    """按顺序连接的多个阶段，第一个阶段的输入队列即流水线入口"""
+
+    def __init__(self, queue_size: int = 1):
+        self.queue_size = queue_size
+        self.stages: list[Stage] = []
+        self._head: Optional[LatestQueue] = None
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        workers: int = 1,
+        merge: Optional[Callable[[Any, Any], Any]] = None,
+    ) -> "Pipeline":
+        """merge: 本阶段输入队列满时合并元素的函数，见 LatestQueue"""
+        in_queue = LatestQueue(self.queue_size, merge=merge)
+        if self.stages:
+            # 上一阶段的输出即本阶段的输入
+            self.stages[-1].out_queue = in_queue
+        else:
+            self._head = in_queue
+        self.stages.append(Stage(name, func, in_queue, workers=workers))
+        return self
+
+    def start(self) -> None:
+        for stage in self.stages:
+            stage.start()
+
+    def put(self, item: Any) -> None:
+        if self._head is not None:
+            self._head.put(item)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        for stage in self.stages:
+            stage.in_queue.close()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def stats(self) -> dict:
+        return {stage.name: stage.stats() for stage in self.stages}
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import deque
+
+
+class AdaptiveScheduler:
+    """
+    基于截止时间的截图调度器
+    - 以固定的目标周期排期，处理耗时从等待时间中扣除，周期不会随OCR/翻译耗时漂移
+    - 画面变化后切换到最短周期，连续 boost_frames 帧静止后回到目标周期，
+      之后每个静止帧按 backoff 倍数放慢，直到最长周期
+    - 错过截止时间时重新对齐到当前时间，不做补帧
+    """
+
+    def __init__(
+        self,
+        target_interval: float = 0.8,
+        min_interval: float = 0.3,
+        max_interval: float = 2.0,
+        backoff: float = 1.5,
+        boost_frames: int = 4,
+        window: int = 50,
+    ):
+        """
+        Args:
+            target_interval: 目标截图周期（秒）
+            min_interval: 画面变化后的最短周期
+            max_interval: 长时间静止时的最长周期
+            backoff: 静止时每帧周期放大的倍数
+            boost_frames: 画面变化后保持最短周期的帧数
+            window: 统计FPS与延迟所用的滑动窗口帧数
+        """
+        self.target_interval = target_interval
+        self.min_interval = min(min_interval, target_interval)
+        self.max_interval = max(max_interval, target_interval)
+        self.backoff = backoff
+        self.boost_frames = boost_frames
+
+        self.interval = target_interval
+        self._static_frames = 0
+        self._deadline = time.monotonic()
+        self._wake = threading.Event()
+
+        self._frame_times: deque[float] = deque(maxlen=window)
+        self._lateness: deque[float] = deque(maxlen=window)
+        self.late_frames = 0
+        self.frames = 0
+
+    def start(self) -> None:
+        """重新开始排期"""
+        self._deadline = time.monotonic()
+        self.interval = self.target_interval
+        self._static_frames = 0
+        self._frame_times.clear()
+        self._lateness.clear()
+        self._wake.clear()
+
+    def frame_done(self, changed: bool) -> None:
+        """一帧处理完毕，根据画面是否变化调整下一帧的周期"""
+        if changed:
+            self._static_frames = 0
+            self.interval = self.min_interval
+        else:
+            self._static_frames += 1
+            if self._static_frames == self.boost_frames:
+                self.interval = self.target_interval
+            elif self._static_frames > self.boost_frames:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+
+    def wait(self) -> None:
+        """等待到下一帧的截止时间（可被 wake() 提前唤醒）"""
+        self._deadline += self.interval
+        now = time.monotonic()
+        delay = self._deadline - now
+
+        if delay > 0:
+            self._wake.wait(delay)
+            self._lateness.append(0.0)
+        else:
+            # 已经迟到：记录并重新对齐，避免连续补帧
+            self.late_frames += 1
+            self._lateness.append(-delay)
+            self._deadline = now
+
+        self._wake.clear()
+        self.frames += 1
+        self._frame_times.append(time.monotonic())
+
+    def wake(self) -> None:
+        """立即结束当前等待（停止时调用）"""
+        self._wake.set()
+
+    def stats(self) -> dict:
+        times = self._frame_times
+        span = times[-1] - times[0] if len(times) >= 2 else 0.0
+        lateness = list(self._lateness)
+        return {
+            "effective_fps": (len(times) - 1) / span if span > 0 else 0.0,
+            "interval": self.interval,
+            "frames": self.frames,
+            "late_frames": self.late_frames,
+            "mean_lateness": sum(lateness) / len(lateness) if lateness else 0.0,
+            "max_lateness": max(lateness) if lateness else 0.0,
+        }
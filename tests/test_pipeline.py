@@ -0,0 +1,50 @@
+import time
+
+from pipeline import LatestQueue, Pipeline
+from utils import PREFIX, Checker, merge_segments
+
+DIALOG = "First sentence here. Second sentence there. Third one is here. Fourth line ends now."
+
+
+def _typewriter_frames(text: str, step: int = 4) -> list[str]:
+    frames = [text[:end] for end in range(step, len(text), step)]
+    return frames + [text] * 3
+
+
+def _run(merge) -> list[str]:
+    checker = Checker(mode=PREFIX)
+    translated: list[str] = []
+
+    def ocr_stage(text):
+        segment = checker.check_segment(text)
+        if segment is None:
+            return None
+        return segment, 0.0, checker.generation
+
+    def translate_stage(item):
+        time.sleep(0.5)
+        translated.append(item[0])
+
+    pipeline = Pipeline(queue_size=1).add_stage("ocr", ocr_stage).add_stage("translate", translate_stage, merge=merge)
+    pipeline.start()
+    for frame in _typewriter_frames(DIALOG):
+        pipeline.put(frame)
+        time.sleep(0.02)
+    time.sleep(1.5)
+    pipeline.stop()
+    return translated
+
+
+def test_prefix_segments_survive_busy_translate_stage():
+    translated = _run(merge_segments)
+    assert " ".join(translated) == DIALOG
+
+
+def test_latest_queue_drops_older_generations():
+    queue = LatestQueue(1, merge=merge_segments)
+    queue.put(("Old line.", 0.0, 1))
+    queue.put(("New line.", 1.0, 2))
+    queue.put(("Next sentence.", 1.0, 2))
+    assert queue.get(timeout=0) == ("New line. Next sentence.", 1.0, 2)
+    assert queue.dropped == 1
+    assert queue.merged == 1
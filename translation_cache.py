@@ -0,0 +1,198 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_source(text: str) -> str:
+    """缓存键用的原文归一化：合并空白（OCR换行、多余空格不影响命中），保留大小写和标点"""
+    return " ".join(text.split())
+
+
+def cache_namespace(prompt: str, model: str, temperature: Optional[float]) -> str:
+    """提示词 + 模型 + 温度 的摘要，同一组设置下的译文属于同一个命名空间"""
+    payload = json.dumps([prompt, model, temperature], ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def cache_key(text: str, prompt: str, model: str, temperature: Optional[float]) -> str:
+    """归一化原文 + 提示词 + 模型 + 温度 的摘要，任何一项变化都不会命中旧译文"""
+    payload = json.dumps(
+        [normalize_source(text), prompt, model, temperature],
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class TranslationCache:
+    """
+    磁盘上的翻译缓存（SQLite），重启后仍然有效
+    - 键：归一化原文、提示词、模型、温度
+    - 淘汰：条目数超过 max_entries 或译文总字节数超过 max_bytes 时，按最近使用时间淘汰最旧的一批
+    - 线程安全：多个翻译线程共用一个连接，由锁串行化
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = "translation_cache.sqlite3",
+        max_entries: int = 50000,
+        max_bytes: int = 64 * 1024 * 1024,
+        evict_fraction: float = 0.1,
+    ):
+        """
+        path: 数据库文件，":memory:" 表示只在内存中缓存
+        max_entries / max_bytes: 条目数和原文+译文总字节数的上限
+        evict_fraction: 超出上限时一次淘汰的比例，避免每次写入都触发淘汰
+        """
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_fraction = evict_fraction
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL DEFAULT '',
+                source TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(translations)")}
+        if "namespace" not in columns:
+            # 早期版本的表没有命名空间列
+            self._conn.execute("ALTER TABLE translations ADD COLUMN namespace TEXT NOT NULL DEFAULT ''")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations(last_used)")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS translations_namespace ON translations(namespace, last_used)"
+        )
+        self._conn.commit()
+
+        self._entries, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations"
+        ).fetchone()
+
+    def get(self, text: str, prompt: str, model: str, temperature: Optional[float]) -> Optional[str]:
+        """命中时返回译文并刷新最近使用时间，未命中返回 None"""
+        key = cache_key(text, prompt, model, temperature)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT translation FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE translations SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, text: str, translation: str, prompt: str, model: str, temperature: Optional[float]) -> None:
+        if not translation:
+            return
+        key = cache_key(text, prompt, model, temperature)
+        source = normalize_source(text)
+        size = len(source.encode("utf-8")) + len(translation.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM translations WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (key, namespace, source, translation, size, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, cache_namespace(prompt, model, temperature), source, translation, size, time.time()),
+            )
+            if old is None:
+                self._entries += 1
+                self._bytes += size
+            else:
+                self._bytes += size - old[0]
+            if self._entries > self.max_entries or self._bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def recent(
+        self, prompt: str, model: str, temperature: Optional[float], limit: int = 100000
+    ) -> list[tuple[str, str]]:
+        """同一组设置下最近使用的 (原文, 译文)，最新的在前，用于预热翻译记忆"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT source, translation FROM translations WHERE namespace = ? "
+                "ORDER BY last_used DESC LIMIT ?",
+                (cache_namespace(prompt, model, temperature), limit),
+            ).fetchall()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache_entries": self._entries,
+                "cache_bytes": self._bytes,
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+                "cache_evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM translations")
+            self._conn.commit()
+            self._entries = 0
+            self._bytes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def _evict(self) -> None:
+        """按最近使用时间淘汰最旧的一批，直到回到上限以内"""
+        while self._entries > 0 and (self._entries > self.max_entries or self._bytes > self.max_bytes):
+            n = max(1, int(self._entries * self.evict_fraction))
+            removed, removed_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ("
+                "SELECT size FROM translations ORDER BY last_used LIMIT ?)",
+                (n,),
+            ).fetchone()
+            self._conn.execute(
+                "DELETE FROM translations WHERE key IN ("
+                "SELECT key FROM translations ORDER BY last_used LIMIT ?)",
+                (n,),
+            )
+            self._entries -= removed
+            self._bytes -= removed_bytes
+            self.evictions += removed
+        logger.debug("Translation cache evicted down to %d entries", self._entries)
+
+
+if __name__ == "__main__":
+    cache = TranslationCache(":memory:", max_entries=3)
+    prompt = "翻译成中文"
+    for text in ["Hello", "Save game", "Load game", "Quit"]:
+        print(text, cache.get(text, prompt, "deepseek-chat", 1.3))
+        cache.put(text, f"[译]{text}", prompt, "deepseek-chat", 1.3)
+    print("Hello  ", cache.get("  Hello ", prompt, "deepseek-chat", 1.3))
+    print("Quit", cache.get("Quit", prompt, "deepseek-chat", 1.3))
+    print(cache.stats())
@@ -0,0 +1,254 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional
+
+import Levenshtein
+
+logger = logging.getLogger(__name__)
+
+_DIGITS = re.compile(r"\d+")
+
+# OCR常见的字形混淆：识别错误只会在这些字符（串）之间互换，"mouse"/"house" 这种换了一个字母的另一个词不算
+OCR_CONFUSIONS = (
+    ("rn", "m"), ("vv", "w"), ("cl", "d"),
+    ("i", "l"), ("|", "l"), ("!", "l"),
+    ("e", "c"), ("v", "u"), ("o", "0"), ("s", "5"), ("b", "8"), ("z", "2"),
+    ("’", "'"), ("‘", "'"), ("`", "'"), ("“", '"'), ("”", '"'),
+)
+# 否定词：差一个否定词的两句话意思相反，即使只差几个字符也不能复用译文
+_NEGATIONS = frozenset((
+    "no", "not", "never", "nor", "none", "nothing", "nobody", "nowhere", "neither", "cannot",
+    "dont", "doesnt", "didnt", "isnt", "arent", "wasnt", "werent", "wont", "cant", "couldnt",
+    "shouldnt", "wouldnt", "havent", "hasnt", "hadnt", "mustnt", "aint",
+))
+_PUNCTUATION = ".,;:'\"’‘“”`"
+
+
+def normalize_line(text: str) -> str:
+    """近似匹配用的归一化：忽略大小写，合并空白"""
+    return " ".join(text.casefold().split())
+
+
+def _word(token: str) -> str:
+    """去掉标点和撇号后的词，用于词表和否定词判断"""
+    return token.strip(_PUNCTUATION + "!?").replace("'", "").replace("’", "")
+
+
+def _ocr_form(token: str) -> str:
+    """把可能被OCR认混的字符统一成同一个，再去掉OCR容易漏掉的标点"""
+    for wrong, right in OCR_CONFUSIONS:
+        token = token.replace(wrong, right)
+    return token.translate(_DROP_PUNCTUATION)
+
+
+_DROP_PUNCTUATION = str.maketrans("", "", ".,'\"")
+
+
+def _grams(text: str, n: int) -> set[str]:
+    """带首尾填充的字符 n-gram 集合，短文本也至少有一个gram"""
+    padded = " " * (n - 1) + text + " " * (n - 1)
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class TranslationMemory:
+    """
+    翻译记忆：对翻译过的原文建立字符 n-gram（默认4-gram，比3-gram的倒排表短得多）倒排索引，OCR识别错几个字符的文本
+    （"Thc door is locked." / "The door is locked."）直接复用已有译文。
+
+    查询过程：
+    1. 归一化后精确命中 O(1)
+    2. 只扫描查询中最稀有的 probe_grams 个gram的倒排表（常见gram如 "the" 的表很长，跳过），
+       统计每个条目命中的gram数；OCR错一个字符最多破坏 n 个gram，差几个字符的原文仍会命中大部分
+    3. 取命中数最多的 max_candidates 个，经长度过滤（ratio 的上限由长度差决定）后
+       用带 score_cutoff 的编辑距离确认，返回最相似的
+    4. 逐词核对：词数必须相同，不同的词只能是OCR字形混淆（"Thc"/"The"、"rnouse"/"mouse"），
+       且不能是词表中已有的另一个词（"mouse"/"house"），也不能多出或少了否定（"do"/"don't"）
+    数字不同的文本（"5 gold" / "6 gold"）不会互相匹配。近似命中只在内存中复用，不写回精确缓存。
+    """
+
+    def __init__(
+        self,
+        similarity: float = 0.9,
+        min_length: int = 12,
+        max_entries: int = 100000,
+        max_candidates: int = 32,
+        probe_grams: int = 8,
+        ngram: int = 4,
+    ):
+        """
+        similarity: Levenshtein.ratio 阈值
+        min_length: 短于该长度的文本只做精确匹配（短文本差一个字符往往就是另一句话）
+        max_entries: 条目上限，超出后丢弃最早加入的一半并重建索引
+        max_candidates: 每次查询最多确认的候选数
+        probe_grams: 每次查询扫描的倒排表个数（取最稀有的）
+        ngram: gram长度
+        """
+        self.similarity = similarity
+        self.min_length = min_length
+        self.max_entries = max_entries
+        self.max_candidates = max_candidates
+        self.probe_grams = probe_grams
+        self.ngram = ngram
+
+        self._lock = threading.Lock()
+        # id -> (归一化原文, 译文)
+        self._sources: list[str] = []
+        self._translations: list[str] = []
+        self._by_source: dict[str, int] = {}
+        # gram -> 包含它的条目id
+        self._postings: dict[str, list[int]] = {}
+        # 已收录原文中出现过的词，用于区分识别错误和另一个真实的词
+        self._vocabulary: set[str] = set()
+
+        self.lookups = 0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.lookup_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def add(self, source: str, translation: str) -> None:
+        if not translation:
+            return
+        norm = normalize_line(source)
+        if not norm:
+            return
+        with self._lock:
+            entry_id = self._by_source.get(norm)
+            if entry_id is not None:
+                self._translations[entry_id] = translation
+                return
+            self._append(norm, translation)
+            if len(self._sources) > self.max_entries:
+                self._shrink()
+
+    def extend(self, pairs: Iterable[tuple[str, str]]) -> None:
+        """批量加入 (原文, 译文)，例如从翻译缓存预热"""
+        for source, translation in pairs:
+            self.add(source, translation)
+
+    def lookup(self, text: str) -> Optional[tuple[str, str, float]]:
+        """返回最相似的 (原文, 译文, 相似度)，没有达到阈值的返回 None"""
+        start = time.perf_counter()
+        norm = normalize_line(text)
+        with self._lock:
+            self.lookups += 1
+            try:
+                entry_id = self._by_source.get(norm)
+                if entry_id is not None:
+                    self.exact_hits += 1
+                    return self._sources[entry_id], self._translations[entry_id], 1.0
+                if len(norm) < self.min_length:
+                    return None
+                match = self._fuzzy_lookup(norm)
+                if match is not None:
+                    self.fuzzy_hits += 1
+                return match
+            finally:
+                self.lookup_seconds += time.perf_counter() - start
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._sources),
+                "memory_lookups": self.lookups,
+                "memory_exact_hits": self.exact_hits,
+                "memory_fuzzy_hits": self.fuzzy_hits,
+                "memory_lookup_mean_ms": self.lookup_seconds / self.lookups * 1000 if self.lookups else 0.0,
+            }
+
+    # ---------- internal ----------
+
+    def _append(self, norm: str, translation: str) -> None:
+        entry_id = len(self._sources)
+        self._sources.append(norm)
+        self._translations.append(translation)
+        self._by_source[norm] = entry_id
+        for gram in _grams(norm, self.ngram):
+            self._postings.setdefault(gram, []).append(entry_id)
+        self._vocabulary.update(map(_word, norm.split()))
+
+    def _shrink(self) -> None:
+        """丢弃最早加入的一半并重建索引（均摊到每次加入是 O(1)）"""
+        keep = len(self._sources) // 2
+        entries = list(zip(self._sources[-keep:], self._translations[-keep:]))
+        self._sources, self._translations = [], []
+        self._by_source, self._postings, self._vocabulary = {}, {}, set()
+        for norm, translation in entries:
+            self._append(norm, translation)
+        logger.debug("Translation memory shrunk to %d entries", len(self._sources))
+
+    def _max_distance(self, length: int) -> int:
+        """ratio ≥ similarity 时 indel 距离的上限（对方长度取允许的最大值）"""
+        max_other = length * (2 - self.similarity) / self.similarity
+        return int((1 - self.similarity) * (length + max_other))
+
+    def _fuzzy_lookup(self, norm: str) -> Optional[tuple[str, str, float]]:
+        # 最稀有的几个gram（OCR错字产生的新gram不在索引中，自然被跳过）
+        postings = sorted(
+            (ids for ids in map(self._postings.get, _grams(norm, self.ngram)) if ids),
+            key=len,
+        )[:self.probe_grams]
+        counts: Counter[int] = Counter()
+        for ids in postings:
+            counts.update(ids)
+        if not counts:
+            return None
+
+        # 长度过滤：ratio ≥ similarity 要求长度差不超过 indel 距离的上限
+        max_distance = self._max_distance(len(norm))
+        lo = len(norm) - max_distance
+        hi = len(norm) + max_distance
+        digits = _DIGITS.findall(norm)
+        best: Optional[tuple[str, str, float]] = None
+        cutoff = self.similarity
+        for entry_id, _ in counts.most_common(self.max_candidates):
+            source = self._sources[entry_id]
+            if not lo <= len(source) <= hi:
+                continue
+            # cutoff 略低于阈值：Levenshtein 把 score_cutoff 换算成整数距离时有浮点误差
+            score = Levenshtein.ratio(norm, source, score_cutoff=max(0.0, cutoff - 1e-6))
+            if score >= cutoff and _DIGITS.findall(source) == digits and self._ocr_variant(norm, source):
+                best = (source, self._translations[entry_id], score)
+                if score == 1.0:
+                    break
+                cutoff = score
+        return best
+
+    def _ocr_variant(self, norm: str, source: str) -> bool:
+        """norm 是否只是 source 被OCR识别错了几个字符（而不是另一句话）"""
+        tokens = norm.split()
+        source_tokens = source.split()
+        if len(tokens) != len(source_tokens):
+            return False
+        for token, source_token in zip(tokens, source_tokens):
+            if token == source_token:
+                continue
+            word, source_word = _word(token), _word(source_token)
+            if word == source_word:
+                continue
+            if (word in _NEGATIONS) != (source_word in _NEGATIONS):
+                return False
+            if word in self._vocabulary:
+                return False
+            if _ocr_form(token) != _ocr_form(source_token):
+                return False
+        return True
+
+
+if __name__ == "__main__":
+    memory = TranslationMemory()
+    memory.add("The door is locked.", "门锁着。")
+    memory.add("You found 5 gold coins.", "你找到了5枚金币。")
+    memory.add("I don't want to go there.", "我不想去那里。")
+    memory.add("A house stands by the river.", "河边有一座房子。")
+    for text in [
+        "Thc door is locked.", "the door is  locked.", "The door is open.", "You found 6 gold coins.",
+        "I dont want to go there.", "I do want to go there.", "A mouse stands by the river.",
+    ]:
+        print(repr(text), memory.lookup(text))
+    print(memory.stats())
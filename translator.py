@@ -1,65 +1,1054 @@
 from dotenv import load_dotenv
 from openai import OpenAI
+import httpx
+import json
 import os
+import logging
+import re
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+from dialogue_context import DialogueContext, usage_tokens
+from metrics import LatencyHistogram
+from translation_cache import TranslationCache
+from translation_memory import TranslationMemory, normalize_line
 from utils import Checker
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+# 流式译文的切分点：句末（英文句号后要有空白，避免切开小数）和分句标点
+_SENTENCE_END = re.compile(r"[。！？!?…；;\n]+[”’」』）)\"']*|\.+[”’)\"']*(?=\s)")
+_CLAUSE_END = re.compile(r"[，,、：:]")
+
+
+def split_segments(deltas: Iterable[str], min_clause_chars: int = 8) -> Iterator[str]:
+    """
+    把流式返回的文本增量在句子/分句边界切开，每凑齐一段就产出，最后产出剩余部分。
+    优先在最后一个句末切；没有句末时，累计超过 min_clause_chars 个字符才在逗号等分句处切，
+    避免切得太碎让TTS断断续续。
+    """
+    buffer = ""
+    for delta in deltas:
+        buffer += delta
+        cut = _segment_cut(buffer, min_clause_chars)
+        if cut:
+            segment, buffer = buffer[:cut].strip(), buffer[cut:]
+            if segment:
+                yield segment
+    tail = buffer.strip()
+    if tail:
+        yield tail
+
+
+def _segment_cut(buffer: str, min_clause_chars: int) -> int:
+    """
+    返回切分位置，没有合适的切分点时返回 0。
+    句末标点位于缓冲区末尾时先不切：后面可能还有引号、省略号的后半部分，等下一个增量（流结束时整段产出）
+    """
+    cut = 0
+    for match in _SENTENCE_END.finditer(buffer):
+        if match.end() < len(buffer):
+            cut = match.end()
+    if cut:
+        return cut
+    for match in _CLAUSE_END.finditer(buffer, min_clause_chars - 1):
+        cut = match.end()
+    return cut
 
 
 class Provider(ABC):
 
+    name = "base"
     translator_prompt = "模拟卓越的翻译专家，把内容翻译成中文。只回答翻译结果。如果原文有文化隐喻，用中文的文化隐喻来表达。"
+    # 影响译文的设置，作为翻译缓存键的一部分
+    model: str = ""
+    temperature: Optional[float] = None
+    # 译文是否写入翻译缓存和翻译记忆（离线词典的结果随时可以重新得到，不必占用缓存）
+    cacheable = True
+    # 对话上下文，由 Translator 设置；不使用上下文的接口忽略它
+    context: Optional[DialogueContext] = None
 
-    def __init__(self):
-        pass
+    def __init__(self, label: Optional[str] = None):
+        """label: 统计和日志中显示的名字，同一类接口配置了多个时用来区分，默认为 name"""
+        self.label = label or self.name
 
     @abstractmethod
     def translate(self, text: str) -> str:
         pass
 
+    def translate_stream(self, text: str) -> Iterator[str]:
+        """流式翻译，按到达顺序产出译文增量；不支持流式的 Provider 一次产出整段译文"""
+        yield self.translate(text)
+
+    def use_context(self, context: Optional[DialogueContext]) -> None:
+        """请求中带上对话上下文（前文及其译文）"""
+        self.context = context
+
+    def warm_up(self) -> None:
+        """启动时预先建立连接等准备工作，默认什么都不做"""
+
+    def stats(self) -> dict:
+        """请求统计（次数、错误、延迟分布），默认没有"""
+        return {}
+
+    def provider_stats(self) -> dict[str, dict]:
+        """{label: 请求统计}，路由器返回其下每个接口的统计"""
+        stats = self.stats()
+        return {self.label: stats} if stats else {}
+
+    def result_cacheable(self) -> bool:
+        """当前线程刚得到的译文是否写入缓存（路由器取决于实际完成翻译的接口）"""
+        return self.cacheable
+
+    def result_provider(self) -> "Provider":
+        """当前线程刚得到的译文实际来自哪个接口，译文按它的提示词、模型和温度写入缓存"""
+        return self
+
+    def cache_settings(self) -> list[tuple[str, str, Optional[float]]]:
+        """可能产出译文的 (提示词, 模型, 温度)，查缓存时依次尝试；路由器返回其下每个可缓存接口的设置"""
+        return [(self.translator_prompt, self.model, self.temperature)] if self.cacheable else []
+
+    def close(self) -> None:
+        pass
+
 
-class Deepseek(Provider):
+class OpenAICompatible(Provider):
+    """OpenAI 兼容的 chat/completions 接口（OpenAI、Deepseek、各类本地模型服务器）"""
 
-    def __init__(self, env_api_key: str = 'DEEPSEEK_API_KEY', max_tokens: int = 256):
-        super().__init__()
-        self.api_key = os.environ[env_api_key]
+    name = "openai"
+
+    def __init__(
+        self,
+        env_api_key: Optional[str] = 'OPENAI_API_KEY',
+        max_tokens: int = 256,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.7,
+        base_url: str = "https://api.openai.com/v1",
+        api_key: Optional[str] = None,
+        label: Optional[str] = None,
+        timeout: float = 15.0,
+        connect_timeout: float = 3.0,
+        max_connections: int = 4,
+        keepalive_expiry: float = 300.0,
+        max_retries: int = 1,
+        hedge: bool = False,
+        hedge_delay: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        stream_usage: bool = True,
+    ):
+        """
+        base_url: OpenAI兼容接口地址，可指向本地的 mock_llm_server.py 做离线测试
+        api_key: 直接给出API密钥，None时从环境变量 env_api_key 读取
+        label: 统计中显示的名字
+        timeout: 单次请求的截止时间（秒）：非流式为拿到完整译文，流式为收到第一个token，之后每个token的间隔也不超过它
+        connect_timeout: 建立连接（DNS、TCP、TLS）的超时
+        max_connections / keepalive_expiry: 连接池大小与空闲连接的保活时间，连续的请求复用同一个连接
+        max_retries: 连接失败、429/5xx 时客户端自动重试的次数
+        hedge: 对冲请求：请求超过 hedge_delay 仍未返回时再发一个相同的请求，取先返回的结果
+        hedge_delay: 对冲等待时间，None表示取最近请求耗时（流式为首token耗时）的p95
+        hedge_min_samples: hedge_delay 为 None 时，积累到这么多样本才开始对冲
+        stream_usage: 流式请求也要求返回token用量（stream_options.include_usage），不支持该参数的服务器设为 False
+        """
+        super().__init__(label)
+        if api_key is None:
+            if env_api_key is None:
+                raise ValueError(f"{self.label}: api_key or env_api_key is required")
+            api_key = os.environ[env_api_key]
+        self.api_key = api_key
         self.maxtokens = max_tokens
+        self.model = model
+        self.temperature = temperature
+        self.base_url = base_url
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.stream_usage = stream_usage
+
+        # 显式的连接池：保持长连接，首个请求之后不再重复 DNS/TLS 握手
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+        )
         self.client = OpenAI(
             api_key=self.api_key,
-            base_url="https://api.deepseek.com")
-        
+            base_url=base_url,
+            http_client=self.http_client,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            max_retries=max_retries)
+        # 请求在线程池中发出，调用方按截止时间等待，对冲请求与原请求并行
+        self._executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix=f"{self.label}-request")
+
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.connect_seconds: Optional[float] = None
+        # 调用方看到的耗时：非流式为完整译文，流式为首token
+        self.latency = LatencyHistogram()
+        self.first_token_latency = LatencyHistogram()
+        # 单次请求（不论是否对冲）的耗时，按是否流式分开，用于计算对冲等待时间
+        self._attempt_latency = {False: LatencyHistogram(), True: LatencyHistogram()}
+        # token用量：prompt中命中服务端上下文缓存的部分不必重新计算，首token更快、计费更低
+        self.prompt_tokens = 0
+        self.cache_hit_tokens = 0
+        self.completion_tokens = 0
+        self.usage_reports = 0
+        self.last_call: Optional[dict] = None
+
+    def warm_up(self) -> None:
+        """发一个轻量请求（列出模型）提前完成 DNS、TCP、TLS 握手，连接留在连接池中供第一句翻译复用"""
+        start = time.perf_counter()
+        try:
+            self.client.models.list()
+        except Exception as e:
+            logger.warning(f"翻译接口 {self.label} 预连接失败: {e}")
+            return
+        self.connect_seconds = time.perf_counter() - start
+        logger.info(f"翻译接口 {self.label} 已预连接（{self.connect_seconds * 1000:.0f}ms）")
+
     def translate(self, text: str) -> str:
-        messages: list = [
+        start = time.perf_counter()
+        # 消息只构造一次，对冲请求与原请求的prompt完全相同
+        messages = self._messages(text)
+        response = self._request(lambda: self._attempt(messages, stream=False), stream=False)
+        self.latency.observe(time.perf_counter() - start)
+        return response
+
+    def translate_stream(self, text: str) -> Iterator[str]:
+        start = time.perf_counter()
+        messages = self._messages(text)
+        # 对冲和截止时间作用于首token，之后沿用先返回首token的那个流
+        deltas, first = self._request(
+            lambda: self._attempt(messages, stream=True), stream=True, discard=lambda result: result[0].close()
+        )
+        self.first_token_latency.observe(time.perf_counter() - start)
+        try:
+            if first:
+                yield first
+            yield from deltas
+        finally:
+            deltas.close()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "prompt_tokens": self.prompt_tokens,
+                "cache_hit_tokens": self.cache_hit_tokens,
+                "completion_tokens": self.completion_tokens,
+                "prompt_cache_hit_rate": self.cache_hit_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
+            if self.last_call is not None:
+                stats["last_call"] = dict(self.last_call)
+        if self.connect_seconds is not None:
+            stats["connect_ms"] = self.connect_seconds * 1000
+        stats["latency"] = self.latency.summary()
+        stats["first_token"] = self.first_token_latency.summary()
+        return stats
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.http_client.close()
+
+    def _attempt(self, messages: list, stream: bool) -> Any:
+        """单次请求：非流式返回译文，流式返回 (剩余增量的生成器, 首个增量)"""
+        start = time.perf_counter()
+        if stream:
+            deltas = self._deltas(messages, start)
+            result: Any = (deltas, next(deltas, ""))
+        else:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=False,
+                temperature=self.temperature,
+                max_tokens=self.maxtokens
+            )
+            content = response.choices[0].message.content
+            result = content.strip() if content else ""
+            self._record_usage(response.usage, time.perf_counter() - start)
+        self._attempt_latency[stream].observe(time.perf_counter() - start)
+        return result
+
+    def _deltas(self, messages: list, start: float) -> Iterator[str]:
+        """
+        自己解析SSE：openai 的 Stream 读到 [DONE] 就关闭响应，连接来不及读完而被丢弃，
+        每次流式翻译都要重新握手；这里一直读到响应结束，连接才能放回连接池。
+        提前停止读取时关闭响应，服务端不再继续生成。
+        token用量在最后一个（choices 为空的）chunk 中返回。
+        """
+        extra: dict = {"stream_options": {"include_usage": True}} if self.stream_usage else {}
+        first_token: Optional[float] = None
+        usage = None
+        with self.client.chat.completions.with_streaming_response.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            temperature=self.temperature,
+            max_tokens=self.maxtokens,
+            **extra,
+        ) as response:
+            for line in response.iter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    continue
+                chunk = json.loads(data)
+                if chunk.get("error"):
+                    raise RuntimeError(f"流式翻译出错: {chunk['error']}")
+                usage = chunk.get("usage") or usage
+                choices = chunk.get("choices") or []
+                content = (choices[0].get("delta") or {}).get("content") if choices else None
+                if content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    yield content
+        self._record_usage(usage, time.perf_counter() - start, first_token)
+
+    def _record_usage(self, usage: Any, seconds: float, first_token: Optional[float] = None) -> None:
+        """记录单次请求的 prompt token、缓存命中token和耗时"""
+        tokens = usage_tokens(usage)
+        if tokens is None:
+            return
+        call = dict(tokens, latency_ms=seconds * 1000)
+        if first_token is not None:
+            call["first_token_ms"] = first_token * 1000
+        with self._stats_lock:
+            self.usage_reports += 1
+            self.prompt_tokens += tokens["prompt_tokens"]
+            self.cache_hit_tokens += tokens["cache_hit_tokens"]
+            self.completion_tokens += tokens["completion_tokens"]
+            self.last_call = call
+        logger.debug(
+            "%s: prompt %d tokens (cache hit %d), completion %d tokens, %.0fms",
+            self.label, tokens["prompt_tokens"], tokens["cache_hit_tokens"], tokens["completion_tokens"],
+            seconds * 1000,
+        )
+
+    def _current_hedge_delay(self, stream: bool) -> Optional[float]:
+        """本次请求的对冲等待时间，None表示不对冲"""
+        if not self.hedge:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        latency = self._attempt_latency[stream]
+        if latency.count < self.hedge_min_samples:
+            return None
+        return latency.percentile(95)
+
+    def _request(
+        self, call: Callable[[], Any], stream: bool, discard: Optional[Callable[[Any], None]] = None
+    ) -> Any:
+        """
+        在截止时间内完成 call；开启对冲时，超过对冲等待时间再并行发一次，取先成功的结果。
+        输掉的请求在后台完成后交给 discard 释放（如关闭流）。
+        """
+        deadline = time.perf_counter() + self.timeout
+        with self._stats_lock:
+            self.requests += 1
+        futures = [self._executor.submit(call)]
+
+        hedge_delay = self._current_hedge_delay(stream)
+        if hedge_delay is not None and hedge_delay < self.timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                with self._stats_lock:
+                    self.hedged += 1
+                futures.append(self._executor.submit(call))
+
+        error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                winner = future
+                if winner is not futures[0]:
+                    with self._stats_lock:
+                        self.hedge_wins += 1
+                for other in futures:
+                    if other is not winner:
+                        self._discard(other, discard)
+                return winner.result()
+
+        for future in futures:
+            self._discard(future, discard)
+        with self._stats_lock:
+            if error is None:
+                self.timeouts += 1
+            else:
+                self.errors += 1
+        if error is not None:
+            raise error
+        raise TimeoutError(f"翻译请求超过 {self.timeout}s 未完成")
+
+    @staticmethod
+    def _discard(future: Future, discard: Optional[Callable[[Any], None]]) -> None:
+        """放弃一个请求：还没开始的直接取消，已经在进行的完成后交给 discard"""
+        if future.cancel() or discard is None:
+            return
+
+        def release(f: Future) -> None:
+            if f.exception() is None:
+                discard(f.result())
+
+        future.add_done_callback(release)
+
+    def _messages(self, text: str) -> list:
+        if self.context is not None:
+            return self.context.messages(self.translator_prompt, text)
+        return [
             {"role": "system", "content": self.translator_prompt},
             {"role": "user", "content": text},
         ]
-        response = self.client.chat.completions.create(
-            model="deepseek-chat",
-            messages=messages,
-            stream=False,
-            temperature=1.3,
-            max_tokens=self.maxtokens
+
+
+class Deepseek(OpenAICompatible):
+
+    name = "deepseek"
+
+    def __init__(
+        self,
+        env_api_key: Optional[str] = 'DEEPSEEK_API_KEY',
+        max_tokens: int = 256,
+        model: str = "deepseek-chat",
+        temperature: float = 1.3,
+        base_url: str = "https://api.deepseek.com",
+        api_key: Optional[str] = None,
+        label: Optional[str] = None,
+        **kwargs,
+    ):
+        """其余参数（超时、连接池、对冲）见 OpenAICompatible"""
+        super().__init__(env_api_key, max_tokens, model, temperature, base_url, api_key, label, **kwargs)
+
+
+class LocalProvider(OpenAICompatible):
+    """
+    本机的模型服务器（Ollama、llama.cpp server、vLLM 等都提供 OpenAI 兼容接口），不需要API密钥和外网。
+    本地模型在CPU上较慢，默认的截止时间更长。
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        env_api_key: Optional[str] = None,
+        max_tokens: int = 256,
+        model: str = "qwen2.5:7b-instruct",
+        temperature: float = 0.3,
+        base_url: str = "http://127.0.0.1:11434/v1",
+        api_key: Optional[str] = "local",
+        label: Optional[str] = None,
+        timeout: float = 30.0,
+        connect_timeout: float = 1.0,
+        **kwargs,
+    ):
+        """其余参数（连接池、对冲）见 OpenAICompatible"""
+        super().__init__(
+            env_api_key, max_tokens, model, temperature, base_url, api_key, label,
+            timeout=timeout, connect_timeout=connect_timeout, **kwargs,
         )
-        response_content = response.choices[0].message.content
-        if response_content:
-            return response_content.strip()
+
+
+# 词典查询时忽略首尾的标点
+_EDGE_PUNCTUATION = " \t.,!?;:…\"'“”‘’。，！？；："
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _dictionary_key(text: str) -> str:
+    return normalize_line(text).strip(_EDGE_PUNCTUATION)
+
+
+class DictionaryProvider(Provider):
+    """
+    离线的确定性翻译：先查整句，再把文本按句子切开逐句查，都能查到才返回；
+    partial 时再退一步，只把认识的词语（术语表）替换成译文，其余保留原文。
+    查不到时抛出 LookupError，由路由器换下一个接口。
+    词典文件为 JSON：{"原文": "译文", ...}，匹配时忽略大小写、多余空白和首尾标点。
+    """
+
+    name = "dictionary"
+    model = "dictionary"
+    cacheable = False
+
+    def __init__(
+        self,
+        path: Union[str, Path, None] = "translation_dictionary.json",
+        entries: Optional[dict[str, str]] = None,
+        partial: bool = False,
+        max_term_words: int = 3,
+        label: Optional[str] = None,
+    ):
+        """
+        path: 词典文件，不存在时只使用 entries
+        entries: 额外的 {原文: 译文}
+        partial: 整句查不到时是否只替换认识的词语
+        max_term_words: 不超过这么多个词的条目同时作为术语表，用于 partial 替换
+        """
+        super().__init__(label)
+        self.partial = partial
+        self.max_term_words = max_term_words
+        self._entries: dict[str, str] = {}
+        self._terms: Optional[re.Pattern] = None
+        self._term_translations: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None:
+            path = Path(path)
+            if path.exists():
+                with path.open("r", encoding="utf-8") as f:
+                    self.update(json.load(f))
+                logger.info(f"离线词典已加载: {path}（{len(self._entries)}条）")
+            else:
+                logger.warning(f"离线词典不存在: {path}")
+        if entries:
+            self.update(entries)
+
+    def update(self, entries: dict[str, str]) -> None:
+        """加入或覆盖词条，并重建术语表"""
+        for source, translation in entries.items():
+            key = _dictionary_key(source)
+            if key and translation:
+                self._entries[key] = translation
+        self._term_translations = {
+            key: translation for key, translation in self._entries.items()
+            if len(key.split()) <= self.max_term_words
+        }
+        if self._term_translations:
+            # 长的词语优先匹配
+            terms = sorted(self._term_translations, key=len, reverse=True)
+            self._terms = re.compile(r"\b(" + "|".join(map(re.escape, terms)) + r")\b", re.IGNORECASE)
         else:
-            return ""
+            self._terms = None
+
+    def translate(self, text: str) -> str:
+        translated = self._entries.get(_dictionary_key(text))
+        if translated is None:
+            translated = self._translate_sentences(text)
+        if translated is None and self.partial:
+            translated = self._translate_terms(text)
+        if translated is None:
+            self.misses += 1
+            raise LookupError(f"离线词典中没有: {text[:30]}")
+        self.hits += 1
+        return translated
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _translate_sentences(self, text: str) -> Optional[str]:
+        sentences = [s for s in _SENTENCE_SPLIT.split(text.strip()) if s]
+        if len(sentences) < 2:
+            return None
+        translations = [self._entries.get(_dictionary_key(sentence)) for sentence in sentences]
+        if any(t is None for t in translations):
+            return None
+        return "".join(translations)
+
+    def _translate_terms(self, text: str) -> Optional[str]:
+        if self._terms is None:
+            return None
+        translated, n = self._terms.subn(
+            lambda m: self._term_translations[_dictionary_key(m.group(0))], text
+        )
+        return translated if n else None
+
+
+ROUTING_STRATEGIES = ("priority", "latency")
+
+
+class _ProviderHealth:
+    """路由器对单个接口的滚动统计：最近 window 次请求的成败与延迟"""
+
+    def __init__(self, window: int):
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        # 非流式为完整译文耗时，流式为首个增量耗时
+        self.latency = {False: LatencyHistogram(window), True: LatencyHistogram(window)}
+        self.last_attempt = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.fallbacks = 0
+
+    def reset(self) -> None:
+        """接口恢复后清空滚动统计，不让退化期间的失败继续拖累它"""
+        self.outcomes.clear()
+        window = self.outcomes.maxlen or 1
+        self.latency = {False: LatencyHistogram(window), True: LatencyHistogram(window)}
+
+    def record(self, ok: bool, seconds: float, stream: bool) -> None:
+        self.outcomes.append(ok)
+        if ok:
+            self.latency[stream].observe(seconds)
+        else:
+            self.failures += 1
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "routed": self.requests,
+            "failures": self.failures,
+            "served_as_fallback": self.fallbacks,
+            "error_rate": self.error_rate(),
+        }
+
+
+class ProviderRouter(Provider):
+    """
+    在多个翻译接口之间路由，按滚动的延迟和错误率挑选，失败时依次换下一个。
+    strategy:
+        priority: 按配置顺序（例如最便宜的放在最前），跳过退化的接口
+        latency: 按最近的延迟（按错误率加权）从快到慢
+    退化：最近的请求中错误率超过 max_error_rate，或p95延迟超过 latency_budget。
+    退化的接口每隔 probe_interval 秒放行一个请求，试探是否恢复；全部退化时仍按顺序逐个尝试。
+    流式翻译只能在收到第一个增量之前换接口。
+    译文按实际完成翻译的接口的模型和温度写入缓存，查缓存时依次尝试各接口的设置。
+    """
+
+    name = "router"
+
+    def __init__(
+        self,
+        providers: list[Provider],
+        strategy: str = "priority",
+        window: int = 50,
+        min_samples: int = 5,
+        max_error_rate: float = 0.3,
+        latency_budget: Optional[float] = None,
+        probe_interval: float = 30.0,
+        label: Optional[str] = None,
+    ):
+        """
+        providers: 参与路由的接口，priority 策略下按此顺序
+        strategy: priority 或 latency
+        window: 计算错误率和延迟的最近请求数
+        min_samples: 样本少于这么多时不判定退化
+        max_error_rate: 错误率超过该值视为退化
+        latency_budget: p95延迟（秒）超过该值视为退化，None表示只看错误率
+        probe_interval: 退化的接口多久试探一次
+        """
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider")
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Unsupported routing strategy: {strategy}")
+        super().__init__(label)
+        self.providers = providers
+        self.strategy = strategy
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.latency_budget = latency_budget
+        self.probe_interval = probe_interval
+        self.model = providers[0].model
+        self.temperature = providers[0].temperature
+
+        self._lock = threading.Lock()
+        self._health = [_ProviderHealth(window) for _ in providers]
+        # 每个线程最近一次完成翻译的接口，决定译文是否写入缓存
+        self._local = threading.local()
+
+    def translate(self, text: str) -> str:
+        error: Optional[BaseException] = None
+        for rank, index in enumerate(self._route(stream=False)):
+            provider = self.providers[index]
+            start = time.perf_counter()
+            try:
+                translated = provider.translate(text)
+            except Exception as e:
+                self._record(index, False, time.perf_counter() - start, stream=False)
+                logger.warning(f"翻译接口 {provider.label} 失败，换下一个: {e}")
+                error = e
+                continue
+            self._record(index, True, time.perf_counter() - start, stream=False, fallback=rank > 0)
+            self._local.provider = provider
+            return translated
+        assert error is not None
+        raise error
+
+    def translate_stream(self, text: str) -> Iterator[str]:
+        error: Optional[BaseException] = None
+        for rank, index in enumerate(self._route(stream=True)):
+            provider = self.providers[index]
+            start = time.perf_counter()
+            deltas = provider.translate_stream(text)
+            try:
+                first = next(deltas, None)
+            except Exception as e:
+                deltas.close()
+                self._record(index, False, time.perf_counter() - start, stream=True)
+                logger.warning(f"翻译接口 {provider.label} 失败，换下一个: {e}")
+                error = e
+                continue
+            first_seconds = time.perf_counter() - start
+            self._local.provider = provider
+            # 已经开始产出译文，之后出错不能再换接口；调用方提前停止读取不算接口的错误
+            ok = False
+            try:
+                if first is not None:
+                    yield first
+                yield from deltas
+                ok = True
+            except GeneratorExit:
+                ok = True
+                raise
+            finally:
+                deltas.close()
+                self._record(index, ok, first_seconds, stream=True, fallback=rank > 0)
+            return
+        assert error is not None
+        raise error
+
+    def use_context(self, context: Optional[DialogueContext]) -> None:
+        """所有接口共用同一份上下文，换接口后前文不丢失"""
+        super().use_context(context)
+        for provider in self.providers:
+            provider.use_context(context)
+
+    def warm_up(self) -> None:
+        """并行预连接所有接口"""
+        threads = [threading.Thread(target=p.warm_up, daemon=True) for p in self.providers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "routed": sum(h.requests for h in self._health),
+                "fallbacks": sum(h.fallbacks for h in self._health),
+            }
+
+    def provider_stats(self) -> dict[str, dict]:
+        stats = {}
+        with self._lock:
+            health = [(h.summary(), self._degraded(h)) for h in self._health]
+        for provider, (summary, degraded) in zip(self.providers, health):
+            entry = provider.stats()
+            entry.update(summary)
+            entry["degraded"] = degraded
+            stats[provider.label] = entry
+        return stats
+
+    def result_cacheable(self) -> bool:
+        provider = getattr(self._local, "provider", None)
+        return provider.result_cacheable() if provider is not None else True
+
+    def result_provider(self) -> Provider:
+        provider = getattr(self._local, "provider", None)
+        return provider.result_provider() if provider is not None else self
+
+    def cache_settings(self) -> list[tuple[str, str, Optional[float]]]:
+        settings = []
+        for provider in self.providers:
+            for setting in provider.cache_settings():
+                if setting not in settings:
+                    settings.append(setting)
+        return settings
+
+    def close(self) -> None:
+        for provider in self.providers:
+            provider.close()
+
+    def _score(self, health: _ProviderHealth, stream: bool) -> float:
+        """期望耗时：最近延迟的中位数按错误率放大；没有样本的接口得0分，优先尝试"""
+        latency = health.latency[stream]
+        if latency.count == 0:
+            return 0.0
+        return latency.percentile(50) / max(0.05, 1 - health.error_rate())
+
+    def _degraded(self, health: _ProviderHealth) -> bool:
+        if len(health.outcomes) < self.min_samples:
+            return False
+        if health.error_rate() > self.max_error_rate:
+            return True
+        if self.latency_budget is None:
+            return False
+        latency = max(health.latency.values(), key=lambda h: h.count)
+        return latency.count >= self.min_samples and latency.percentile(95) > self.latency_budget
+
+    def _route(self, stream: bool) -> list[int]:
+        """本次请求尝试接口的顺序：健康的（和到了试探时间的）在前，退化的最后"""
+        now = time.monotonic()
+        with self._lock:
+            healthy, degraded = [], []
+            for index, health in enumerate(self._health):
+                if not self._degraded(health) or now - health.last_attempt >= self.probe_interval:
+                    healthy.append(index)
+                else:
+                    degraded.append(index)
+            if self.strategy == "latency":
+                healthy.sort(key=lambda i: self._score(self._health[i], stream))
+            degraded.sort(key=lambda i: self._score(self._health[i], stream))
+            return healthy + degraded
+
+    def _record(self, index: int, ok: bool, seconds: float, stream: bool, fallback: bool = False) -> None:
+        with self._lock:
+            health = self._health[index]
+            recovered = (
+                ok and self._degraded(health)
+                and (self.latency_budget is None or seconds <= self.latency_budget)
+            )
+            if recovered:
+                logger.info(f"翻译接口 {self.providers[index].label} 已恢复")
+                health.reset()
+            health.requests += 1
+            health.last_attempt = time.monotonic()
+            health.record(ok, seconds, stream)
+            if fallback:
+                health.fallbacks += 1
+
+
+PROVIDERS: dict[str, type[Provider]] = {
+    OpenAICompatible.name: OpenAICompatible,
+    Deepseek.name: Deepseek,
+    LocalProvider.name: LocalProvider,
+    DictionaryProvider.name: DictionaryProvider,
+    ProviderRouter.name: ProviderRouter,
+}
+
+
+def create_provider(config: Union[str, dict, list]) -> Provider:
+    """
+    按配置创建翻译接口：
+    - "deepseek"：按名称创建，使用默认参数
+    - {"provider": "local", "model": "qwen2.5:7b-instruct"}：其余键透传给构造函数
+    - [配置, 配置, ...]：依次创建，由 ProviderRouter 按顺序路由；
+      需要调整路由参数时写成 {"provider": "router", "providers": [...], "strategy": "latency"}
+    """
+    if isinstance(config, (list, tuple)):
+        return ProviderRouter([create_provider(c) for c in config])
+    if isinstance(config, str):
+        name, kwargs = config, {}
+    else:
+        kwargs = dict(config)
+        name = kwargs.pop("provider")
+    try:
+        provider_cls = PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f"Unsupported translation provider: {name}") from None
+    if provider_cls is ProviderRouter:
+        kwargs["providers"] = [create_provider(c) for c in kwargs.get("providers", ())]
+    return provider_cls(**kwargs)
 
 
 class Translator:
     
-    def __init__(self, ai_engine: str = 'deepseek'):
-        if ai_engine == 'deepseek':
-            self.ai_engine: Provider = Deepseek()
+    def __init__(
+        self,
+        ai_engine: str | dict | list | Provider = 'deepseek',
+        checker: Optional[Checker] = None,
+        cache: Optional[TranslationCache] = None,
+        memory: Optional[TranslationMemory] = None,
+        context: Optional[DialogueContext] = None,
+    ):
+        """
+        ai_engine: 翻译接口，或传给 create_provider 的配置（名称、参数字典、多个接口的列表）
+        checker: 文本检查器，None时使用默认的 Checker
+        cache: 翻译缓存，重复出现的文本直接使用缓存的译文，None表示不缓存
+        memory: 翻译记忆，与翻译过的原文只差几个字符（OCR识别错误）时复用其译文；
+            同时提供 cache 时用缓存中的译文预热
+        context: 对话上下文，每句译完（包括命中缓存的）都记入，请求时带上前文，None表示每句单独翻译
+        """
+        if isinstance(ai_engine, Provider):
+            self.ai_engine: Provider = ai_engine
         else:
-            raise ValueError("Unsupported AI engine")
-        self.checker: Checker = Checker()
+            self.ai_engine = create_provider(ai_engine)
+        self.checker: Checker = checker if checker is not None else Checker()
+        self.cache = cache
+        self.memory = memory
+        self.context = context
+        if context is not None:
+            self.ai_engine.use_context(context)
+
+        # 最新一段文本的编号（Checker.generation），更旧的翻译请求作废
+        self._generation = 0
+        self._generation_lock = threading.Lock()
+        self.calls_saved = 0
+        self.streams_aborted = 0
+        self.results_discarded = 0
+        if cache is not None and memory is not None:
+            # 缓存很大时建索引需要几秒，放到后台，期间翻译记忆只是命中少一些
+            threading.Thread(target=self._warm_memory, daemon=True).start()
+
+    def _warm_memory(self) -> None:
+        """用翻译缓存中同一组设置下最近使用的译文预热翻译记忆"""
+        total = 0
+        # 靠前的接口最后加入，同一原文以它的译文为准
+        for settings in reversed(self.ai_engine.cache_settings()):
+            pairs = self.cache.recent(*settings, limit=self.memory.max_entries)
+            # recent 最新的在前，按时间顺序加入，超出上限时淘汰的是最旧的
+            self.memory.extend(reversed(pairs))
+            total += len(pairs)
+        logger.info("Translation memory warmed with %d entries", total)
+
+    def check(self, text: str) -> bool:
+        """文本是否需要翻译（Checker检查）"""
+        return self.checker.check(text)
+
+    def check_segment(self, text: str) -> Optional[str]:
+        """返回需要翻译的文本片段（prefix 模式下可能只是其中的完整句子），不需要翻译时返回 None"""
+        return self.checker.check_segment(text)
+
+    def cancel_before(self, generation: int) -> None:
+        """作废编号小于 generation 的翻译请求：尚未调用接口的不再调用，流式翻译中途停止"""
+        with self._generation_lock:
+            self._generation = max(self._generation, generation)
+
+    def is_stale(self, generation: Optional[int]) -> bool:
+        """编号为 generation 的请求是否已被更新的文本取代（None 表示不参与取消）"""
+        return generation is not None and generation < self._generation
+
+    def translate_stable(self, text: str, generation: Optional[int] = None) -> str:
+        """
+        翻译已经通过Checker检查的文本，依次查翻译缓存、翻译记忆，都没有命中才调用翻译接口
+        generation: 文本编号，请求已作废时不调用接口、丢弃结果并返回空字符串
+        """
+        translated = self._lookup(text)
+        if translated is not None:
+            self._remember(text, translated)
+            return translated
+        if self.is_stale(generation):
+            self._count("calls_saved")
+            return ""
+        translated = self.ai_engine.translate(text)
+        # 已经付费的译文照样缓存，只是不再交给TTS
+        self._store(text, translated)
+        self._remember(text, translated)
+        if self.is_stale(generation):
+            self._count("results_discarded")
+            return ""
+        return translated
+
+    def translate_stream(self, text: str, generation: Optional[int] = None) -> Iterator[str]:
+        """
+        流式翻译已经通过Checker检查的文本，译文在句子/分句边界切开逐段产出，
+        第一段译完即可交给TTS；命中翻译缓存或翻译记忆时一次产出整段译文
+        generation: 文本编号，请求作废后不再调用接口，或在下一个增量到达时停止读取（不缓存半截译文）
+        """
+        translated = self._lookup(text)
+        if translated is not None:
+            self._remember(text, translated)
+            if translated:
+                yield translated
+            return
+        if self.is_stale(generation):
+            self._count("calls_saved")
+            return
+
+        deltas: list[str] = []
+        aborted = False
+
+        def record() -> Iterator[str]:
+            nonlocal aborted
+            stream = self.ai_engine.translate_stream(text)
+            try:
+                for delta in stream:
+                    if self.is_stale(generation):
+                        aborted = True
+                        return
+                    deltas.append(delta)
+                    yield delta
+            finally:
+                stream.close()
+
+        for segment in split_segments(record()):
+            if self.is_stale(generation):
+                aborted = True
+                break
+            yield segment
+        if aborted:
+            self._count("streams_aborted")
+            return
+        translated = "".join(deltas).strip()
+        self._store(text, translated)
+        self._remember(text, translated)
+
+    def _lookup(self, text: str) -> Optional[str]:
+        if self.cache is not None:
+            # 路由器换过接口时，译文缓存在实际完成翻译的接口的设置下
+            for settings in self.ai_engine.cache_settings():
+                cached = self.cache.get(text, *settings)
+                if cached is not None:
+                    return cached
+
+        if self.memory is not None:
+            # 近似命中不写回精确缓存，误命中不会被固化下来
+            match = self.memory.lookup(text)
+            if match is not None:
+                return match[1]
+        return None
+
+    def _store(self, text: str, translated: str) -> None:
+        engine = self.ai_engine
+        if not engine.result_cacheable():
+            return
+        if self.cache is not None:
+            provider = engine.result_provider()
+            self.cache.put(text, translated, provider.translator_prompt, provider.model, provider.temperature)
+        if self.memory is not None:
+            self.memory.add(text, translated)
+
+    def _remember(self, text: str, translated: str) -> None:
+        """记入对话上下文，之后的请求带上这句前文"""
+        if self.context is not None:
+            self.context.append(text, translated)
+
+    def _count(self, name: str) -> None:
+        with self._generation_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self) -> dict:
+        """作废请求统计，翻译缓存、翻译记忆和对话上下文统计，以及翻译接口的请求统计（providers）"""
+        stats = {
+            "translation_calls_saved": self.calls_saved,
+            "translation_streams_aborted": self.streams_aborted,
+            "translation_results_discarded": self.results_discarded,
+        }
+        if self.cache is not None:
+            stats.update(self.cache.stats())
+        if self.memory is not None:
+            stats.update(self.memory.stats())
+        if self.context is not None:
+            stats.update(self.context.stats())
+        provider_stats = self.ai_engine.provider_stats()
+        if provider_stats:
+            stats["providers"] = provider_stats
+        return stats
+
+    def warm_up(self) -> None:
+        """预先连接翻译接口，第一句翻译不必等待握手"""
+        self.ai_engine.warm_up()
 
     def translate(self, text: str) -> str:
-        if self.checker.check(text):
-            return self.ai_engine.translate(text)
+        segment = self.check_segment(text)
+        if segment is not None:
+            generation = self.checker.generation
+            self.cancel_before(generation)
+            return self.translate_stable(segment, generation)
         else:
             return ""
@@ -1,48 +1,440 @@
 import Levenshtein
 from collections import deque
+import re
 import threading
+from typing import Optional
+
+import cv2
+import numpy as np
+
+
+# Checker 判定模式
+STABLE = "stable"   # 文本与上一帧相同、与上上帧不同时放行
+PREFIX = "prefix"   # 识别逐字显示（打字机效果）的文本，停止变长或出现完整句子时即放行
+CHECKER_MODES = (STABLE, PREFIX)
+
+# 句末标点：后面已经出现了下一句的文字，说明这一句已经显示完整
+# 英文标点后要求有空白，避免把 "3.5" 之类切开
+_SENTENCE_END = re.compile(
+    r"[.!?…]+[\"'”’)\]]*(?=\s+\S)"
+    r"|[。！？]+[”’」』）]*(?=\s*\S)"
+)
+
+
+def is_similar(a: str, b: str, threshold: float) -> bool:
+    """
+    等价于 Levenshtein.ratio(a, b) >= threshold，但只回答是否达到阈值：
+    - 文本相同直接返回
+    - ratio = 1 - indel距离 / (len(a) + len(b))，长度差是距离的下界，只看长度就不可能达到阈值时不计算编辑距离
+    - 否则带 score_cutoff 计算，确定达不到阈值时提前结束
+    """
+    if a == b:
+        return threshold <= 1.0
+    total = len(a) + len(b)
+    if 1 - abs(len(a) - len(b)) / total < threshold:
+        return False
+    # cutoff 略低于阈值，避免阈值处的浮点误差改变结果；达到 cutoff 时返回的是精确的 ratio
+    return Levenshtein.ratio(a, b, score_cutoff=max(0.0, threshold - 1e-6)) >= threshold
+
+
+def merge_segments(pending: tuple[str, float, int], item: tuple[str, float, int]) -> Optional[tuple[str, float, int]]:
+    """
+    合并 Checker 放行的两个片段 (文本, 出现时间, generation)，用作翻译阶段输入队列的 merge：
+    同一段文本逐句放行的片段在下游忙时拼接起来一起翻译，不能丢；generation 不同时返回 None，旧文本照常丢弃
+    """
+    text, origin, generation = pending
+    new_text, _, new_generation = item
+    if new_generation != generation:
+        return None
+    return f"{text} {new_text}", origin, generation
 
 
 class Checker:
     """
     线程安全
     检查OCR传过来的文本是否需要翻译和体现。
-    目前方案：1、过长文本不通过检查；2、当前文本与上上次不相似，与上次相似，则通过检查。无论结果如何都存储新文本（不存储空文本）作为下一次判断的依据。
+    stable 模式：1、过长文本不通过检查；2、当前文本与上上次不相似，与上次相似，则通过检查。无论结果如何都存储新文本（不存储空文本）作为下一次判断的依据。
+    prefix 模式：把"不断变长、前缀不变"的一串文本视为同一段正在逐字显示的对话，
+        文本停止变长（与上一帧相似）时放行尚未放行的部分；split_sentences 时，
+        显示过程中每出现一个完整句子就先放行这一句，不必等整段显示完。
+    两种模式都记录判定延迟：放行的文本完整出现后，又过了几帧才被放行。
+    generation 是当前这段文本的编号，换成另一段文本时加一；同一段文本逐句放行的片段编号相同，
+    下游据此取消仍在翻译的旧文本。prefix 模式下新文本要连续出现两帧才算换了一段，
+    只闪现一帧的识别错误、比当前文本短的残缺帧不会打断正在翻译的文本，也不会导致重复放行。
     """
-    def __init__(self, queue_size: int = 3, similarity: float = 0.95) -> None:
+    def __init__(
+        self,
+        queue_size: int = 3,
+        similarity: float = 0.95,
+        mode: str = STABLE,
+        split_sentences: bool = True,
+        min_segment_length: int = 8,
+    ) -> None:
+        """
+        Args:
+            queue_size: stable 模式保存的历史文本数
+            similarity: 判断两帧文本"相同"的相似度阈值
+            mode: 判定模式，stable 或 prefix
+            split_sentences: prefix 模式下是否在句子边界提前放行
+            min_segment_length: 按句子提前放行时片段的最小长度，过短的（如 "Mr."）并入下一句
+        """
+        if mode not in CHECKER_MODES:
+            raise ValueError(f"Unsupported checker mode: {mode}")
         # 关键：用空文本填充整个队列
         self.queue = deque([''] * queue_size, maxlen=queue_size)
         self.similarity = similarity
+        self.mode = mode
+        self.split_sentences = split_sentences
+        self.min_segment_length = min_segment_length
         self.lock = threading.Lock()
 
+        # 帧序号（只计非空且未超长的文本）
+        self._frame = 0
+        # stable 模式：文本最近一次发生变化的帧
+        self._changed_frame = 0
+        # prefix 模式：当前这段文本、已放行的字符数、每次变长的 (帧序号, 文本长度)
+        self._current = ''
+        self._emitted = 0
+        self._growth: list[tuple[int, int]] = []
+        # prefix 模式：与当前文本不同、尚未确认的新文本 (帧序号, 文本)
+        self._pending: Optional[tuple[int, str]] = None
+        # 当前这段文本的编号
+        self.generation = 0
+
+        self.decisions = 0
+        self.decision_frames_total = 0
+        self.last_decision_frames = 0
+        self.max_decision_frames = 0
+
     def check(self, new_text: str, maxlen: int = 200) -> bool:
+        """文本（或其中一部分）是否需要翻译"""
+        return self.check_segment(new_text, maxlen) is not None
+
+    def check_segment(self, new_text: str, maxlen: int = 200) -> Optional[str]:
+        """
+        返回这一帧需要翻译的文本，不需要翻译时返回 None。
+        stable 模式返回整段文本；prefix 模式返回尚未放行的部分（完整句子或剩余的文本）。
+        """
+        with self.lock:
+            if len(new_text) > maxlen or new_text == '':
+                return None
+            self._frame += 1
+            if self.mode == PREFIX:
+                return self._check_prefix(new_text)
+            return self._check_stable(new_text)
+
+    def stats(self) -> dict:
+        """判定统计：放行次数、判定延迟（帧）"""
+        with self.lock:
+            return {
+                "checker_mode": self.mode,
+                "checker_decisions": self.decisions,
+                "decision_frames_mean": self.decision_frames_total / self.decisions if self.decisions else 0.0,
+                "decision_frames_max": self.max_decision_frames,
+                "decision_frames_last": self.last_decision_frames,
+            }
+
+    def _check_stable(self, new_text: str) -> Optional[str]:
         """
         检测文本是否已经稳定地变化到新内容。
         需要同时满足：
         1. 当前文本和上次文本高度相似（稳定）
         2. 当前文本和上上次文本高度不相似（确实变化了）
         """
-        with self.lock:
-            if len(new_text) > maxlen or new_text == '':
-                return False
-            
-            # 存储新文本
-            self.queue.append(new_text)
-            
-            # 获取最近三次的文本
-            current = self.queue[-1]  # 当前文本
-            last = self.queue[-2]     # 上一次文本
-            last_last = self.queue[-3] # 上上次文本
-            
-            # 条件1：当前和上次高度相似（文本稳定）
-            similarity_current_last = Levenshtein.ratio(current, last)
-            is_stable = similarity_current_last >= self.similarity
-            
-            # 条件2：当前和上上次高度不相似（确实发生了变化）
-            similarity_current_last_last = Levenshtein.ratio(current, last_last)
-            has_changed = similarity_current_last_last < self.similarity
-            # 同时满足两个条件才通过检查
-            return is_stable and has_changed
+        # 存储新文本
+        self.queue.append(new_text)
+
+        # 获取最近三次的文本
+        current = self.queue[-1]  # 当前文本
+        last = self.queue[-2]     # 上一次文本
+        last_last = self.queue[-3] # 上上次文本
+
+        # 条件1：当前和上次高度相似（文本稳定）
+        is_stable = is_similar(current, last, self.similarity)
+        if not is_stable:
+            self._changed_frame = self._frame
+            return None
+
+        # 条件2：当前和上上次高度不相似（确实发生了变化），不稳定时不必再算
+        has_changed = not is_similar(current, last_last, self.similarity)
+        # 同时满足两个条件才通过检查
+        if has_changed:
+            self.generation += 1
+            self._record_decision(self._changed_frame)
+            return new_text
+        return None
+
+    def _check_prefix(self, new_text: str) -> Optional[str]:
+        last = self._current
+
+        if self._extends(last, new_text):
+            # 还在逐字显示
+            self._pending = None
+            self._current = new_text
+            self._growth.append((self._frame, len(new_text)))
+            return self._emit_sentences()
+
+        if last and is_similar(new_text, last, self.similarity):
+            # 停止变长：放行剩余部分
+            self._pending = None
+            self._current = new_text
+            return self._emit(len(new_text))
+
+        if last and len(new_text) < len(last) and is_similar(new_text, last[:len(new_text)], self.similarity):
+            # 比当前文本短、与其开头相似：末尾漏识别的一帧，保留已放行的进度
+            self._pending = None
+            return None
+
+        pending = self._pending
+        if pending is None:
+            # 与当前文本不同，等下一帧确认
+            self._pending = (self._frame, new_text)
+            return None
+        pending_frame, pending_text = pending
+        extends = self._extends(pending_text, new_text)
+        if not extends and not is_similar(new_text, pending_text, self.similarity):
+            self._pending = (self._frame, new_text)
+            return None
+
+        # 新文本持续了两帧：换成了另一段文本
+        self.generation += 1
+        self._pending = None
+        self._current = new_text
+        self._emitted = 0
+        self._growth = [(pending_frame, len(pending_text))]
+        if extends:
+            self._growth.append((self._frame, len(new_text)))
+            return self._emit_sentences()
+        return self._emit(len(new_text))
+
+    def _extends(self, last: str, new_text: str) -> bool:
+        """new_text 是否是 last 继续显示得到的（前缀与 last 相似且更长）"""
+        if not last or len(new_text) <= len(last):
+            return False
+        return is_similar(new_text[:len(last)], last, self.similarity)
+
+    def _emit_sentences(self) -> Optional[str]:
+        """显示过程中，放行已经完整出现的句子"""
+        if not self.split_sentences:
+            return None
+        end = None
+        for match in _SENTENCE_END.finditer(self._current, self._emitted):
+            if len(self._current[self._emitted:match.end()].strip()) >= self.min_segment_length:
+                end = match.end()
+        if end is None:
+            return None
+        return self._emit(end)
+
+    def _emit(self, end: int) -> Optional[str]:
+        segment = self._current[self._emitted:end].strip()
+        if end <= self._emitted or not segment:
+            return None
+        if not any(c.isalnum() for c in segment):
+            # 只剩标点（如句子放行后才显示出来的句号、引号），并入已放行的部分
+            self._emitted = end
+            return None
+        # 片段的最后一个字符最早出现的帧
+        first_seen = next((frame for frame, length in self._growth if length >= end), self._frame)
+        self._emitted = end
+        self._record_decision(first_seen)
+        return segment
+
+    def _record_decision(self, first_seen_frame: int) -> None:
+        frames = self._frame - first_seen_frame
+        self.decisions += 1
+        self.decision_frames_total += frames
+        self.last_decision_frames = frames
+        self.max_decision_frames = max(self.max_decision_frames, frames)
+
+
+class FrameChangeDetector:
+    """
+    廉价的画面变化检测器，放在截图之后、OCR之前。
+    把截图缩小成低分辨率灰度图，与上一次放行（送去OCR）的帧逐像素比较，变化像素占比超过阈值才认为画面变了。
+    跳过的帧不更新参考帧，逐字显示几个字、缓慢淡入这类每帧都低于阈值的变化会累积起来，最终触发OCR。
+    画面变化后还会继续放行 settle_frames 帧，保证 Checker 能看到"稳定"的文本再判断。
+    """
+    def __init__(
+        self,
+        threshold: float = 0.002,
+        pixel_delta: int = 12,
+        downsample_width: int = 160,
+        settle_frames: int = 2,
+    ) -> None:
+        """
+        Args:
+            threshold: 变化像素占比阈值（0~1），超过即认为画面发生变化
+            pixel_delta: 单个像素灰度差超过该值才计为变化，用于过滤压缩噪声
+            downsample_width: 比较前缩小到的宽度
+            settle_frames: 画面变化后继续放行的帧数
+        """
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.downsample_width = downsample_width
+        self.settle_frames = settle_frames
+
+        # 上一次放行的帧的缩略图
+        self._reference: np.ndarray | None = None
+        self._frames_since_change = 0
+        self.last_changed = False
+
+        self.frames_processed = 0
+        self.frames_skipped = 0
+
+    def should_process(self, image: np.ndarray) -> bool:
+        """判断当前帧是否需要OCR，同时更新计数；放行的帧成为新的参考帧"""
+        small = self._downsample(image)
+        self._update(small)
+        process = self._frames_since_change <= self.settle_frames
+        if process:
+            self._reference = small
+            self.frames_processed += 1
+        else:
+            self.frames_skipped += 1
+        return process
+
+    def detect(self, image: np.ndarray) -> bool:
+        """只检测画面是否变化，不更新处理/跳过计数；用于每帧都OCR的情况，当前帧直接成为参考帧"""
+        small = self._downsample(image)
+        changed = self._update(small)
+        self._reference = small
+        return changed
+
+    def _update(self, small: np.ndarray) -> bool:
+        """与参考帧比较，更新距上次变化的帧数"""
+        reference = self._reference
+        if reference is None or reference.shape != small.shape:
+            changed = True
+        else:
+            changed = self.change_ratio(reference, small) > self.threshold
+
+        if changed:
+            self._frames_since_change = 0
+        else:
+            self._frames_since_change += 1
+        self.last_changed = changed
+        return changed
+
+    def change_ratio(self, a: np.ndarray, b: np.ndarray) -> float:
+        """两张缩略灰度图之间变化像素的占比"""
+        diff = cv2.absdiff(a, b)
+        return float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+
+    def reset(self) -> None:
+        """清空参考帧，下一帧必定放行"""
+        self._reference = None
+        self._frames_since_change = 0
+        self.last_changed = False
+
+    def stats(self) -> dict:
+        total = self.frames_processed + self.frames_skipped
+        return {
+            "frames_processed": self.frames_processed,
+            "frames_skipped": self.frames_skipped,
+            "skip_ratio": self.frames_skipped / total if total else 0.0,
+        }
+
+    def _downsample(self, image: np.ndarray) -> np.ndarray:
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        h, w = image.shape[:2]
+        if w > self.downsample_width:
+            new_h = max(1, round(h * self.downsample_width / w))
+            image = cv2.resize(image, (self.downsample_width, new_h), interpolation=cv2.INTER_AREA)
+        return image
+
+
+class TileChangeTracker:
+    """
+    按瓦片统计画面变化。
+    把帧切成 tile_size × tile_size 的瓦片，与上一次OCR的帧比较，得到每个瓦片是否变化的掩码，
+    再把相连的脏瓦片合并成矩形区域，交给 GameOCR 只重新识别这些区域。
+    """
+    def __init__(
+        self,
+        tile_size: int = 64,
+        tile_threshold: float = 0.01,
+        pixel_delta: int = 12,
+        scale: int = 4,
+    ) -> None:
+        """
+        Args:
+            tile_size: 瓦片边长（原图像素）
+            tile_threshold: 瓦片内变化像素占比超过该值即视为脏瓦片
+            pixel_delta: 单个像素灰度差超过该值才计为变化
+            scale: 比较前的缩小倍数，tile_size 需能被它整除
+        """
+        self.tile_size = tile_size
+        self.tile_threshold = tile_threshold
+        self.pixel_delta = pixel_delta
+        self.scale = scale
+
+        self._last_small: np.ndarray | None = None
+        self._last_shape: tuple | None = None
+
+    def update(self, image: np.ndarray) -> list[tuple[int, int, int, int]] | None:
+        """
+        与上一帧比较并记住当前帧。
+        返回脏区域列表 [(x1, y1, x2, y2), ...]（原图坐标），空列表表示没有变化；
+        没有可比较的上一帧时返回 None，表示需要整帧识别。
+        """
+        shape = image.shape[:2]
+        small = self._downsample(image)
+        last = self._last_small
+        self._last_small = small
+
+        if last is None or self._last_shape != shape:
+            self._last_shape = shape
+            return None
+
+        mask = self.dirty_mask(last, small)
+        return self._mask_to_rects(mask, shape)
+
+    def dirty_mask(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """逐瓦片计算变化掩码，形状为 (行数, 列数)"""
+        changed = (cv2.absdiff(a, b) > self.pixel_delta).astype(np.float32)
+        step = max(1, self.tile_size // self.scale)
+        h, w = changed.shape
+        rows, cols = -(-h // step), -(-w // step)
+
+        # 补齐到瓦片整数倍后按块求均值
+        padded = np.zeros((rows * step, cols * step), dtype=np.float32)
+        padded[:h, :w] = changed
+        ratio = padded.reshape(rows, step, cols, step).mean(axis=(1, 3))
+        return ratio > self.tile_threshold
+
+    def reset(self) -> None:
+        self._last_small = None
+        self._last_shape = None
+
+    def _mask_to_rects(self, mask: np.ndarray, shape: tuple) -> list[tuple[int, int, int, int]]:
+        if not mask.any():
+            return []
+
+        h, w = shape
+        n, _, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+        rects = []
+        for i in range(1, n):
+            col, row, cols, rows = stats[i][:4]
+            x1 = int(col * self.tile_size)
+            y1 = int(row * self.tile_size)
+            x2 = int(min((col + cols) * self.tile_size, w))
+            y2 = int(min((row + rows) * self.tile_size, h))
+            rects.append((x1, y1, x2, y2))
+        return rects
+
+    def _downsample(self, image: np.ndarray) -> np.ndarray:
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if self.scale > 1:
+            h, w = image.shape[:2]
+            image = cv2.resize(
+                image,
+                (max(1, w // self.scale), max(1, h // self.scale)),
+                interpolation=cv2.INTER_AREA,
+            )
+        return image
+
 
 if __name__ == "__main__":
     c = Checker(queue_size=3, similarity=0.8)
@@ -68,6 +460,13 @@ if __name__ == "__main__":
     # print("one day, War broke out between the two races.", c.check("one day, War broke out between the two races."))
     print(Levenshtein.ratio(a,b))
 
+    print("\n测试逐字显示的文本（prefix 模式）:")
+    c3 = Checker(mode=PREFIX)
+    full = "One day, war broke out between the two races. After a long battle, the humans won."
+    for n in list(range(10, len(full), 9)) + [len(full)] * 2:
+        print(f"{full[:n]!r}:", c3.check_segment(full[:n]))
+    print(c3.stats())
+
 
     
 
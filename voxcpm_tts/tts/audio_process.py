@@ -1,3 +1,6 @@
+from __future__ import annotations
+
+import itertools
 import json
 import multiprocessing as mp
 from pathlib import Path
@@ -12,22 +15,35 @@ from .modern_player import AudioEngine
 
 PROJECT_DIR = Path(__file__).resolve().parent.parent
 
+WARM_UP_TEXT = "你好。"
+
 
 class AudioScheduler:
     """
     单线程、可中断、two-slot 条件抢占 TTS 调度器
     """
 
-    def __init__(self, cmd_queue: mp.Queue, max_play_seconds: float = 30.0):
+    def __init__(self, cmd_queue: mp.Queue, max_play_seconds: float = 30.0, event_queue: mp.Queue | None = None):
         self.cmd_queue = cmd_queue
+        # 可选：向主进程回报事件（首个音频块时间等），用于延迟统计
+        self.event_queue = event_queue
         self._running = True
         self.MAX_PLAY_SECONDS = max_play_seconds # 超时打断时间
 
         # generation 用于强制中断正在播放的 TTS
         self._generation_id = 0
 
-        # two-slot task queue：current + next
-        self._task_queue = deque(maxlen=2)
+        # two-slot task queue：current + 最多两句待播，元素为 (text, origin, utterance, generation)
+        # 同一句译文的多个分段（流式翻译）utterance 相同，合起来只占一个槽位
+        self._task_queue: deque = deque()
+        # 原文编号（Checker.generation）小于它的句子已被新文本取代，排队的和之后到达的分段都不再播放
+        self._min_generation = 0
+        self._current_utterance = None
+        self._announced_utterance = None
+        # 没有 utterance 的 speak 命令各自算一句
+        self._anonymous_ids = itertools.count(1)
+        # 被打断的句子，之后才到的分段直接丢弃
+        self._dropped_utterances: deque = deque(maxlen=16)
 
         # ---------- model ----------
         self.model = self._load_model()
@@ -66,24 +82,81 @@ class AudioScheduler:
             lora_weights_path=str(lora_ckpt_dir),
         )
 
+    def warm_up(self):
+        """
+        用一句短文本完整跑一遍流式合成（不播放），
+        让CUDA初始化、算子编译和显存分配在加载阶段完成，而不是落在第一句译文上
+        """
+        conf = dict(self.generate_conf)
+        conf["text"] = WARM_UP_TEXT
+        for _ in self.model.generate_streaming(**conf):
+            pass
+
     # ---------- command handling ----------
 
-    def _handle_speak(self, text: str):
+    def _handle_speak(self, text: str, origin: float | None = None, utterance=None, generation: int | None = None):
         """
         Two-slot conditional preemptive strategy
+        origin: 文本出现在屏幕上的时间（time.time()），随首个音频块事件回报
+        utterance: 同一句译文的分段标识；已在播放或排队的句子的后续分段接在该句后面，不触发抢占
+        generation: 原文编号，已被 drop_before 作废的不再播放
         """
-        if len(self._task_queue) < 2:
+        if utterance is None:
+            utterance = ("anonymous", next(self._anonymous_ids))
+        if utterance in self._dropped_utterances:
+            return
+        if generation is not None and generation < self._min_generation:
+            return
+        task = (text, origin, utterance, generation)
+
+        # 续接：插到同一句最后一个分段之后（正在播放且没有排队分段时插到最前）
+        last = -1 if utterance == self._current_utterance else None
+        for i, (_, _, queued, _) in enumerate(self._task_queue):
+            if queued == utterance:
+                last = i
+        if last is not None:
+            self._task_queue.insert(last + 1, task)
+            return
+
+        if len(self._pending_utterances()) < 2:
             # 未满：不打断
-            self._task_queue.append(text)
+            self._task_queue.append(task)
         else:
             # 已满：打断当前，只保留最新
-            self._generation_id += 1
-            self.engine.clear()
-            self._task_queue.clear()
-            self._task_queue.append(text)
+            self._drop_all()
+            self._task_queue.append(task)
+
+    def _handle_drop_before(self, generation: int):
+        """
+        屏幕上换成了新的文本：丢弃更旧的句子排队中的分段（包括正在播放这句的后续分段），
+        之后才到的旧分段也不再播放；正在播放的分段照常播完
+        """
+        if generation <= self._min_generation:
+            return
+        self._min_generation = generation
+        self._task_queue = deque(
+            task for task in self._task_queue if task[3] is None or task[3] >= generation
+        )
+
+    def _drop_utterance(self, utterance):
+        """丢弃某一句排队中和之后到达的分段"""
+        self._dropped_utterances.append(utterance)
+        self._task_queue = deque(task for task in self._task_queue if task[2] != utterance)
+
+    def _pending_utterances(self) -> set:
+        """排队中、且不是当前这句的后续分段的句子"""
+        return {u for _, _, u, _ in self._task_queue if u != self._current_utterance}
 
     def _handle_stop(self):
+        self._drop_all()
+
+    def _drop_all(self):
+        """打断当前播放并清空队列，被丢弃的句子之后到达的分段也不再播放"""
         self._generation_id += 1
+        self._dropped_utterances.extend(
+            {self._current_utterance, *(u for _, _, u, _ in self._task_queue)} - {None}
+        )
+        self._current_utterance = None
         self._task_queue.clear()
         self.engine.clear()
 
@@ -95,7 +168,10 @@ class AudioScheduler:
         cmd_type = cmd.get("type")
 
         if cmd_type == "speak":
-            self._handle_speak(cmd["text"])
+            self._handle_speak(cmd["text"], cmd.get("origin"), cmd.get("utterance"), cmd.get("generation"))
+
+        elif cmd_type == "drop_before":
+            self._handle_drop_before(cmd["generation"])
 
         elif cmd_type == "stop":
             self._handle_stop()
@@ -105,11 +181,15 @@ class AudioScheduler:
 
     # ---------- TTS streaming (可中断) ----------
 
-    def _run_tts_stream(self, text: str, my_gen: int):
+    def _emit_event(self, event: dict):
+        _put_event(self.event_queue, event)
+
+    def _run_tts_stream(self, text: str, my_gen: int, origin: float | None = None, utterance=None):
         conf = dict(self.generate_conf)
         conf["text"] = text
 
         start_time = time.monotonic()
+        first_chunk = True
 
         for chunk in self.model.generate_streaming(**conf):
             # ---------- 1. 最高优先级：处理 cmd_queue ----------
@@ -131,16 +211,28 @@ class AudioScheduler:
             # ---------- 3. 播放超时逻辑（新增） ----------
             elapsed = time.monotonic() - start_time
             if elapsed >= self.MAX_PLAY_SECONDS:
-                # 情况 A：已经有 next → 打断
-                if self._task_queue:
+                # 情况 A：已经有下一句 → 打断（同一句的后续分段不算）
+                if self._pending_utterances():
                     self._generation_id += 1
                     self.engine.clear()
+                    self._drop_utterance(utterance)
                     return
                 # 情况 B：还没有 next → 继续播（什么都不做）
 
             # ---------- 4. 正常输出 ----------
             self.engine.feed(chunk)
 
+            # 每句只回报第一个分段的首个音频块
+            if first_chunk and utterance != self._announced_utterance:
+                first_chunk = False
+                self._announced_utterance = utterance
+                self._emit_event({
+                    "type": "first_audio",
+                    "synth_seconds": time.monotonic() - start_time,
+                    "origin": origin,
+                    "time": time.time(),
+                })
+
     # ---------- main loop ----------
 
     def run(self):
@@ -155,15 +247,43 @@ class AudioScheduler:
 
             # 2. 有任务：播放（可被 stop / exit / text 抢占）
             my_gen = self._generation_id
-            text = self._task_queue.popleft()
-            self._run_tts_stream(text, my_gen)
+            text, origin, utterance, _ = self._task_queue.popleft()
+            self._current_utterance = utterance
+            self._run_tts_stream(text, my_gen, origin, utterance)
 
         self.engine.stop()
         print("[AudioProcess] exited")
 
 
-def audio_process_entry(cmd_queue: mp.Queue):
-    scheduler = AudioScheduler(cmd_queue)
+def _put_event(event_queue: mp.Queue | None, event: dict):
+    if event_queue is None:
+        return
+    try:
+        event_queue.put_nowait(event)
+    except Exception:
+        pass
+
+
+def _report_readiness(event_queue: mp.Queue | None, state: str, error: str | None = None):
+    _put_event(event_queue, {"type": "readiness", "component": "tts", "state": state, "error": error})
+
+
+def audio_process_entry(cmd_queue: mp.Queue, event_queue: mp.Queue | None = None, warm_up: bool = True):
+    """
+    音频进程入口
+    加载和预热过程通过 event_queue 回报 readiness 事件（loading → warming → ready，失败为 failed），
+    期间收到的 speak 命令留在 cmd_queue 中，就绪后再处理
+    """
+    _report_readiness(event_queue, "loading")
+    try:
+        scheduler = AudioScheduler(cmd_queue, event_queue=event_queue)
+        if warm_up:
+            _report_readiness(event_queue, "warming")
+            scheduler.warm_up()
+    except Exception as e:
+        _report_readiness(event_queue, "failed", repr(e))
+        raise
+    _report_readiness(event_queue, "ready")
     scheduler.run()
 
 if __name__ == "__main__":